@@ -1,52 +1,610 @@
-from fastapi import APIRouter, Depends
+import os
+import time
+import asyncio
+import logging
+import functools
+import tempfile
+import numpy as np
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from backend.batching import MicroBatcher, MicroBatcherClosed, MicroBatcherOverloaded
+from backend.bulk_scoring import (
+    ARROW_STREAM_TYPE,
+    COLUMNS_TYPE,
+    BulkPayloadError,
+    get_codec,
+    score_stream,
+    stream_in_thread,
+)
+from backend.inference import InferenceExecutor
+from backend.metrics import stage_timer
+from backend.prediction_cache import PredictionCache
 from backend.model_executor import ModelExecutor
 from backend.feature_extractor import FeatureExtractor
-from backend.api_models import PredictionRequest, PredictionResponse
-from backend.utils import log_features_and_prediction
+from backend.feature_schema import FeatureSchema
+from backend.serving_model import (
+    ModelVersionUnavailable,
+    ServingModel,
+    model_file_signature,
+    model_file_version,
+)
+from backend.shared_model import ensure_shared_model
+from backend.api_models import (
+    PredictionRequest,
+    PredictionResponse,
+    BatchPredictionRequest,
+    BatchPredictionItem,
+    BatchPredictionResponse,
+)
+from backend.utils import (
+    PredictionLogWriter,
+    get_prediction_log_writer,
+    log_features_and_prediction,
+    log_batch_features_and_predictions,
+)
 
 router = APIRouter()
 
-_model_executor = None
-_feature_extractor = None
+MODEL_PATH = "models/xgb.json"
+FEATURE_SCHEMA_PATH = "data/feature_schema.json"
+DATA_FOLDER = "data"
+ZONES_FILENAME = "zones.csv"
+
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "false").lower() == "true"
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "64"))
+MICRO_BATCH_WAIT_MS = float(os.getenv("MICRO_BATCH_WAIT_MS", "2"))
+MICRO_BATCH_MAX_QUEUE = int(os.getenv("MICRO_BATCH_MAX_QUEUE", "1024"))
+MODEL_ENGINE = os.getenv("MODEL_ENGINE", "xgboost")
+MODEL_ENGINE_CHECK_PARITY = (
+    os.getenv("MODEL_ENGINE_CHECK_PARITY", "true").lower() == "true"
+)
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "inline")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+PREDICTION_CACHE = os.getenv("PREDICTION_CACHE", "false").lower() == "true"
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "300"))
+PREDICTION_CACHE_DISTANCE_DECIMALS = os.getenv("PREDICTION_CACHE_DISTANCE_DECIMALS")
+
+SHARED_MODEL_DIR = os.getenv("SHARED_MODEL_DIR") or None
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "0"))
+MODEL_RELOAD_GRACE_SECONDS = float(os.getenv("MODEL_RELOAD_GRACE_SECONDS", "30"))
+MODEL_VERSIONS_KEPT = 2
+WARMUP_PREDICTIONS = int(os.getenv("WARMUP_PREDICTIONS", "3"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+BULK_CHUNK_ROWS = int(os.getenv("BULK_CHUNK_ROWS", "8192"))
+BULK_MAX_FRAME_ROWS = int(os.getenv("BULK_MAX_FRAME_ROWS", "262144"))
+
+logger = logging.getLogger(__name__)
+
+_serving_model = None
+_serving_models: Dict[str, ServingModel] = {}
+_inference_executor = None
+_model_reload_lock = None
+_model_watcher = None
+_retiring: Set[asyncio.Task] = set()
+
+serving_state = {"ready": False}
+
+
+def load_serving_model() -> ServingModel:
+    return ServingModel(
+        model_path=MODEL_PATH,
+        schema_path=FEATURE_SCHEMA_PATH,
+        zones_filename=ZONES_FILENAME,
+        data_folder=DATA_FOLDER,
+        engine=MODEL_ENGINE,
+        check_parity=MODEL_ENGINE_CHECK_PARITY,
+        shared_dir=SHARED_MODEL_DIR,
+    )
+
+
+def prepare_shared_model(shared_dir: str) -> str:
+    # Run once by the launcher, the workers then only map the arrays
+    return ensure_shared_model(
+        shared_dir,
+        model_file_version(MODEL_PATH),
+        MODEL_PATH,
+        schema_path=FEATURE_SCHEMA_PATH,
+        zones_filepath=os.path.join(DATA_FOLDER, ZONES_FILENAME),
+        check_parity=MODEL_ENGINE_CHECK_PARITY,
+    )
+
+
+def _register_serving_model(serving_model: ServingModel) -> ServingModel:
+    # The serving process drops a version once it is retired
+    _serving_models[serving_model.version] = serving_model
+    return serving_model
+
+
+def _load_serving_model_version(version: str) -> ServingModel:
+    # Pool workers only hold the versions they have been asked for, loaded
+    # from the model file as long as it still holds that version
+    serving_model = load_serving_model()
+    if serving_model.version != version:
+        raise ModelVersionUnavailable(
+            f"Model version {version} requested, {serving_model.version} is on disk"
+        )
+
+    _serving_models[version] = serving_model
+    for old_version in list(_serving_models)[:-MODEL_VERSIONS_KEPT]:
+        if _serving_models[old_version] is not _serving_model:
+            del _serving_models[old_version]
+    return serving_model
+
+
+def _attach_serving_components(serving_model: ServingModel) -> None:
+    # Batcher and cache belong to one model version, so a batch never mixes
+    # feature layouts and a cached prediction never outlives its model
+    if MICRO_BATCHING:
+        serving_model.micro_batcher = MicroBatcher(
+            predict_batch=functools.partial(
+                predict_feature_batch, version=serving_model.version
+            ),
+            max_batch_size=MICRO_BATCH_MAX_SIZE,
+            max_wait_ms=MICRO_BATCH_WAIT_MS,
+            inference_executor=get_inference_executor(),
+            max_queue_size=MICRO_BATCH_MAX_QUEUE,
+        )
+
+    if PREDICTION_CACHE:
+        distance_decimals = PREDICTION_CACHE_DISTANCE_DECIMALS
+        serving_model.prediction_cache = PredictionCache(
+            max_size=PREDICTION_CACHE_SIZE,
+            ttl_seconds=PREDICTION_CACHE_TTL,
+            distance_index=serving_model.feature_schema.index("trip_distance"),
+            distance_decimals=int(distance_decimals) if distance_decimals else None,
+        )
+
+
+def get_serving_model() -> ServingModel:
+    global _serving_model
+
+    if _serving_model is None:
+        serving_model = _register_serving_model(load_serving_model())
+        _attach_serving_components(serving_model)
+        _serving_model = serving_model
+        serving_state["model_version"] = serving_model.version
+
+    return _serving_model
+
+
+def get_serving_model_version(version: Optional[str] = None) -> ServingModel:
+    if version is None:
+        return get_serving_model()
+
+    serving_model = _serving_models.get(version)
+    if serving_model is None:
+        serving_model = _load_serving_model_version(version)
+
+    return serving_model
 
 
 def get_model_executor() -> ModelExecutor:
-    global _model_executor
+    return get_serving_model().model_executor
 
-    if _model_executor is None:
-        _model_executor = ModelExecutor(model_path="models/xgb.json")
 
-    return _model_executor
+def get_feature_schema() -> FeatureSchema:
+    return get_serving_model().feature_schema
 
 
 def get_feature_extractor() -> FeatureExtractor:
-    global _feature_extractor
+    return get_serving_model().feature_extractor
 
-    if _feature_extractor is None:
-        _feature_extractor = FeatureExtractor(
-            zones_filename="zones.csv",
-            data_folder="data",
-            test_filename="test.csv",
+
+def get_inference_executor() -> InferenceExecutor:
+    global _inference_executor
+
+    if _inference_executor is None:
+        _inference_executor = InferenceExecutor(
+            mode=INFERENCE_MODE, max_workers=INFERENCE_WORKERS
         )
 
-    return _feature_extractor
+    return _inference_executor
+
+
+def get_micro_batcher() -> Optional[MicroBatcher]:
+    return get_serving_model().micro_batcher
+
+
+def get_prediction_cache() -> Optional[PredictionCache]:
+    return get_serving_model().prediction_cache
+
+
+# Module level so they can be sent to a process pool, where the model and
+# zone tables are loaded once per worker and version by the getters above
+
+
+def extract_features(
+    request: PredictionRequest, version: Optional[str] = None
+) -> np.ndarray:
+    serving_model = get_serving_model_version(version)
+    return serving_model.feature_extractor.extract_feature_vector(request)
+
+
+def extract_and_predict(
+    request: PredictionRequest, version: Optional[str] = None
+) -> Tuple[np.ndarray, float]:
+    serving_model = get_serving_model_version(version)
+    features = serving_model.feature_extractor.extract_feature_vector(request)
+    prediction = serving_model.model_executor.predict(features)
+    return features, prediction
+
+
+def extract_and_predict_batch(
+    requests: List[PredictionRequest], version: Optional[str] = None
+) -> Tuple[np.ndarray, List[Optional[str]], np.ndarray]:
+    serving_model = get_serving_model_version(version)
+    features, errors = serving_model.feature_extractor.extract_feature_matrix(requests)
+    valid_rows = [i for i, error in enumerate(errors) if error is None]
+    if len(valid_rows) < len(errors):
+        features = features[valid_rows]
+
+    predictions = serving_model.model_executor.predict_batch(features)
+    return features, errors, predictions
+
+
+def predict_feature_batch(
+    features: np.ndarray, version: Optional[str] = None
+) -> np.ndarray:
+    return get_serving_model_version(version).model_executor.predict_batch(features)
+
+
+def predict_features(features: np.ndarray, version: Optional[str] = None) -> float:
+    return get_serving_model_version(version).model_executor.predict(features)
+
+
+def load_serving_artifacts() -> None:
+    get_inference_executor()
+    get_serving_model()
+    get_prediction_log_writer().start()
+
+
+def warmup_request(serving_model: ServingModel) -> PredictionRequest:
+    location_id = int(serving_model.feature_extractor.location_valid.argmax())
+    return PredictionRequest(
+        trip_id="warmup",
+        request_datetime="2024-01-01T12/00/00+0000",
+        trip_distance=1.0,
+        PULocationID=location_id,
+        DOLocationID=location_id,
+        Airport=0,
+    )
+
+
+async def warm_up(
+    n_predictions: int, serving_model: Optional[ServingModel] = None
+) -> None:
+    # Not logged nor cached, only exercises the extraction and model code paths,
+    # concurrently so every pool worker loads its own copy
+    serving_model = serving_model or get_serving_model()
+    inference_executor = get_inference_executor()
+    request = warmup_request(serving_model)
+    version = serving_model.version
+    n_calls = max(n_predictions, inference_executor.max_workers or 1)
+
+    await asyncio.gather(
+        *[
+            inference_executor.run(extract_and_predict, request, version)
+            for _ in range(n_calls)
+        ]
+    )
+    await inference_executor.run(extract_and_predict_batch, [request] * 8, version)
+
+
+def _get_model_reload_lock() -> asyncio.Lock:
+    global _model_reload_lock
+
+    if _model_reload_lock is None:
+        _model_reload_lock = asyncio.Lock()
+
+    return _model_reload_lock
+
+
+async def _retire_serving_model(serving_model: ServingModel) -> None:
+    # Requests that picked the old model before the swap finish on it
+    await asyncio.sleep(MODEL_RELOAD_GRACE_SECONDS)
+    if serving_model.micro_batcher is not None:
+        await serving_model.micro_batcher.stop()
+    if _serving_models.get(serving_model.version) is serving_model:
+        del _serving_models[serving_model.version]
+
+
+async def reload_serving_model(force: bool = False) -> dict:
+    """
+    Load the model file in the background, warm it up and swap it in. Requests
+    keep being served by the current model until the swap.
+    :param force: Reload even if the file signature did not change.
+    :return: The previous and current model versions.
+    """
+    global _serving_model
+
+    async with _get_model_reload_lock():
+        current = get_serving_model()
+        result = {"previous_version": current.version, "reloaded": False}
+
+        if not force and model_file_signature(MODEL_PATH) == current.signature:
+            return {**result, "model_version": current.version}
+
+        started_at = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        serving_model = await loop.run_in_executor(None, load_serving_model)
+
+        if serving_model.version == current.version:
+            # Same content rewritten, keep the warm model
+            current.signature = serving_model.signature
+            return {**result, "model_version": current.version}
+
+        _register_serving_model(serving_model)
+        _attach_serving_components(serving_model)
+        await warm_up(WARMUP_PREDICTIONS, serving_model)
+
+        _serving_model = serving_model
+        serving_state["model_version"] = serving_model.version
+        serving_state["model_loaded_at"] = serving_model.loaded_at
+
+        task = loop.create_task(_retire_serving_model(current))
+        _retiring.add(task)
+        task.add_done_callback(_retiring.discard)
+
+        logger.info(
+            f"Model {current.version} replaced by {serving_model.version} "
+            f"after {time.perf_counter() - started_at:.3f}s"
+        )
+        return {**result, "model_version": serving_model.version, "reloaded": True}
+
+
+async def watch_model_file(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reload_serving_model()
+        except Exception as e:
+            # Keep serving the current model, the next check tries again
+            logger.error(f"Model reload failed: {e}")
+
+
+def start_model_watcher() -> None:
+    global _model_watcher
+
+    if MODEL_RELOAD_INTERVAL > 0 and _model_watcher is None:
+        _model_watcher = asyncio.get_running_loop().create_task(
+            watch_model_file(MODEL_RELOAD_INTERVAL)
+        )
+
+
+async def shutdown_serving() -> None:
+    global _model_watcher
+
+    serving_state["ready"] = False
+    if _model_watcher is not None:
+        _model_watcher.cancel()
+        _model_watcher = None
+    for task in list(_retiring):
+        task.cancel()
+    for serving_model in list(_serving_models.values()):
+        if serving_model.micro_batcher is not None:
+            await serving_model.micro_batcher.stop()
+    if _inference_executor is not None:
+        _inference_executor.shutdown()
+    get_prediction_log_writer().close()
+
+
+@router.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready(response: Response):
+    if not serving_state["ready"]:
+        response.status_code = 503
+    return serving_state
+
+
+async def _score_request(
+    request: PredictionRequest,
+    version: str,
+    inference_executor: InferenceExecutor,
+    micro_batcher: Optional[MicroBatcher],
+    prediction_cache: Optional[PredictionCache],
+) -> Tuple[np.ndarray, float]:
+    if micro_batcher is None and prediction_cache is None:
+        features, prediction = await inference_executor.run(
+            extract_and_predict, request, version
+        )
+    else:
+        features = await inference_executor.run(extract_features, request, version)
+
+        timer = stage_timer()
+        prediction = None
+        if prediction_cache is not None:
+            prediction = prediction_cache.get(features)
+            timer.lap("cache_get")
+
+        if prediction is None:
+            if micro_batcher is not None:
+                prediction = await micro_batcher.predict(features)
+                timer.lap("micro_batch")
+            else:
+                prediction = await inference_executor.run(
+                    predict_features, features, version
+                )
+
+            if prediction_cache is not None:
+                prediction_cache.put(features, prediction)
+
+    return features, prediction
 
 
 @router.post("/predict", response_model=PredictionResponse)
 async def predict(
     request: PredictionRequest,
-    model_executor: ModelExecutor = Depends(get_model_executor),
-    feature_extractor: FeatureExtractor = Depends(get_feature_extractor),
+    serving_model: ServingModel = Depends(get_serving_model),
+    inference_executor: InferenceExecutor = Depends(get_inference_executor),
 ):
-    extracted_features = feature_extractor.extract_features(request)
-    prediction = model_executor.predict(extracted_features)
+    version = serving_model.version
+    micro_batcher = serving_model.micro_batcher
+    prediction_cache = serving_model.prediction_cache
+
+    try:
+        features, prediction = await _score_request(
+            request, version, inference_executor, micro_batcher, prediction_cache
+        )
+    except (MicroBatcherClosed, ModelVersionUnavailable) as e:
+        # The model version was retired or the server is stopping, the
+        # client retries on the current model
+        raise HTTPException(status_code=503, detail=str(e))
+    except MicroBatcherOverloaded as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
+        )
 
     log_features_and_prediction(
-        extracted_features=extracted_features,
+        features=features,
+        feature_names=serving_model.feature_schema.columns,
         prediction=prediction,
         trip_id=request.trip_id,
+        model_version=version,
     )
 
     return PredictionResponse(
         prediction=prediction,
+        model_version=version,
+    )
+
+
+@router.post("/predict_batch", response_model=BatchPredictionResponse)
+async def predict_batch(
+    request: BatchPredictionRequest,
+    serving_model: ServingModel = Depends(get_serving_model),
+    inference_executor: InferenceExecutor = Depends(get_inference_executor),
+):
+    version = serving_model.version
+    try:
+        features, errors, predictions = await inference_executor.run(
+            extract_and_predict_batch, request.data, version
+        )
+    except ModelVersionUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    valid_rows = [i for i, error in enumerate(errors) if error is None]
+
+    if valid_rows:
+        log_batch_features_and_predictions(
+            features=features,
+            feature_names=serving_model.feature_schema.columns,
+            predictions=predictions,
+            trip_ids=[request.data[i].trip_id for i in valid_rows],
+            model_version=version,
+        )
+
+    items = [
+        BatchPredictionItem(trip_id=item.trip_id, error=error)
+        for item, error in zip(request.data, errors)
+    ]
+    for i, prediction in zip(valid_rows, predictions.tolist()):
+        items[i].prediction = prediction
+
+    return BatchPredictionResponse(predictions=items, model_version=version)
+
+
+@router.post("/predict_bulk")
+async def predict_bulk(
+    request: Request,
+    serving_model: ServingModel = Depends(get_serving_model),
+):
+    try:
+        codec = get_codec(request.headers.get("content-type"), BULK_MAX_FRAME_ROWS)
+    except ImportError:
+        raise HTTPException(
+            status_code=415, detail="Arrow payloads need pyarrow to be installed"
+        )
+    if codec is None:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Expected a {COLUMNS_TYPE} or {ARROW_STREAM_TYPE} payload",
+        )
+
+    # Spooled to disk rather than scored while it arrives: HTTP/1.1 clients
+    # send the whole body before reading the response
+    payload = tempfile.TemporaryFile()
+    try:
+        async for chunk in request.stream():
+            payload.write(chunk)
+        payload.seek(0)
+
+        body = stream_in_thread(
+            functools.partial(
+                score_stream, serving_model, codec, payload, BULK_CHUNK_ROWS
+            )
+        )
+        # Scores the first chunk, so malformed payloads still get a 400
+        first = await body.__anext__()
+    except BulkPayloadError as e:
+        payload.close()
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        payload.close()
+        raise
+
+    async def content():
+        try:
+            yield first
+            async for chunk in body:
+                yield chunk
+        except BulkPayloadError as e:
+            # Too late for a status code, the client sees a stream without
+            # its end marker
+            logger.error(f"Bulk scoring stopped: {e}")
+            raise
+        finally:
+            await body.aclose()
+            payload.close()
+
+    return StreamingResponse(
+        content(),
+        media_type=codec.content_type,
+        headers={"X-Model-Version": serving_model.version},
     )
+
+
+@router.post("/admin/reload_model")
+async def reload_model(
+    force: bool = False,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    if ADMIN_TOKEN is None or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+    try:
+        return await reload_serving_model(force=force)
+    except Exception as e:
+        logger.error(f"Model reload failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {e}")
+
+
+@router.get("/batching_stats")
+async def batching_stats(
+    micro_batcher: Optional[MicroBatcher] = Depends(get_micro_batcher),
+):
+    if micro_batcher is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **micro_batcher.stats()}
+
+
+@router.get("/cache_stats")
+async def cache_stats(
+    prediction_cache: Optional[PredictionCache] = Depends(get_prediction_cache),
+):
+    if prediction_cache is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **prediction_cache.stats()}
+
+
+@router.get("/logging_stats")
+async def logging_stats(
+    prediction_log_writer: PredictionLogWriter = Depends(get_prediction_log_writer),
+):
+    return prediction_log_writer.stats()
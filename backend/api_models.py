@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, ConfigDict
 
 
 class PredictionRequest(BaseModel):
@@ -11,4 +12,24 @@ class PredictionRequest(BaseModel):
 
 
 class PredictionResponse(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
     prediction: float
+    model_version: Optional[str] = None
+
+
+class BatchPredictionRequest(BaseModel):
+    data: List[PredictionRequest]
+
+
+class BatchPredictionItem(BaseModel):
+    trip_id: str
+    prediction: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BatchPredictionResponse(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
+    predictions: List[BatchPredictionItem]
+    model_version: Optional[str] = None
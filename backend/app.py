@@ -1,12 +1,128 @@
+import time
+
+# Taken before the heavy imports so startup timings include them
+STARTED_AT = time.perf_counter()
+
+import os
+import copy
+import logging
+import tempfile
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 import uvicorn
-import logging
 from backend.api import router as api_v1_router
+from backend.metrics import MetricsMiddleware, get_serving_metrics
+from backend.api import (
+    WARMUP_PREDICTIONS,
+    load_serving_artifacts,
+    prepare_shared_model,
+    serving_state,
+    shutdown_serving,
+    start_model_watcher,
+    warm_up,
+)
+
+SERVING_WORKERS = int(os.getenv("SERVING_WORKERS", "1"))
+SHARED_MODEL = os.getenv("SHARED_MODEL", "true").lower() == "true"
+PORT = int(os.getenv("PORT", "8000"))
+
+
+def worker_log_config() -> dict:
+    # Spawned workers never run basicConfig, give the root logger the same
+    # format so prediction logs keep their "INFO:backend.utils:" prefix
+    log_config = copy.deepcopy(uvicorn.config.LOGGING_CONFIG)
+    log_config["formatters"]["basic"] = {"format": logging.BASIC_FORMAT}
+    log_config["handlers"]["basic"] = {
+        "formatter": "basic",
+        "class": "logging.StreamHandler",
+        "stream": "ext://sys.stderr",
+    }
+    log_config["root"] = {"handlers": ["basic"], "level": "INFO"}
+    return log_config
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger = logging.getLogger(__name__)
+
+    imported_at = time.perf_counter()
+    load_serving_artifacts()
+    loaded_at = time.perf_counter()
+    await warm_up(WARMUP_PREDICTIONS)
+    ready_at = time.perf_counter()
+
+    serving_state.update(
+        {
+            "ready": True,
+            "import_seconds": imported_at - STARTED_AT,
+            "load_seconds": loaded_at - imported_at,
+            "warmup_seconds": ready_at - loaded_at,
+            "time_to_first_prediction_seconds": ready_at - STARTED_AT,
+        }
+    )
+    serving_metrics = get_serving_metrics()
+    if serving_metrics is not None:
+        # Per process, so they can be compared across deploys
+        serving_metrics.set_gauge(
+            "nytaxi_time_to_first_prediction_seconds", ready_at - STARTED_AT
+        )
+        for phase, seconds in (
+            ("import", imported_at - STARTED_AT),
+            ("load", loaded_at - imported_at),
+            ("warmup", ready_at - loaded_at),
+        ):
+            serving_metrics.set_gauge(
+                "nytaxi_startup_seconds", seconds, f'phase="{phase}"'
+            )
+    logger.info(
+        f"Ready after {ready_at - STARTED_AT:.3f}s (import {imported_at - STARTED_AT:.3f}s, "
+        f"load {loaded_at - imported_at:.3f}s, warm-up {ready_at - loaded_at:.3f}s)"
+    )
 
-app = FastAPI()
+    start_model_watcher()
+
+    yield
+
+    await shutdown_serving()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(api_v1_router, prefix="/api/v1")
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    serving_metrics = get_serving_metrics()
+    if serving_metrics is None:
+        return PlainTextResponse("# Metrics are disabled\n", status_code=404)
+
+    return PlainTextResponse(
+        serving_metrics.render(serving_state.get("model_version")),
+        media_type="text/plain; version=0.0.4",
+    )
+
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    if SERVING_WORKERS > 1:
+        if SHARED_MODEL:
+            # Inherited by the workers, which map the arrays written here
+            shared_dir = os.environ.setdefault(
+                "SHARED_MODEL_DIR",
+                os.path.join(tempfile.gettempdir(), "nytaxi-shared-model"),
+            )
+            prepare_shared_model(shared_dir)
+
+        uvicorn.run(
+            "backend.app:app",
+            host="0.0.0.0",
+            port=PORT,
+            workers=SERVING_WORKERS,
+            log_config=worker_log_config(),
+        )
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=PORT)
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import numpy as np
+from typing import Callable, List, Optional, Set, Tuple
+from backend.inference import InferenceExecutor
+
+
+class MicroBatcherClosed(RuntimeError):
+    pass
+
+
+class MicroBatcherOverloaded(RuntimeError):
+    pass
+
+
+class MicroBatcher:
+    """
+    Collects single-row predictions that arrive within a short window and scores
+    them with one batched model call. Once stopped it fails the requests it has
+    not scored and refuses new ones.
+
+    At most `max_batches_in_flight` batches are scored at once, by default two
+    per executor worker. Requests wait in a queue of `max_queue_size` while
+    they are all busy, and are refused once it is full.
+    """
+
+    def __init__(
+        self,
+        predict_batch: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 2.0,
+        inference_executor: Optional[InferenceExecutor] = None,
+        max_queue_size: int = 1024,
+        max_batches_in_flight: Optional[int] = None,
+    ) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.inference_executor = inference_executor or InferenceExecutor("inline")
+        self.max_queue_size = max_queue_size
+        self.max_batches_in_flight = max_batches_in_flight or 2 * (
+            self.inference_executor.max_workers or 1
+        )
+        self._pending: Set[asyncio.Task] = set()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Taken from the queue into the batch being collected
+        self._collecting: List[Tuple[np.ndarray, asyncio.Future]] = []
+        self._closed = False
+
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.largest_batch_size = 0
+
+    def start(self) -> None:
+        if self._closed:
+            raise MicroBatcherClosed("Micro-batcher is stopped")
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._task = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # Nothing would ever score them
+        unscored, self._collecting = self._collecting, []
+        if self._queue is not None:
+            while not self._queue.empty():
+                unscored.append(self._queue.get_nowait())
+        for _, future in unscored:
+            if not future.done():
+                future.set_exception(
+                    MicroBatcherClosed("Micro-batcher stopped before scoring")
+                )
+        if unscored:
+            self.logger.warning(f"Stopped with {len(unscored)} unscored predictions")
+
+        # Batches already sent to the model finish
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        self._queue = None
+        self._loop = None
+
+    async def predict(self, features: np.ndarray) -> float:
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((features, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise MicroBatcherOverloaded(
+                f"{self._queue.qsize()} predictions already waiting for a batch"
+            )
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches_in_flight": len(self._pending),
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.largest_batch_size,
+        }
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = self._collecting
+        batch.append(await self._queue.get())
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _score(self, batch: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        self.requests += len(batch)
+        self.batches += 1
+        self.last_batch_size = len(batch)
+        self.largest_batch_size = max(self.largest_batch_size, len(batch))
+
+        try:
+            predictions = await self.inference_executor.run(
+                self.predict_batch, np.stack([f for f, _ in batch])
+            )
+        except Exception as e:
+            self.logger.error(f"Batch of {len(batch)} predictions failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), prediction in zip(batch, predictions.tolist()):
+            if not future.done():
+                future.set_result(prediction)
+
+    async def _run(self) -> None:
+        # Batches are scored concurrently when the executor has several workers,
+        # the next batch keeps collecting while earlier ones are in flight
+        while True:
+            while len(self._pending) >= self.max_batches_in_flight:
+                await asyncio.wait(self._pending, return_when=asyncio.FIRST_COMPLETED)
+            batch = await self._collect()
+            self._collecting = []
+            task = asyncio.get_running_loop().create_task(self._score(batch))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
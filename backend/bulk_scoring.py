@@ -0,0 +1,322 @@
+import io
+import struct
+import asyncio
+import threading
+import numpy as np
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from backend.metrics import stage_timer
+
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+COLUMNS_TYPE = "application/x-nytaxi-columns"
+
+# PredictionRequest fields and their little-endian dtype in the raw column
+# format, None for utf-8 strings sent as int32 offsets followed by the bytes
+REQUEST_COLUMNS = (
+    ("trip_id", None),
+    ("request_datetime", None),
+    ("trip_distance", "<f8"),
+    ("PULocationID", "<i4"),
+    ("DOLocationID", "<i4"),
+    ("Airport", "<i4"),
+)
+
+_FRAME_HEADER = struct.Struct("<I")
+
+
+class BulkPayloadError(ValueError):
+    pass
+
+
+def score_columns(
+    serving_model, columns: Dict[str, np.ndarray]
+) -> Tuple[np.ndarray, List[Optional[str]]]:
+    """
+    Scores one chunk of request columns.
+    :return: The predictions, NaN for rows that could not be scored, and the
+        error of each row or None.
+    """
+    features, errors = serving_model.feature_extractor.extract_feature_columns(
+        columns["request_datetime"],
+        columns["trip_distance"],
+        columns["PULocationID"],
+        columns["DOLocationID"],
+        columns["Airport"],
+    )
+    valid = np.array([error is None for error in errors], dtype=bool)
+
+    timer = stage_timer()
+    predictions = np.full(len(errors), np.nan)
+    if valid.any():
+        predictions[valid] = serving_model.model_executor.predict_batch(
+            features[valid] if not valid.all() else features
+        )
+    timer.lap("bulk_predict")
+    return predictions, errors
+
+
+def iter_chunks(
+    frames: Iterator[Dict[str, np.ndarray]], chunk_rows: int
+) -> Iterator[Dict[str, np.ndarray]]:
+    for frame in frames:
+        n_rows = len(frame["trip_id"])
+        for start in range(0, n_rows, chunk_rows):
+            yield {
+                name: column[start : start + chunk_rows]
+                for name, column in frame.items()
+            }
+
+
+class ColumnsCodec:
+    """
+    Raw little-endian columns: a stream of frames, each a uint32 row count
+    followed by the REQUEST_COLUMNS in order, ended by a frame of 0 rows.
+    Responses use the same framing with trip_id, prediction (<f8, NaN on
+    error) and error (empty string when the row was scored).
+    """
+
+    content_type = COLUMNS_TYPE
+
+    def __init__(self, max_frame_rows: int) -> None:
+        self.max_frame_rows = max_frame_rows
+
+    @staticmethod
+    def _read_exact(reader: io.BufferedIOBase, n_bytes: int) -> bytes:
+        data = reader.read(n_bytes)
+        if len(data) != n_bytes:
+            raise BulkPayloadError(
+                f"Payload ended after {len(data)} of {n_bytes} expected bytes"
+            )
+        return data
+
+    def _read_strings(self, reader: io.BufferedIOBase, n_rows: int) -> np.ndarray:
+        offsets = np.frombuffer(self._read_exact(reader, 4 * (n_rows + 1)), dtype="<i4")
+        if offsets[0] != 0 or (np.diff(offsets) < 0).any():
+            raise BulkPayloadError("String offsets must start at 0 and not decrease")
+        data = self._read_exact(reader, int(offsets[-1]))
+        strings = np.empty(n_rows, dtype=object)
+        try:
+            strings[:] = [
+                data[start:stop].decode()
+                for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+            ]
+        except UnicodeDecodeError as e:
+            raise BulkPayloadError(f"Strings must be valid UTF-8: {e}") from e
+        return strings
+
+    def read_frames(self, reader: io.BufferedIOBase) -> Iterator[Dict[str, np.ndarray]]:
+        while True:
+            (n_rows,) = _FRAME_HEADER.unpack(
+                self._read_exact(reader, _FRAME_HEADER.size)
+            )
+            if n_rows == 0:
+                return
+            if n_rows > self.max_frame_rows:
+                raise BulkPayloadError(
+                    f"Frame of {n_rows} rows, at most {self.max_frame_rows} are accepted"
+                )
+
+            frame = {}
+            for name, dtype in REQUEST_COLUMNS:
+                if dtype is None:
+                    frame[name] = self._read_strings(reader, n_rows)
+                else:
+                    itemsize = np.dtype(dtype).itemsize
+                    frame[name] = np.frombuffer(
+                        self._read_exact(reader, itemsize * n_rows), dtype=dtype
+                    )
+            yield frame
+
+    @staticmethod
+    def _encode_strings(values: List[str]) -> bytes:
+        encoded = [value.encode() for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype="<i4")
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return offsets.tobytes() + b"".join(encoded)
+
+    def encode_start(self) -> bytes:
+        return b""
+
+    def encode_chunk(
+        self,
+        trip_ids: np.ndarray,
+        predictions: np.ndarray,
+        errors: List[Optional[str]],
+    ) -> bytes:
+        return b"".join(
+            [
+                _FRAME_HEADER.pack(len(trip_ids)),
+                self._encode_strings(list(trip_ids)),
+                predictions.astype("<f8").tobytes(),
+                self._encode_strings([error or "" for error in errors]),
+            ]
+        )
+
+    def encode_end(self) -> bytes:
+        return _FRAME_HEADER.pack(0)
+
+
+class ArrowCodec:
+    """
+    Arrow IPC stream with one column per PredictionRequest field. Responses
+    are an Arrow IPC stream of trip_id, prediction and error, both null on
+    the other outcome.
+    """
+
+    content_type = ARROW_STREAM_TYPE
+
+    def __init__(self, max_frame_rows: int) -> None:
+        # Optional dependency, only needed for Arrow payloads
+        import pyarrow as pa
+
+        self.pa = pa
+        self.max_frame_rows = max_frame_rows
+        self.schema = pa.schema(
+            [
+                ("trip_id", pa.string()),
+                ("prediction", pa.float64()),
+                ("error", pa.string()),
+            ]
+        )
+        self._sink = None
+        self._writer = None
+
+    def read_frames(self, reader: io.BufferedIOBase) -> Iterator[Dict[str, np.ndarray]]:
+        pa = self.pa
+        try:
+            stream = pa.ipc.open_stream(reader)
+            missing = [
+                name
+                for name, _ in REQUEST_COLUMNS
+                if stream.schema.get_field_index(name) < 0
+            ]
+            if missing:
+                raise BulkPayloadError(f"Arrow stream is missing columns {missing}")
+
+            for batch in stream:
+                if batch.num_rows > self.max_frame_rows:
+                    raise BulkPayloadError(
+                        f"Record batch of {batch.num_rows} rows, at most {self.max_frame_rows} are accepted"
+                    )
+
+                frame = {}
+                for name, dtype in REQUEST_COLUMNS:
+                    column = batch.column(name)
+                    if column.null_count:
+                        raise BulkPayloadError(f"Column {name} has null values")
+                    if dtype is None:
+                        frame[name] = column.cast(pa.string()).to_numpy(
+                            zero_copy_only=False
+                        )
+                    else:
+                        frame[name] = column.cast(
+                            pa.from_numpy_dtype(np.dtype(dtype))
+                        ).to_numpy()
+                yield frame
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            raise BulkPayloadError(f"Invalid Arrow stream: {e}") from e
+
+    def _flush(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return data
+
+    def encode_start(self) -> bytes:
+        self._sink = io.BytesIO()
+        self._writer = self.pa.ipc.new_stream(self._sink, self.schema)
+        return self._flush()
+
+    def encode_chunk(
+        self,
+        trip_ids: np.ndarray,
+        predictions: np.ndarray,
+        errors: List[Optional[str]],
+    ) -> bytes:
+        pa = self.pa
+        batch = pa.record_batch(
+            [
+                pa.array(trip_ids, type=pa.string()),
+                pa.array(predictions, mask=np.isnan(predictions)),
+                pa.array(errors, type=pa.string()),
+            ],
+            schema=self.schema,
+        )
+        self._writer.write_batch(batch)
+        return self._flush()
+
+    def encode_end(self) -> bytes:
+        self._writer.close()
+        return self._flush()
+
+
+CODECS = {COLUMNS_TYPE: ColumnsCodec, ARROW_STREAM_TYPE: ArrowCodec}
+
+
+def get_codec(content_type: Optional[str], max_frame_rows: int):
+    codec = CODECS.get((content_type or "").split(";")[0].strip().lower())
+    return codec(max_frame_rows) if codec is not None else None
+
+
+def score_stream(
+    serving_model,
+    codec,
+    reader: io.BufferedIOBase,
+    chunk_rows: int,
+) -> Iterator[bytes]:
+    """
+    Reads request frames from `reader`, scores them `chunk_rows` at a time
+    and yields the encoded predictions, so at most one frame and one chunk
+    are held in memory. The stream header goes out with the first chunk, so
+    the first item is only yielded once the payload has started to parse.
+    """
+    header = codec.encode_start()
+    for chunk in iter_chunks(codec.read_frames(reader), chunk_rows):
+        predictions, errors = score_columns(serving_model, chunk)
+        yield header + codec.encode_chunk(chunk["trip_id"], predictions, errors)
+        header = b""
+    yield header + codec.encode_end()
+
+
+async def stream_in_thread(
+    produce: Callable[[], Iterator[bytes]], max_pending: int = 2
+) -> AsyncIterator[bytes]:
+    """
+    Runs the blocking `produce` generator in a thread and yields its items.
+    The bounded queue pauses the thread while the client reads slower than
+    it scores, and closing this generator stops the thread.
+    """
+    loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item) -> None:
+        asyncio.run_coroutine_threadsafe(items.put(item), loop).result()
+
+    def run() -> None:
+        try:
+            for item in produce():
+                if stopped.is_set():
+                    return
+                put(item)
+        except Exception as e:
+            put(e)
+        else:
+            put(done)
+
+    thread = loop.run_in_executor(None, run)
+    try:
+        while True:
+            item = await items.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        # Unblock a pending put until the thread has seen the stop
+        while not thread.done():
+            while not items.empty():
+                items.get_nowait()
+            await asyncio.wait([thread], timeout=0.1)
@@ -0,0 +1,160 @@
+import re
+import datetime
+import functools
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+REQUEST_DATETIME_FORMAT = "%Y-%m-%dT%H/%M/%S%z"
+
+# Within pandas' nanosecond Timestamp range, years at its edges fall back
+MIN_YEAR = 1678
+MAX_YEAR = 2261
+
+# The request format, 2024-08-03T10/11/12+0000, and the ISO strings the
+# pd.to_datetime fallback used to infer, 2024-08-03 10:11:12[+02:00]
+_DATETIME_PATTERN = re.compile(
+    r"(\d{4}-\d{2}-\d{2})([T ])(\d{2})([/:])(\d{2})\4(\d{2})(.*)", re.DOTALL
+)
+_OFFSET_PATTERN = re.compile(r"Z|[+-]([01]\d|2[0-3]):?[0-5]\d")
+
+# Character positions of YYYY-MM-DD?HH?MM?SS
+_PREFIX_LENGTH = 19
+_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+
+
+@functools.lru_cache(maxsize=4096)
+def _date_fields(date: str) -> Optional[Tuple[int, int]]:
+    # Requests mostly share a handful of dates, keep their day of week
+    year, month, day = int(date[:4]), int(date[5:7]), int(date[8:10])
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        return None
+    try:
+        return datetime.date(year, month, day).weekday(), day
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=256)
+def _valid_suffix(suffix: str, separator: str, date_separator: str) -> bool:
+    # The request format needs the T and an offset, ISO strings may omit it
+    if separator == "/":
+        return date_separator == "T" and _OFFSET_PATTERN.fullmatch(suffix) is not None
+    return suffix == "" or _OFFSET_PATTERN.fullmatch(suffix) is not None
+
+
+def _parse_fast(value: str) -> Optional[Tuple[int, int, int, int]]:
+    match = _DATETIME_PATTERN.fullmatch(value)
+    if match is None:
+        return None
+
+    date, date_separator, hour, separator, minute, second, suffix = match.groups()
+    if not _valid_suffix(suffix, separator, date_separator):
+        return None
+
+    hour, minute = int(hour), int(minute)
+    # pd.to_datetime rolls a 60th second over into the next minute, leave
+    # that to it
+    if hour > 23 or minute > 59 or int(second) > 59:
+        return None
+
+    date_fields = _date_fields(date)
+    if date_fields is None:
+        return None
+    return (hour, minute) + date_fields
+
+
+def _parse_with_pandas(value: str) -> Tuple[int, int, int, int]:
+    import pandas as pd
+
+    try:
+        timestamp = pd.to_datetime(value, format=REQUEST_DATETIME_FORMAT)
+    except ValueError:
+        timestamp = pd.to_datetime(value)
+    return timestamp.hour, timestamp.minute, timestamp.dayofweek, timestamp.day
+
+
+def parse_request_datetime(value: str) -> Tuple[int, int, int, int]:
+    """
+    Parse a request datetime into hour, minute, day of week (Monday is 0) and
+    day of month, in the wall-clock time of the string as pd.to_datetime
+    did: the UTC offset is validated but not applied. Strings outside the
+    known formats still go through pd.to_datetime.
+    :raises ValueError: When pd.to_datetime cannot parse the value either.
+    """
+    fields = _parse_fast(value)
+    if fields is None:
+        fields = _parse_with_pandas(value)
+    return fields
+
+
+def _decode_prefix(values: Sequence[str]) -> Optional[tuple]:
+    # Fixed-width bytes of the first 19 characters, one row per value
+    try:
+        prefix = np.array(values, dtype=f"S{_PREFIX_LENGTH}")
+    except UnicodeEncodeError:
+        return None
+    chars = prefix.view(np.uint8).reshape(len(values), _PREFIX_LENGTH)
+
+    # Bytes below "0" wrap around past 9
+    digits = chars[:, _DIGITS] - np.uint8(ord("0"))
+    valid = (digits <= 9).all(axis=1)
+    valid &= (chars[:, 4] == ord("-")) & (chars[:, 7] == ord("-"))
+    valid &= (chars[:, 10] == ord("T")) | (chars[:, 10] == ord(" "))
+    valid &= chars[:, 13] == chars[:, 16]
+    valid &= (chars[:, 13] == ord("/")) | (chars[:, 13] == ord(":"))
+
+    digits = digits.astype(np.int32)
+    pairs = digits[:, 0::2] * 10 + digits[:, 1::2]
+    year = pairs[:, 0] * 100 + pairs[:, 1]
+    month, day, hour, minute, second = pairs[:, 2:].T
+    valid &= (year >= MIN_YEAR) & (year <= MAX_YEAR)
+    valid &= (month >= 1) & (month <= 12) & (day >= 1)
+    valid &= (hour <= 23) & (minute <= 59) & (second <= 59)
+
+    # Invalid rows get a harmless month so the datetime64 casts below work
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype("M8[M]")
+    dates = months.astype("M8[D]") + np.where(valid, day - 1, 0)
+    valid &= dates.astype("M8[M]") == months
+
+    return chars, valid, dates, hour, minute, day
+
+
+def parse_request_datetimes(
+    values: Sequence[str],
+) -> Tuple[np.ndarray, List[Optional[str]]]:
+    """
+    Vectorized parse_request_datetime for a batch of requests.
+    :return: An (n, 4) int64 array of hour, minute, day of week and day of
+        month, and the error message of each row that could not be parsed.
+    """
+    n_rows = len(values)
+    fields = np.zeros((n_rows, 4), dtype=np.int64)
+    errors: List[Optional[str]] = [None] * n_rows
+    if n_rows == 0:
+        return fields, errors
+
+    decoded = _decode_prefix(values)
+    if decoded is None:
+        valid = np.zeros(n_rows, dtype=bool)
+    else:
+        chars, valid, dates, hour, minute, day = decoded
+        rows = np.flatnonzero(valid)
+        separators = chars[rows, 13].tobytes().decode()
+        date_separators = chars[rows, 10].tobytes().decode()
+        valid[rows] = [
+            _valid_suffix(values[i][_PREFIX_LENGTH:], separator, date_separator)
+            for i, separator, date_separator in zip(
+                rows.tolist(), separators, date_separators
+            )
+        ]
+        # 1970-01-01 was a Thursday
+        dayofweek = (dates.astype(np.int64) + 3) % 7
+        fields[valid] = np.column_stack([hour, minute, dayofweek, day])[valid]
+
+    for i in np.flatnonzero(~valid):
+        try:
+            fields[i] = parse_request_datetime(values[i])
+        except ValueError as e:
+            errors[i] = str(e)
+
+    return fields, errors
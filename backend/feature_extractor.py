@@ -1,142 +1,262 @@
 import os
+import csv
 import logging
-import pandas as pd
+import numpy as np
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
 from backend.api_models import PredictionRequest
+from backend.datetime_parser import (
+    REQUEST_DATETIME_FORMAT,
+    parse_request_datetime,
+    parse_request_datetimes,
+)
+from backend.feature_schema import FeatureSchema
+from backend.metrics import stage_timer
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+NUMERIC_FEATURES = [
+    "trip_distance",
+    "pickup_hour",
+    "pickup_minute",
+    "pickup_dayofweek",
+    "pickup_dayofmonth",
+    "is_from_airport",
+]
+
+ZONE_FEATURES = {
+    "borough": "Borough",
+    "service_zone": "service_zone",
+}
 
 
 class FeatureExtractor:
     def __init__(
-        self, zones_filename: str, data_folder: str, test_filename: str
+        self,
+        zones_filename: str,
+        data_folder: str,
+        feature_schema: FeatureSchema,
+        zone_tables: Optional[Dict[str, np.ndarray]] = None,
     ) -> None:
         self.logger = logging.getLogger(__name__)
         self.zones_filename = zones_filename
         self.folder = data_folder
         self.zones_filepath = os.path.join(data_folder, zones_filename)
-        self.df_zone = pd.read_csv(self.zones_filepath)
-        self.test_filepath = os.path.join(data_folder, test_filename)
 
-    def _get_dummy_columns(self):
-        test_df_top = pd.read_csv(self.test_filepath, nrows=0)
-        test_df_top.drop(columns=["trip_time"], inplace=True)
-        return test_df_top.columns.tolist()
-
-    def _reorder_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        expected_columns = self._get_dummy_columns()
+        self.feature_schema = feature_schema
+        self.feature_columns = feature_schema.columns
+        self.column_index = feature_schema.column_index
+        self.numeric_index = np.array(
+            [self.column_index.get(col, -1) for col in NUMERIC_FEATURES],
+            dtype=np.int64,
+        )
 
-        for col in expected_columns:
-            if col not in df.columns:
-                df[col] = 0
+        if zone_tables is None:
+            self._build_zone_tables(self._read_zones())
+        else:
+            # Built for this schema elsewhere, e.g. mapped from a shared model
+            self.location_valid = zone_tables["location_valid"]
+            self.pickup_columns = zone_tables["pickup_columns"]
+            self.dropoff_columns = zone_tables["dropoff_columns"]
 
-        return df[expected_columns]
+    def _read_zones(self) -> List[dict]:
+        # Plain csv instead of pandas: values pandas reads as NaN, e.g. "N/A",
+        # never name a one-hot column, so they get no column either way
+        with open(self.zones_filepath, newline="") as f:
+            return [row for row in csv.DictReader(f) if row["LocationID"]]
 
-    def _merge_zones(self, df: pd.DataFrame) -> pd.DataFrame:
-        df = pd.merge(
-            df, self.df_zone, left_on="PULocationID", right_on="LocationID", how="left"
+    def _build_zone_tables(self, zones: List[dict]) -> None:
+        # Dense tables indexed by LocationID holding the position of the one-hot
+        # column each zone attribute sets, or -1 when it has no column (the
+        # category dropped by get_dummies, NaN or an unseen category)
+        location_ids = np.array(
+            [int(zone["LocationID"]) for zone in zones], dtype=np.int64
         )
+        size = int(location_ids.max()) + 1 if len(location_ids) else 0
 
-        unmatched_rows = df[df["LocationID"].isnull()]
-        if not unmatched_rows.empty:
-            self.logger.error(
-                f"{len(unmatched_rows)} pickup location ID not found, example ID from request: {unmatched_rows['PULocationID'].values[0]}"
-            )
+        self.location_valid = np.zeros(size, dtype=bool)
+        self.location_valid[location_ids] = True
 
-        df = df.rename(
-            columns={
-                "Borough": "pickup_borough",
-                "Zone": "pickup_zone",
-                "service_zone": "pickup_service_zone",
-            }
-        )
-        df = df.drop(columns=["PULocationID", "pickup_zone", "LocationID"])
+        self.pickup_columns = np.full((size, len(ZONE_FEATURES)), -1, dtype=np.int64)
+        self.dropoff_columns = np.full((size, len(ZONE_FEATURES)), -1, dtype=np.int64)
+
+        for prefix, table in (
+            ("pickup", self.pickup_columns),
+            ("dropoff", self.dropoff_columns),
+        ):
+            for j, (feature, zone_column) in enumerate(ZONE_FEATURES.items()):
+                for location_id, zone in zip(location_ids, zones):
+                    value = zone[zone_column]
+                    table[location_id, j] = self.column_index.get(
+                        f"{prefix}_{feature}_{value}", -1
+                    )
 
-        df = pd.merge(
-            df, self.df_zone, left_on="DOLocationID", right_on="LocationID", how="left"
+    def _zone_columns(self, table: np.ndarray, location_id: int, direction: str):
+        if (
+            0 <= location_id < len(self.location_valid)
+            and self.location_valid[location_id]
+        ):
+            return table[location_id]
+
+        self.logger.error(
+            f"1 {direction} location ID not found, example ID from request: {location_id}"
         )
+        return ()
 
-        unmatched_rows = df[df["LocationID"].isnull()]
-        if not unmatched_rows.empty:
+    def _parse_request_datetime(
+        self, request: PredictionRequest
+    ) -> Tuple[int, int, int, int]:
+        try:
+            return parse_request_datetime(request.request_datetime)
+        except ValueError:
             self.logger.error(
-                f"{len(unmatched_rows)} dropoff location ID not found, example ID from request: {unmatched_rows['DOLocationID'].values[0]}"
+                f"Request datetime {request.request_datetime} does not match the expected format {REQUEST_DATETIME_FORMAT} nor the default format"
             )
+            raise
 
-        df = df.rename(
-            columns={
-                "Borough": "dropoff_borough",
-                "Zone": "dropoff_zone",
-                "service_zone": "dropoff_service_zone",
-            }
-        )
-        df = df.drop(columns=["DOLocationID", "dropoff_zone", "LocationID"])
+    def extract_feature_vector(
+        self, request: PredictionRequest, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        timer = stage_timer()
+        hour, minute, dayofweek, day = self._parse_request_datetime(request)
+        timer.lap("parse_datetime")
 
-        return df
+        if request.trip_distance < 0:
+            self.logger.warning(
+                f"Trip distance is negative: {request.trip_distance}, converting to positive"
+            )
 
-    def _one_hot_encode(self, df: pd.DataFrame) -> pd.DataFrame:
+        if out is None:
+            out = np.zeros(len(self.feature_columns), dtype=np.float32)
+        else:
+            out[:] = 0
 
-        # Manually create one-hot encoding for categorical columns
-        pickup_borough = f"pickup_borough_{df.at[0, 'pickup_borough']}"
-        pickup_service_zone = f"pickup_service_zone_{df.at[0, 'pickup_service_zone']}"
-        dropoff_borough = f"dropoff_borough_{df.at[0, 'dropoff_borough']}"
-        dropoff_service_zone = (
-            f"dropoff_service_zone_{df.at[0, 'dropoff_service_zone']}"
+        # Values in NUMERIC_FEATURES order
+        numeric_values = (
+            abs(request.trip_distance),
+            hour,
+            minute,
+            dayofweek,
+            day,
+            request.Airport,
         )
+        for column, value in zip(self.numeric_index, numeric_values):
+            if column >= 0:
+                out[column] = value
+        timer.lap("encode_numeric")
 
-        # Initialize the dummy columns with zeros
-        for column in self._get_dummy_columns():
-            if column not in df.columns:
-                df[column] = 0
+        for column in self._zone_columns(
+            self.pickup_columns, request.PULocationID, "pickup"
+        ):
+            if column >= 0:
+                out[column] = 1
 
-        # Set the respective column to 1
-        if pickup_borough in df.columns:
-            df[pickup_borough] = 1
-        else:
-            self.logger.error(f"Column {pickup_borough} not found in the dataframe")
+        for column in self._zone_columns(
+            self.dropoff_columns, request.DOLocationID, "dropoff"
+        ):
+            if column >= 0:
+                out[column] = 1
+        timer.lap("encode_zones")
 
-        if pickup_service_zone in df.columns:
-            df[pickup_service_zone] = 1
+        return out
 
-        if dropoff_borough in df.columns:
-            df[dropoff_borough] = 1
+    def _encode_zones(
+        self,
+        out: np.ndarray,
+        location_ids: np.ndarray,
+        rows_mask: np.ndarray,
+        table: np.ndarray,
+        direction: str,
+    ) -> None:
+        known = (location_ids >= 0) & (location_ids < len(self.location_valid))
+        known[known] = self.location_valid[location_ids[known]]
 
-        if dropoff_service_zone in df.columns:
-            df[dropoff_service_zone] = 1
+        unknown = rows_mask & ~known
+        if unknown.any():
+            self.logger.error(
+                f"{unknown.sum()} {direction} location ID not found, example ID from request: {location_ids[unknown][0]}"
+            )
 
-        return df
+        rows = np.flatnonzero(rows_mask & known)
+        columns = table[location_ids[rows]]
+        rows = np.repeat(rows, columns.shape[1])
+        columns = columns.ravel()
+        found = columns >= 0
+        out[rows[found], columns[found]] = 1
 
-    def extract_features(self, request: PredictionRequest) -> pd.DataFrame:
+    def extract_feature_columns(
+        self,
+        request_datetime: Sequence[str],
+        trip_distance: np.ndarray,
+        pickup_location_id: np.ndarray,
+        dropoff_location_id: np.ndarray,
+        airport: np.ndarray,
+        dtype: np.dtype = np.float32,
+    ) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """
+        Feature matrix from columns of PredictionRequest fields, one row per
+        request.
+        :return: The feature matrix and, per row, the error that left it empty
+            or None.
+        """
+        timer = stage_timer()
+        n_rows = len(request_datetime)
+        out = np.zeros((n_rows, len(self.feature_columns)), dtype=dtype)
 
-        expected_format = "%Y-%m-%dT%H/%M/%S%z"
-        try:
-            request_datetime = pd.to_datetime(
-                request.request_datetime, format=expected_format
+        datetime_fields, errors = parse_request_datetimes(request_datetime)
+        valid = np.array([error is None for error in errors], dtype=bool)
+        if not valid.all():
+            self.logger.error(
+                f"{n_rows - valid.sum()} request datetimes do not match the expected format {REQUEST_DATETIME_FORMAT} nor the default format, example from request: {request_datetime[np.flatnonzero(~valid)[0]]}"
             )
-        except ValueError:
-            try:
-                request_datetime = pd.to_datetime(request.request_datetime)
-            except ValueError:
-                self.logger.error(
-                    f"Request datetime {request.request_datetime} does not match the expected format {expected_format} nor the default format"
-                )
-                raise
+        timer.lap("parse_datetime_batch")
 
-        if request.trip_distance < 0:
+        trip_distance = np.asarray(trip_distance, dtype=np.float64)
+        negative_distance = valid & (trip_distance < 0)
+        if negative_distance.any():
             self.logger.warning(
-                f"Trip distance is negative: {request.trip_distance}, converting to positive"
+                f"{negative_distance.sum()} trip distances are negative, converting to positive"
             )
 
-        features = {
-            "trip_distance": abs(request.trip_distance),
-            "pickup_hour": request_datetime.hour,
-            "pickup_minute": request_datetime.minute,
-            "pickup_dayofweek": request_datetime.dayofweek,
-            "pickup_dayofmonth": request_datetime.day,
-            "is_from_airport": request.Airport,
-            "PULocationID": request.PULocationID,
-            "DOLocationID": request.DOLocationID,
-        }
-
-        df = pd.DataFrame([features])
-        df = self._merge_zones(df)
-        df = self._one_hot_encode(df)
-        df = self._reorder_columns(df)
-        df = df.astype(float)
+        # Columns in NUMERIC_FEATURES order
+        numeric_values = np.column_stack(
+            [np.abs(trip_distance), datetime_fields, np.asarray(airport)]
+        )
+        present = self.numeric_index >= 0
+        out[np.ix_(valid, self.numeric_index[present])] = numeric_values[valid][
+            :, present
+        ]
+
+        pickup_location_id = np.asarray(pickup_location_id, dtype=np.int64)
+        dropoff_location_id = np.asarray(dropoff_location_id, dtype=np.int64)
+        self._encode_zones(
+            out, pickup_location_id, valid, self.pickup_columns, "pickup"
+        )
+        self._encode_zones(
+            out, dropoff_location_id, valid, self.dropoff_columns, "dropoff"
+        )
+        timer.lap("encode_batch")
+
+        return out, errors
+
+    def extract_feature_matrix(
+        self, requests: List[PredictionRequest], dtype: np.dtype = np.float32
+    ) -> Tuple[np.ndarray, List[Optional[str]]]:
+        return self.extract_feature_columns(
+            [request.request_datetime for request in requests],
+            np.array([request.trip_distance for request in requests], dtype=np.float64),
+            np.array([request.PULocationID for request in requests], dtype=np.int64),
+            np.array([request.DOLocationID for request in requests], dtype=np.int64),
+            np.array([request.Airport for request in requests], dtype=np.float64),
+            dtype=dtype,
+        )
+
+    def extract_features(self, request: PredictionRequest) -> "pd.DataFrame":
+        import pandas as pd
+
+        features = np.zeros(len(self.feature_columns), dtype=np.float64)
+        self.extract_feature_vector(request, out=features)
+        timer = stage_timer()
+        df = pd.DataFrame(features[np.newaxis, :], columns=self.feature_columns)
+        timer.lap("to_dataframe")
         return df
@@ -0,0 +1,80 @@
+import json
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+TARGET_COLUMN = "trip_time"
+
+
+class FeatureSchema:
+    """
+    Ordered list of the model input columns, shared by the pipeline and the API.
+    """
+
+    def __init__(self, columns: List[str], target: str = TARGET_COLUMN) -> None:
+        self.columns = [col for col in columns if col != target]
+        self.target = target
+        self.column_index: Dict[str, int] = {
+            col: i for i, col in enumerate(self.columns)
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FeatureSchema):
+            return NotImplemented
+        return self.columns == other.columns and self.target == other.target
+
+    def index(self, column: str, default: int = -1) -> int:
+        return self.column_index.get(column, default)
+
+    def missing_columns(self, columns: List[str]) -> List[str]:
+        present = set(columns)
+        return [col for col in self.columns if col not in present]
+
+    @classmethod
+    def from_model(cls, model, target: str = TARGET_COLUMN) -> "FeatureSchema":
+        # xgb.Booster keeps the DataFrame column names it was trained on
+        if not model.feature_names:
+            raise ValueError("Model has no feature names, cannot derive the schema")
+        return cls(list(model.feature_names), target=target)
+
+    @classmethod
+    def from_frame(
+        cls, df: "pd.DataFrame", target: str = TARGET_COLUMN
+    ) -> "FeatureSchema":
+        return cls(df.columns.tolist(), target=target)
+
+    @classmethod
+    def from_csv_header(
+        cls, filepath: str, target: str = TARGET_COLUMN
+    ) -> "FeatureSchema":
+        import pandas as pd
+
+        return cls.from_frame(pd.read_csv(filepath, nrows=0), target=target)
+
+    @classmethod
+    def from_file(cls, filepath: str) -> "FeatureSchema":
+        with open(filepath) as f:
+            schema = json.load(f)
+        return cls(schema["columns"], target=schema.get("target", TARGET_COLUMN))
+
+    def save(self, filepath: str) -> None:
+        folder = os.path.dirname(filepath)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(filepath, "w") as f:
+            json.dump({"columns": self.columns, "target": self.target}, f, indent=2)
+
+
+def load_feature_schema(model=None, schema_path: Optional[str] = None) -> FeatureSchema:
+    if model is not None and model.feature_names:
+        return FeatureSchema.from_model(model)
+    if schema_path is not None and os.path.exists(schema_path):
+        return FeatureSchema.from_file(schema_path)
+    raise FileNotFoundError(
+        f"Feature schema not available from the model nor at {schema_path}"
+    )
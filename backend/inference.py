@@ -0,0 +1,72 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+from backend.metrics import StageRecorder, get_serving_metrics, set_serving_metrics
+
+INFERENCE_MODES = ("inline", "thread", "process")
+
+
+def run_recording_stages(fn: Callable, *args):
+    """
+    Runs `fn` in a pool worker with its stage timings recorded, since the
+    worker's own metrics are never rendered.
+
+    :return: The result of `fn` and the (stage, seconds) laps it timed.
+    """
+    recorder = StageRecorder()
+    metrics = get_serving_metrics()
+    set_serving_metrics(recorder)
+    try:
+        return fn(*args), recorder.laps
+    finally:
+        set_serving_metrics(metrics)
+
+
+class InferenceExecutor:
+    """
+    Runs CPU-bound feature extraction and inference inline on the event loop,
+    in a bounded thread pool or in a process pool.
+    """
+
+    def __init__(self, mode: str = "inline", max_workers: Optional[int] = None):
+        if mode not in INFERENCE_MODES:
+            raise ValueError(
+                f"Unknown inference mode {mode}, expected one of {INFERENCE_MODES}"
+            )
+
+        self.mode = mode
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+
+        if mode == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="inference"
+            )
+        elif mode == "process":
+            # Forking after xgboost has started its OpenMP threads can deadlock
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    async def run(self, fn: Callable, *args):
+        if self._executor is None:
+            return fn(*args)
+
+        loop = asyncio.get_running_loop()
+        metrics = get_serving_metrics()
+        if self.mode != "process" or metrics is None:
+            return await loop.run_in_executor(self._executor, fn, *args)
+
+        result, laps = await loop.run_in_executor(
+            self._executor, run_recording_stages, fn, *args
+        )
+        for stage, seconds in laps:
+            metrics.observe_stage(stage, seconds)
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
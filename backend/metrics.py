@@ -0,0 +1,239 @@
+import os
+import time
+import bisect
+import threading
+from typing import Dict, Optional, Tuple
+
+# Upper bounds in seconds, from 10us to 1s
+LATENCY_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        # One count per bucket plus +Inf, cumulated only when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum!r}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class ServingMetrics:
+    """
+    In-memory request counters, in-flight gauges, per-stage latency
+    histograms and gauges set once, e.g. startup timings, rendered in the
+    Prometheus text format.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.stages: Dict[str, LatencyHistogram] = {}
+        self.request_durations: Dict[str, LatencyHistogram] = {}
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.in_flight: Dict[str, int] = {}
+        # Value by metric name and label string
+        self.gauges: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = LatencyHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    def set_gauge(self, name: str, value: float, labels: str = "") -> None:
+        with self._lock:
+            self.gauges.setdefault(name, {})[labels] = value
+
+    def request_started(self, path: str) -> None:
+        with self._lock:
+            self.in_flight[path] = self.in_flight.get(path, 0) + 1
+
+    def request_finished(self, path: str, status: int, seconds: float) -> None:
+        with self._lock:
+            self.in_flight[path] -= 1
+            key = (path, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.request_durations.get(path)
+            if histogram is None:
+                histogram = self.request_durations[path] = LatencyHistogram(
+                    self.buckets
+                )
+            histogram.observe(seconds)
+
+    def render(self, model_version: Optional[str] = None) -> str:
+        lines = []
+        with self._lock:
+            lines.append("# TYPE nytaxi_requests_total counter")
+            for (path, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'nytaxi_requests_total{{path="{path}",status="{status}"}} {count}'
+                )
+
+            lines.append("# TYPE nytaxi_requests_in_flight gauge")
+            for path, count in sorted(self.in_flight.items()):
+                lines.append(f'nytaxi_requests_in_flight{{path="{path}"}} {count}')
+
+            lines.append("# TYPE nytaxi_request_duration_seconds histogram")
+            for path, histogram in sorted(self.request_durations.items()):
+                lines.extend(
+                    histogram.render(
+                        "nytaxi_request_duration_seconds", f'path="{path}"'
+                    )
+                )
+
+            lines.append("# TYPE nytaxi_stage_duration_seconds histogram")
+            for stage, histogram in sorted(self.stages.items()):
+                lines.extend(
+                    histogram.render(
+                        "nytaxi_stage_duration_seconds", f'stage="{stage}"'
+                    )
+                )
+
+            for name, values in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in sorted(values.items()):
+                    lines.append(
+                        f"{name}{{{labels}}} {value!r}"
+                        if labels
+                        else f"{name} {value!r}"
+                    )
+
+        if model_version is not None:
+            lines.append("# TYPE nytaxi_model_info gauge")
+            lines.append(f'nytaxi_model_info{{version="{model_version}"}} 1')
+
+        return "\n".join(lines) + "\n"
+
+
+class StageRecorder:
+    """
+    Keeps stage timings as (stage, seconds) laps, for a pool worker to send
+    back with its result and the parent to observe.
+    """
+
+    def __init__(self) -> None:
+        self.laps = []
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        self.laps.append((stage, seconds))
+
+
+class StageTimer:
+    """
+    Times consecutive stages of one call: each lap records the time since
+    the previous lap, or since the timer was created.
+    """
+
+    __slots__ = ("metrics", "last")
+
+    def __init__(self, metrics: ServingMetrics) -> None:
+        self.metrics = metrics
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.metrics.observe_stage(stage, now - self.last)
+        self.last = now
+
+
+class NullStageTimer:
+    __slots__ = ()
+
+    def lap(self, stage: str) -> None:
+        pass
+
+
+NULL_STAGE_TIMER = NullStageTimer()
+
+_serving_metrics = (
+    ServingMetrics() if os.getenv("SERVING_METRICS", "true").lower() == "true" else None
+)
+
+
+def get_serving_metrics() -> Optional[ServingMetrics]:
+    return _serving_metrics
+
+
+def set_serving_metrics(metrics: Optional[ServingMetrics]) -> None:
+    global _serving_metrics
+    _serving_metrics = metrics
+
+
+def stage_timer():
+    # A shared no-op timer when metrics are disabled, so call sites stay cheap
+    if _serving_metrics is None:
+        return NULL_STAGE_TIMER
+    return StageTimer(_serving_metrics)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware counting requests per path and status, much cheaper
+    than a BaseHTTPMiddleware. Paths that match no route are grouped as
+    "other" to keep the label set bounded.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.paths = None
+
+    def path_label(self, scope) -> str:
+        if self.paths is None:
+            self.paths = {getattr(route, "path", None) for route in scope["app"].routes}
+        return scope["path"] if scope["path"] in self.paths else "other"
+
+    async def __call__(self, scope, receive, send):
+        metrics = _serving_metrics
+        if metrics is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = self.path_label(scope)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started_at = time.perf_counter()
+        metrics.request_started(path)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.request_finished(path, status, time.perf_counter() - started_at)
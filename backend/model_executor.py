@@ -1,14 +1,119 @@
-import xgboost as xgb
-from typing import List
-import pandas as pd
+import logging
+import numpy as np
+from typing import TYPE_CHECKING, List, Optional, Union
+from backend.feature_schema import FeatureSchema, load_feature_schema
+from backend.metrics import stage_timer
+from backend.tree_engine import TreeEnsemble
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+MODEL_ENGINES = ("xgboost", "numpy")
 
 
 class ModelExecutor:
-    def __init__(self, model_path: str):
-        self.model = xgb.Booster()
-        self.model.load_model(model_path)
+    def __init__(
+        self,
+        model_path: str,
+        schema_path: Optional[str] = None,
+        nthread: Optional[int] = None,
+        engine: str = "xgboost",
+        check_parity: bool = True,
+        tree_ensemble: Optional[TreeEnsemble] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        if engine not in MODEL_ENGINES:
+            raise ValueError(
+                f"Unknown engine {engine}, expected one of {MODEL_ENGINES}"
+            )
 
-    def predict(self, df: pd.DataFrame) -> float:
-        dmatrix = xgb.DMatrix(df)
-        predictions = self.model.predict(dmatrix)
+        if tree_ensemble is not None and engine != "numpy":
+            raise ValueError("A prebuilt tree ensemble needs the numpy engine")
+
+        self.engine = engine
+        self.model = None
+        self.tree_ensemble = tree_ensemble
+
+        if engine == "numpy" and tree_ensemble is None:
+            self.tree_ensemble = TreeEnsemble.from_json_file(model_path)
+
+        # xgboost imports pandas and scipy, the numpy engine skips it entirely
+        # unless the parity check needs the Booster
+        if engine == "xgboost" or check_parity:
+            import xgboost as xgb
+
+            self.model = xgb.Booster()
+            self.model.load_model(model_path)
+            if nthread is not None:
+                self.model.set_param({"nthread": nthread})
+
+        self.feature_schema: FeatureSchema = load_feature_schema(
+            self.model if self.model is not None else self.tree_ensemble, schema_path
+        )
+
+        if self.tree_ensemble is not None and check_parity:
+            self._check_engine_parity()
+
+    def _check_engine_parity(self, n_rows: int = 256, tolerance: float = 1e-4) -> None:
+        # Random probe rows around the value range of the features
+        rng = np.random.default_rng(0)
+        probe = rng.uniform(-1, 60, size=(n_rows, len(self.feature_schema)))
+        probe = probe.astype(np.float32)
+        probe[rng.random(probe.shape) < 0.05] = np.nan
+
+        max_difference = self.tree_ensemble.check_parity(self.model, probe)
+        if max_difference > tolerance:
+            self.logger.error(
+                f"Tree engine differs from Booster.predict by {max_difference}"
+            )
+            raise ValueError(
+                f"Tree engine differs from Booster.predict by {max_difference}"
+            )
+        self.logger.info(f"Tree engine parity checked, max difference {max_difference}")
+
+    def _run_model(self, features: np.ndarray) -> np.ndarray:
+        if self.tree_ensemble is not None:
+            return self.tree_ensemble.predict(features)
+        return self.model.inplace_predict(features)
+
+    def new_buffer(self, rows: int = 1) -> np.ndarray:
+        return np.zeros((rows, len(self.feature_schema)), dtype=np.float32)
+
+    def _as_array(self, features: Union["pd.DataFrame", np.ndarray]) -> np.ndarray:
+        if not isinstance(features, np.ndarray):
+            if features.columns.tolist() != self.feature_schema.columns:
+                features = features[self.feature_schema.columns]
+            return features.to_numpy(dtype=np.float32)
+
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if features.dtype not in (np.float32, np.float64):
+            features = features.astype(np.float32)
+        # No copy for C-contiguous float buffers, so callers can reuse them
+        return np.ascontiguousarray(features)
+
+    def predict(self, features: Union["pd.DataFrame", np.ndarray]) -> float:
+        timer = stage_timer()
+        features = self._as_array(features)
+        timer.lap("model_input")
+        predictions = self._run_model(features)
+        timer.lap("model_predict")
         return predictions[0]
+
+    def predict_batch(self, features: Union["pd.DataFrame", np.ndarray]) -> np.ndarray:
+        if len(features) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        timer = stage_timer()
+        features = self._as_array(features)
+        timer.lap("model_input_batch")
+        predictions = self._run_model(features)
+        timer.lap("model_predict_batch")
+        return predictions
+
+    def predict_dmatrix(self, df: "pd.DataFrame") -> np.ndarray:
+        import xgboost as xgb
+
+        # Reference path, kept for parity checks and benchmarks
+        dmatrix = xgb.DMatrix(df)
+        return self.model.predict(dmatrix)
@@ -0,0 +1,85 @@
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predictions keyed by the encoded feature vector, with
+    TTL expiry. Each model version gets its own cache, so a reloaded model
+    starts from an empty one.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl_seconds: float = 300,
+        distance_index: int = -1,
+        distance_decimals: Optional[int] = None,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.distance_index = distance_index
+        self.distance_decimals = distance_decimals
+
+        self._entries: "OrderedDict[bytes, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, features: np.ndarray) -> bytes:
+        if self.distance_decimals is not None and self.distance_index >= 0:
+            features = features.copy()
+            features[..., self.distance_index] = np.round(
+                features[..., self.distance_index], self.distance_decimals
+            )
+        return features.tobytes()
+
+    def get(self, features: np.ndarray) -> Optional[float]:
+        key = self.key(features)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            prediction, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return prediction
+
+    def put(self, features: np.ndarray, prediction: float) -> None:
+        key = self.key(features)
+        expires_at = time.monotonic() + self.ttl_seconds
+
+        with self._lock:
+            self._entries[key] = (prediction, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,98 @@
+import os
+import time
+import hashlib
+from typing import Optional, Tuple
+from backend.model_executor import ModelExecutor
+from backend.feature_extractor import FeatureExtractor
+from backend.feature_schema import FeatureSchema
+from backend.shared_model import ensure_shared_model, load_shared_model
+
+
+class ModelVersionUnavailable(RuntimeError):
+    """
+    The requested model version is neither loaded nor the one on disk any
+    more, the request is to be retried on the current model.
+    """
+
+
+def model_file_version(model_path: str, length: int = 12) -> str:
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+
+def model_file_signature(model_path: str) -> Optional[Tuple[int, int]]:
+    if not os.path.exists(model_path):
+        return None
+    stat = os.stat(model_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ServingModel:
+    """
+    A model and the feature extraction built for its schema, loaded together
+    and swapped as one object so a request never mixes two model versions.
+    The version is a short sha256 of the model file. With shared_dir the
+    numpy engine runs on arrays memory-mapped from shared_dir, written once
+    per version and shared by every worker process.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        schema_path: Optional[str] = None,
+        zones_filename: str = "zones.csv",
+        data_folder: str = "data",
+        engine: str = "xgboost",
+        check_parity: bool = True,
+        shared_dir: Optional[str] = None,
+        nthread: Optional[int] = None,
+    ) -> None:
+        self.model_path = model_path
+        self.signature = model_file_signature(model_path)
+        self.version = model_file_version(model_path)
+
+        tree_ensemble, zone_tables = None, None
+        if shared_dir is not None:
+            shared_path = ensure_shared_model(
+                shared_dir,
+                self.version,
+                model_path,
+                schema_path=schema_path,
+                zones_filepath=os.path.join(data_folder, zones_filename),
+                check_parity=check_parity,
+            )
+            tree_ensemble, zone_tables = load_shared_model(shared_path)
+            # Parity was checked once when the shared arrays were written
+            engine, check_parity = "numpy", False
+
+        self.model_executor = ModelExecutor(
+            model_path=model_path,
+            schema_path=schema_path,
+            nthread=nthread,
+            engine=engine,
+            check_parity=check_parity,
+            tree_ensemble=tree_ensemble,
+        )
+        self.feature_extractor = FeatureExtractor(
+            zones_filename=zones_filename,
+            data_folder=data_folder,
+            feature_schema=self.feature_schema,
+            zone_tables=zone_tables,
+        )
+
+        # The file was replaced while it was read, the version may not match
+        if model_file_signature(model_path) != self.signature:
+            raise RuntimeError(f"{model_path} changed while it was being loaded")
+
+        self.loaded_at = time.time()
+
+        # Set by the API for the serving process only
+        self.micro_batcher = None
+        self.prediction_cache = None
+
+    @property
+    def feature_schema(self) -> FeatureSchema:
+        return self.model_executor.feature_schema
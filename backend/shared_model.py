@@ -0,0 +1,165 @@
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import logging
+import numpy as np
+from typing import Dict, Optional, Tuple
+from backend.feature_extractor import FeatureExtractor
+from backend.model_executor import ModelExecutor
+from backend.tree_engine import TreeEnsemble
+
+TREE_ARRAYS = (
+    "left_children",
+    "right_children",
+    "split_indices",
+    "split_conditions",
+    "default_left",
+    "roots",
+)
+ZONE_TABLES = ("location_valid", "pickup_columns", "dropoff_columns")
+
+logger = logging.getLogger(__name__)
+
+
+def export_shared_model(
+    tree_ensemble: TreeEnsemble,
+    zone_tables: Dict[str, np.ndarray],
+    path: str,
+) -> None:
+    """
+    Write the flattened trees and zone lookup tables as .npy files next to a
+    meta.json, into a temporary directory renamed to path once complete.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    os.makedirs(tmp_path)
+
+    arrays = {name: getattr(tree_ensemble, name) for name in TREE_ARRAYS}
+    arrays.update({name: zone_tables[name] for name in ZONE_TABLES})
+    meta = {
+        "max_depth": tree_ensemble.max_depth,
+        "base_score": float(tree_ensemble.base_score),
+        "feature_names": tree_ensemble.feature_names,
+    }
+
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.rename(tmp_path, path)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+def load_shared_model(path: str) -> Tuple[TreeEnsemble, Dict[str, np.ndarray]]:
+    """
+    Map the arrays written by export_shared_model read-only, so every worker
+    process shares the same physical pages through the page cache.
+    """
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+
+    def load(name: str) -> np.ndarray:
+        # Plain ndarray views of the mapping, np.memmap slows down every gather
+        return np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+
+    tree_ensemble = TreeEnsemble(
+        **{name: load(name) for name in TREE_ARRAYS},
+        max_depth=meta["max_depth"],
+        base_score=meta["base_score"],
+        feature_names=meta["feature_names"],
+    )
+    zone_tables = {name: load(name) for name in ZONE_TABLES}
+    return tree_ensemble, zone_tables
+
+
+def prune_shared_models(directory: str, keep: int = 2) -> None:
+    # Workers still mapping a removed version keep their pages until they swap
+    versions = [
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if not name.startswith(".") and ".tmp-" not in name
+    ]
+    versions.sort(key=os.path.getmtime, reverse=True)
+    for path in versions[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def shared_model_key(
+    version: str,
+    zones_filepath: str,
+    schema_path: Optional[str] = None,
+    length: int = 12,
+) -> str:
+    """
+    The directory name of a model version's shared arrays. The zone tables
+    are compiled from the zones file for the feature schema, so their
+    contents are hashed in with the model version.
+    """
+    digest = hashlib.sha256()
+    for path in (zones_filepath, schema_path):
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        digest.update(b"\0")
+    return f"{version}-{digest.hexdigest()[:length]}"
+
+
+def ensure_shared_model(
+    directory: str,
+    version: str,
+    model_path: str,
+    schema_path: Optional[str] = None,
+    zones_filepath: str = "data/zones.csv",
+    check_parity: bool = True,
+) -> str:
+    """
+    Return the directory holding the shared arrays of this model version,
+    zones file and feature schema, building it first if no other process did.
+    Concurrent callers wait on a file lock so the model is compiled only once.
+    :return: The path to pass to load_shared_model.
+    """
+    path = os.path.join(
+        directory, shared_model_key(version, zones_filepath, schema_path)
+    )
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(path):
+                return path
+
+            # Imported here to avoid a circular import
+            from backend.serving_model import model_file_version
+
+            model_executor = ModelExecutor(
+                model_path=model_path,
+                schema_path=schema_path,
+                engine="numpy",
+                check_parity=check_parity,
+            )
+            feature_extractor = FeatureExtractor(
+                zones_filename=os.path.basename(zones_filepath),
+                data_folder=os.path.dirname(zones_filepath),
+                feature_schema=model_executor.feature_schema,
+            )
+            if model_file_version(model_path) != version:
+                raise RuntimeError(f"{model_path} no longer holds version {version}")
+
+            export_shared_model(
+                model_executor.tree_ensemble,
+                {name: getattr(feature_extractor, name) for name in ZONE_TABLES},
+                path,
+            )
+            logger.info(f"Shared model {version} written to {path}")
+            prune_shared_models(directory)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    return path
@@ -0,0 +1,161 @@
+import json
+import numpy as np
+from typing import List, Optional
+
+SUPPORTED_OBJECTIVES = ("reg:squarederror", "reg:absoluteerror", "reg:pseudohubererror")
+
+
+class TreeEnsemble:
+    """
+    XGBoost regression trees flattened into node arrays and evaluated for a
+    whole batch at once with NumPy gathers, one tree level per step.
+    """
+
+    def __init__(
+        self,
+        left_children: np.ndarray,
+        right_children: np.ndarray,
+        split_indices: np.ndarray,
+        split_conditions: np.ndarray,
+        default_left: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        base_score: float,
+        feature_names: Optional[List[str]] = None,
+    ) -> None:
+        self.left_children = left_children
+        self.right_children = right_children
+        self.split_indices = split_indices
+        self.split_conditions = split_conditions
+        self.default_left = default_left
+        self.roots = roots
+        self.max_depth = max_depth
+        self.base_score = np.float32(base_score)
+        self.feature_names = feature_names
+
+    @classmethod
+    def from_json_file(cls, model_path: str) -> "TreeEnsemble":
+        with open(model_path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_booster(cls, booster) -> "TreeEnsemble":
+        return cls.from_dict(json.loads(booster.save_raw(raw_format="json")))
+
+    @classmethod
+    def from_dict(cls, model: dict) -> "TreeEnsemble":
+        learner = model["learner"]
+        objective = learner["objective"]["name"]
+        if objective not in SUPPORTED_OBJECTIVES:
+            raise ValueError(f"Objective {objective} is not supported")
+
+        booster = learner["gradient_booster"]
+        if booster["name"] != "gbtree":
+            raise ValueError(f"Booster {booster['name']} is not supported")
+
+        model_param = learner["learner_model_param"]
+        if int(model_param.get("num_target", 1)) > 1:
+            raise ValueError("Multi-target models are not supported")
+        base_score = float(model_param["base_score"].strip("[]"))
+
+        trees = booster["model"]["trees"]
+        left_children, right_children = [], []
+        split_indices, split_conditions, default_left = [], [], []
+        roots, depths = [], []
+        offset = 0
+
+        for tree in trees:
+            if any(tree["split_type"]):
+                raise ValueError("Categorical splits are not supported")
+
+            left = np.asarray(tree["left_children"], dtype=np.int32)
+            right = np.asarray(tree["right_children"], dtype=np.int32)
+            leaf = left == -1
+
+            # Children are stored as global node ids, leaves point to themselves
+            nodes = np.arange(len(left), dtype=np.int32) + offset
+            left_children.append(np.where(leaf, nodes, left + offset))
+            right_children.append(np.where(leaf, nodes, right + offset))
+            split_indices.append(
+                np.where(leaf, 0, np.asarray(tree["split_indices"], dtype=np.int32))
+            )
+            # Leaves keep their value in split_conditions
+            split_conditions.append(
+                np.asarray(tree["split_conditions"], dtype=np.float32)
+            )
+            default_left.append(np.asarray(tree["default_left"], dtype=bool))
+            roots.append(offset)
+            depths.append(cls._tree_depth(left, right))
+            offset += len(left)
+
+        return cls(
+            left_children=np.concatenate(left_children),
+            right_children=np.concatenate(right_children),
+            split_indices=np.concatenate(split_indices),
+            split_conditions=np.concatenate(split_conditions),
+            default_left=np.concatenate(default_left),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max(depths, default=0),
+            base_score=base_score,
+            feature_names=learner.get("feature_names") or None,
+        )
+
+    @staticmethod
+    def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+        depth = 0
+        level = [0]
+        while level:
+            level = [
+                child
+                for node in level
+                for child in (left[node], right[node])
+                if child != -1
+            ]
+            if level:
+                depth += 1
+        return depth
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        features = np.asarray(features, dtype=np.float32)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+
+        n_rows = features.shape[0]
+        predictions = np.full(n_rows, self.base_score, dtype=np.float32)
+        if n_rows == 0 or len(self.roots) == 0:
+            return predictions
+
+        # (trees, rows) so each tree's leaves are contiguous when summed below
+        nodes = np.repeat(self.roots[:, np.newaxis], n_rows, axis=1)
+        flat_features = np.ascontiguousarray(features).ravel()
+        row_offsets = np.arange(n_rows, dtype=np.int64) * features.shape[1]
+
+        for _ in range(self.max_depth):
+            values = flat_features.take(row_offsets + self.split_indices.take(nodes))
+            # NaN compares False, so missing values only go left by default
+            go_left = values < self.split_conditions.take(nodes)
+            missing = np.isnan(values)
+            if missing.any():
+                go_left |= missing & self.default_left.take(nodes)
+            nodes = np.where(
+                go_left, self.left_children.take(nodes), self.right_children.take(nodes)
+            )
+
+        leaf_values = self.split_conditions.take(nodes)
+
+        # Add trees one at a time in float32, the same order XGBoost uses
+        for tree_values in leaf_values:
+            predictions += tree_values
+
+        return predictions
+
+    def check_parity(self, booster, features: np.ndarray) -> float:
+        """
+        Compare against Booster.inplace_predict.
+        :return: The largest absolute difference between both predictions.
+        """
+        expected = booster.inplace_predict(np.asarray(features, dtype=np.float32))
+        actual = self.predict(features)
+        if len(expected) == 0:
+            return 0.0
+        return float(np.max(np.abs(expected - actual)))
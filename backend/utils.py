@@ -1,28 +1,239 @@
-import json
+import os
+import atexit
 import logging
-import pandas as pd
+import queue
+import threading
 import numpy as np
+import orjson
+from backend.metrics import stage_timer
+from typing import List, Optional
 
+LOG_OVERFLOW_POLICIES = ("drop", "block")
 
-def log_features_and_prediction(
-    extracted_features: pd.DataFrame, prediction: float, trip_id: str
-) -> None:
-    logger = logging.getLogger(__name__)
-
-    flattened_data = {}
-    for key, value in extracted_features.items():
-        if isinstance(value, np.ndarray):
-            flattened_data[key] = value[0]
-        elif isinstance(value, pd.Series):
-            flattened_data[key] = value.iloc[0]
-        else:
-            flattened_data[key] = value
 
+def _encode_result(
+    features: np.ndarray,
+    feature_names: List[str],
+    prediction: float,
+    trip_id: str,
+    model_version: Optional[str] = None,
+) -> dict:
+    # orjson writes float32 values with their shortest repr, e.g. 2.51 not
+    # 2.509999990463257, so the lines match what json.dumps gave for float64
     result = {
-        "extracted_features": flattened_data,
+        "extracted_features": dict(zip(feature_names, features)),
         "prediction": float(prediction),
         "trip_id": trip_id,
     }
-    result_json_str = json.dumps(result, separators=(",", ":"))
+    if model_version is not None:
+        result["model_version"] = model_version
+    return result
+
+
+class PredictionLogWriter:
+    """
+    Serializes prediction log records on a background thread. Records wait on a
+    bounded queue and are written to the logger's stream handlers in batches
+    with one flush per batch, keeping the "prediction_result: {...}" lines
+    that monitoring.log_reader parses.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int = 10000,
+        overflow: str = "drop",
+        batch_size: int = 256,
+        logger_name: str = __name__,
+    ) -> None:
+        if overflow not in LOG_OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy {overflow}, expected one of {LOG_OVERFLOW_POLICIES}"
+            )
+
+        self.logger = logging.getLogger(logger_name)
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.blocked = 0
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="prediction-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, kind: str, *payload) -> bool:
+        if not self.logger.isEnabledFor(logging.INFO):
+            return False
+        if self._thread is None:
+            self.start()
+
+        item = (kind, payload)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.overflow == "drop":
+                self.dropped += 1
+                return False
+            self.blocked += 1
+            self._queue.put(item)
+
+        self.submitted += 1
+        return True
+
+    def flush(self) -> None:
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "blocked": self.blocked,
+        }
+
+    def _encode(self, kind: str, payload: tuple) -> str:
+        if kind == "prediction_result":
+            result = _encode_result(*payload)
+        else:
+            features, feature_names, predictions, trip_ids, model_version = payload
+            result = [
+                _encode_result(row, feature_names, prediction, trip_id, model_version)
+                for row, prediction, trip_id in zip(features, predictions, trip_ids)
+            ]
+
+        result_json_str = orjson.dumps(
+            result, option=orjson.OPT_SERIALIZE_NUMPY
+        ).decode()
+        return f"{kind}: {result_json_str}"
+
+    def _write(self, messages: List[str]) -> None:
+        records = [
+            self.logger.makeRecord(
+                self.logger.name, logging.INFO, __file__, 0, message, None, None
+            )
+            for message in messages
+        ]
 
-    logger.info(f"prediction_result: {result_json_str}")
+        # Same handler walk as Logger.callHandlers, but one write per batch
+        logger = self.logger
+        while logger is not None:
+            for handler in logger.handlers:
+                accepted = [
+                    record
+                    for record in records
+                    if record.levelno >= handler.level and handler.filter(record)
+                ]
+                if not accepted:
+                    continue
+
+                stream = getattr(handler, "stream", None)
+                if isinstance(handler, logging.StreamHandler) and stream is not None:
+                    lines = "".join(
+                        handler.format(record) + handler.terminator
+                        for record in accepted
+                    )
+                    handler.acquire()
+                    try:
+                        stream.write(lines)
+                        handler.flush()
+                    finally:
+                        handler.release()
+                else:
+                    for record in accepted:
+                        handler.handle(record)
+
+            logger = logger.parent if logger.propagate else None
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            items = [item for item in batch if item is not None]
+            try:
+                timer = stage_timer()
+                messages = [self._encode(kind, payload) for kind, payload in items]
+                timer.lap("log_encode")
+                self._write(messages)
+                timer.lap("log_write")
+                self.written += len(items)
+            except Exception as e:
+                self.logger.error(f"Failed to write {len(items)} prediction logs: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if stop:
+                break
+
+
+_prediction_log_writer = None
+
+
+def get_prediction_log_writer() -> PredictionLogWriter:
+    global _prediction_log_writer
+
+    if _prediction_log_writer is None:
+        _prediction_log_writer = PredictionLogWriter(
+            max_queue_size=int(os.getenv("PREDICTION_LOG_QUEUE_SIZE", "10000")),
+            overflow=os.getenv("PREDICTION_LOG_OVERFLOW", "drop"),
+        )
+        atexit.register(_prediction_log_writer.close)
+
+    return _prediction_log_writer
+
+
+def log_features_and_prediction(
+    features: np.ndarray,
+    feature_names: List[str],
+    prediction: float,
+    trip_id: str,
+    model_version: Optional[str] = None,
+) -> None:
+    # The array is serialized later on the writer thread, do not modify it
+    timer = stage_timer()
+    get_prediction_log_writer().submit(
+        "prediction_result", features, feature_names, prediction, trip_id, model_version
+    )
+    timer.lap("log_submit")
+
+
+def log_batch_features_and_predictions(
+    features: np.ndarray,
+    feature_names: List[str],
+    predictions: np.ndarray,
+    trip_ids: List[str],
+    model_version: Optional[str] = None,
+) -> None:
+    timer = stage_timer()
+    get_prediction_log_writer().submit(
+        "prediction_results",
+        features,
+        feature_names,
+        predictions,
+        trip_ids,
+        model_version,
+    )
+    timer.lap("log_submit_batch")
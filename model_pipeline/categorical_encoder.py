@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+from model_pipeline.zone_index import ZoneIndex
+
+
+class CategoricalEncoder:
+    """
+    One-hot encoding with a fixed vocabulary: a column per value of each
+    categorical column but the first, in the order of `categories`, whether
+    the value occurs in the encoded rows or not. NaN and values outside the
+    vocabulary set no column, like the dropped first value.
+
+    The encoded block is uint8, or CSR holding only the ones. xgboost reads
+    the entries a CSR matrix leaves out as missing rather than 0, so a model
+    is to be scored with the representation it was trained on.
+    """
+
+    def __init__(self, categories: Dict[str, List[str]]) -> None:
+        self.categories = {
+            column: list(values) for column, values in categories.items()
+        }
+
+        # Position of the first value's column in the encoded block, one
+        # before the first column the categorical column owns
+        self.offsets = {}
+        self.columns = []
+        for column, values in self.categories.items():
+            self.offsets[column] = len(self.columns) - 1
+            self.columns += [f"{column}_{value}" for value in values[1:]]
+
+    @classmethod
+    def from_zones(cls, df_zone: pd.DataFrame) -> "CategoricalEncoder":
+        """
+        The vocabulary of the pickup and dropoff zone attributes, the sorted
+        values found in the zones table.
+        """
+        return cls(ZoneIndex(df_zone).feature_categories)
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def codes(self, df: pd.DataFrame, column: str) -> np.ndarray:
+        """
+        :return: The index of each value of `column` in its vocabulary, -1
+            for NaN and values outside it.
+        """
+        values = self.categories[column]
+        # Categoricals of the vocabulary, as ZoneIndex gives, are already
+        # coded
+        if df[column].dtype == pd.CategoricalDtype(values):
+            return df[column].cat.codes.to_numpy()
+        return pd.Categorical(df[column], categories=values).codes
+
+    def column_positions(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        :return: Per row and categorical column, the position of the column
+            it sets in the encoded block or -1 when it sets none.
+        """
+        positions = np.empty((len(df), len(self.categories)), dtype=np.int32)
+        for j, column in enumerate(self.categories):
+            codes = self.codes(df, column)
+            positions[:, j] = np.where(
+                codes > 0, codes.astype(np.int32) + self.offsets[column], -1
+            )
+        return positions
+
+    def transform_dense(self, df: pd.DataFrame) -> np.ndarray:
+        # Column-major, a comparison fills each column in one pass
+        block = np.zeros((len(df), len(self.columns)), dtype=np.uint8, order="F")
+        for column, values in self.categories.items():
+            codes = self.codes(df, column)
+            for code in range(1, len(values)):
+                position = self.offsets[column] + code
+                np.equal(codes, code, out=block[:, position].view(bool))
+        return block
+
+    def transform_sparse(self, df: pd.DataFrame):
+        """
+        :return: The encoded block as a scipy.sparse CSR matrix of uint8.
+        """
+        from scipy.sparse import csr_matrix
+
+        positions = self.column_positions(df)
+        # Offsets grow with the categorical column, so each row's column
+        # indices come out sorted
+        found = positions >= 0
+        indptr = np.zeros(len(df) + 1, dtype=np.int64)
+        np.cumsum(found.sum(axis=1), out=indptr[1:])
+        indices = positions[found]
+        return csr_matrix(
+            (np.ones(len(indices), dtype=np.uint8), indices, indptr),
+            shape=(len(df), len(self.columns)),
+        )
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        :return: `df` with the categorical columns replaced by their uint8
+            encoding, placed after the other columns as get_dummies does.
+        """
+        block = pd.DataFrame(
+            self.transform_dense(df), columns=self.columns, index=df.index
+        )
+        return pd.concat([df.drop(columns=list(self.categories)), block], axis=1)
@@ -1,17 +1,79 @@
 import os
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import column, create_engine, func, inspect, select, table
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.sql import text
 from dotenv import load_dotenv
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Dict, List, Optional
 import logging
+from model_pipeline.partition_cache import PartitionCache
+from model_pipeline.storage import RAW_TRIPS_SCHEMA, table_path, write_table
+
+# Columns of the day tables DataProcessor and monitoring read, with the
+# dtypes they are built into, the others are not fetched. Integer columns
+# holding NULLs fall back to float64 with NaN.
+TRIP_COLUMNS = {
+    "tpep_pickup_datetime": "datetime64[ns]",
+    "tpep_dropoff_datetime": "datetime64[ns]",
+    "passenger_count": "float64",
+    "trip_distance": "float64",
+    "PULocationID": "int64",
+    "DOLocationID": "int64",
+    "fare_amount": "float64",
+    "total_amount": "float64",
+    "Airport_fee": "float64",
+    "trip_id": "int64",
+}
+
+COLLECT_WORKERS = int(os.getenv("COLLECT_WORKERS", "4"))
+COLLECT_CHUNK_ROWS = int(os.getenv("COLLECT_CHUNK_ROWS", "50000"))
+COLLECT_CACHE_FOLDER = os.getenv("COLLECT_CACHE_FOLDER", "data/partitions")
+
+
+def _column_array(values: tuple, dtype: str) -> np.ndarray:
+    if dtype == "object":
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+        return array
+    try:
+        return np.array(values, dtype=dtype)
+    except (TypeError, ValueError):
+        if dtype != "int64":
+            raise
+        # NULLs in an integer column
+        return np.array(values, dtype="float64")
+
+
+def _missing_column(n_rows: int, dtype: str) -> np.ndarray:
+    # A column an older day table does not have
+    if dtype == "object":
+        return np.full(n_rows, None, dtype=object)
+    if dtype.startswith("datetime64"):
+        return np.full(n_rows, np.datetime64("NaT"), dtype=dtype)
+    return np.full(n_rows, np.nan)
 
 
 class DataCollector:
-    def __init__(self):
+    def __init__(
+        self,
+        connection_string: Optional[str] = None,
+        schema: Optional[str] = "public",
+        workers: int = COLLECT_WORKERS,
+        chunk_rows: int = COLLECT_CHUNK_ROWS,
+        cache_folder: Optional[str] = COLLECT_CACHE_FOLDER,
+        storage_format: Optional[str] = None,
+    ):
         load_dotenv()
         self.logger = logging.getLogger(__name__)
+        self.schema = schema
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+        self.storage_format = storage_format
+        # Used by run, an empty folder turns the cache off
+        self.partition_cache = PartitionCache(cache_folder) if cache_folder else None
 
         self.db_username = os.getenv("DB_USERNAME")
         self.db_password = os.getenv("DB_PASSWORD")
@@ -19,47 +81,187 @@ class DataCollector:
         self.db_port = os.getenv("DB_PORT")
         self.db_database = os.getenv("DB_DATABASE")
 
-        self.connection_string = f"postgresql://{self.db_username}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_database}"
+        self.connection_string = (
+            connection_string
+            or f"postgresql://{self.db_username}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_database}"
+        )
+
+        # One connection per concurrent day table
+        self.engine = create_engine(
+            self.connection_string, pool_size=workers, max_overflow=0
+        )
+
+    def _read_table(
+        self, table_name: str, after_trip_id: Optional[int] = None
+    ) -> Dict[str, List[np.ndarray]]:
+        # Streamed through a server-side cursor, each chunk of rows is turned
+        # into typed column arrays before the next one is fetched
+        chunks: Dict[str, List[np.ndarray]] = {name: [] for name in TRIP_COLUMNS}
+        with self.engine.connect() as connection:
+            available = {
+                col["name"]
+                for col in inspect(connection).get_columns(
+                    table_name, schema=self.schema
+                )
+            }
+            names = [name for name in TRIP_COLUMNS if name in available]
+            query = (
+                select(*[column(name) for name in names])
+                .select_from(table(table_name, schema=self.schema))
+                .order_by(column("tpep_pickup_datetime"))
+            )
+            if after_trip_id is not None:
+                query = query.where(column("trip_id") > after_trip_id)
+            result = connection.execution_options(
+                stream_results=True, yield_per=self.chunk_rows
+            ).execute(query)
+
+            for rows in result.partitions(self.chunk_rows):
+                values = dict(zip(names, zip(*rows)))
+                for name, dtype in TRIP_COLUMNS.items():
+                    if name in values:
+                        chunks[name].append(_column_array(values[name], dtype))
+                    else:
+                        chunks[name].append(_missing_column(len(rows), dtype))
+
+        self.logger.info(
+            f"Collected {sum(len(c) for c in chunks['trip_id'])} rows from {table_name}"
+        )
+        return chunks
+
+    def _table_fingerprint(
+        self, table_name: str, up_to_trip_id: Optional[int] = None
+    ) -> dict:
+        # Cheap aggregates that change whenever rows are added or removed,
+        # and, from their amounts and times, most of the time rows are
+        # updated in place. An update leaving the total amount and the last
+        # dropoff time as they were goes unnoticed.
+        trip_id = column("trip_id")
+        query = select(
+            func.count(),
+            func.coalesce(func.sum(trip_id), 0),
+            func.max(trip_id),
+            func.coalesce(func.sum(column("total_amount")), 0),
+            func.max(column("tpep_dropoff_datetime")),
+        ).select_from(table(table_name, schema=self.schema))
+        if up_to_trip_id is not None:
+            query = query.where(trip_id <= up_to_trip_id)
+
+        with self.engine.connect() as connection:
+            rows, trip_id_sum, max_trip_id, total_amount_sum, max_dropoff = (
+                connection.execute(query).one()
+            )
+        return {
+            "rows": int(rows),
+            "trip_id_sum": int(trip_id_sum),
+            "max_trip_id": None if max_trip_id is None else int(max_trip_id),
+            # In cents, float sums can differ in the last bits between runs
+            "total_amount_sum": round(float(total_amount_sum), 2),
+            "max_dropoff": None if max_dropoff is None else str(max_dropoff),
+        }
+
+    def _sync_table(
+        self, table_name: str, cache: PartitionCache
+    ) -> Dict[str, List[np.ndarray]]:
+        fingerprint = self._table_fingerprint(table_name)
+        entry = cache.get(table_name)
+        if entry is not None and entry.get("columns") != list(TRIP_COLUMNS):
+            # Cached with other columns, fetched again whole
+            entry = None
+        cached = None
+        if entry is not None:
+            cached_fingerprint = {key: entry.get(key) for key in fingerprint}
+            if cached_fingerprint == fingerprint:
+                cached = cache.load(table_name)
+                if cached is not None:
+                    self.logger.info(f"{table_name} unchanged, read from the cache")
+                    return {name: [values] for name, values in cached.items()}
 
-        self.engine = create_engine(self.connection_string)
+            # Rows only appended since: the cached rows still add up the same
+            elif (
+                fingerprint["rows"] > entry["rows"]
+                and entry["max_trip_id"] is not None
+                and self._table_fingerprint(table_name, entry["max_trip_id"])
+                == cached_fingerprint
+            ):
+                cached = cache.load(table_name)
 
-    def get_data(self, days: int = 10) -> pd.DataFrame:
+        if cached is None:
+            chunks = self._read_table(table_name)
+            columns = {name: np.concatenate(arrays) for name, arrays in chunks.items()}
+        else:
+            chunks = self._read_table(table_name, after_trip_id=entry["max_trip_id"])
+            columns = {
+                name: np.concatenate([cached[name], *chunks[name]])
+                for name in TRIP_COLUMNS
+            }
+            order = np.argsort(columns["tpep_pickup_datetime"], kind="stable")
+            columns = {name: values[order] for name, values in columns.items()}
+
+        if len(columns["trip_id"]) != fingerprint["rows"]:
+            # Changed while it was read, fetched again on the next run
+            fingerprint = {**fingerprint, "rows": -1, "max_trip_id": None}
+        cache.save(table_name, columns, fingerprint)
+        return {name: [values] for name, values in columns.items()}
+
+    def get_data(
+        self, days: int = 10, cache: Optional[PartitionCache] = None
+    ) -> pd.DataFrame:
+        """
+        Trips of the last `days` days. With a cache, only the day tables
+        that changed since they were cached are fetched, just their new rows
+        when rows were only appended, and cached tables older than `days`
+        are evicted.
+        """
         try:
             end_date = datetime.now()
             start_date = end_date - timedelta(days=days)
 
             with self.engine.connect() as connection:
                 inspector = inspect(connection)
-                tables = inspector.get_table_names(schema="public")
-
-                all_data = []
-                for i in range(days + 1):
-                    date = start_date + timedelta(days=i)
-                    table_name = f"trips_{date.strftime('%Y_%m_%d')}"
-                    if table_name in tables:
-                        query = text(
-                            f"SELECT * FROM {table_name} ORDER BY tpep_pickup_datetime"
-                        )
-                        result = connection.execute(query)
-                        df = pd.DataFrame(result.fetchall(), columns=result.keys())
-                        all_data.append(df)
+                tables = inspector.get_table_names(schema=self.schema)
 
-                if all_data:
-                    combined_df = pd.concat(all_data, ignore_index=True)
-                    return combined_df
+            table_names = []
+            for i in range(days + 1):
+                date = start_date + timedelta(days=i)
+                table_name = f"trips_{date.strftime('%Y_%m_%d')}"
+                if table_name in tables:
+                    table_names.append(table_name)
+
+            if cache is not None:
+                cache.evict(keep=table_names)
+            if not table_names:
+                return pd.DataFrame()
+
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                if cache is None:
+                    tables_chunks = list(executor.map(self._read_table, table_names))
                 else:
-                    return pd.DataFrame()
+                    tables_chunks = list(
+                        executor.map(
+                            lambda table_name: self._sync_table(table_name, cache),
+                            table_names,
+                        )
+                    )
+
+            # Joined one column at a time, in day order, dropping the chunks
+            # as they are copied
+            data = {}
+            for name in TRIP_COLUMNS:
+                data[name] = np.concatenate(
+                    [chunk for chunks in tables_chunks for chunk in chunks.pop(name)]
+                    or [np.array([], dtype=TRIP_COLUMNS[name])]
+                )
+            return pd.DataFrame(data, copy=False)
         except SQLAlchemyError as e:
             self.logger.error(f"Failed to get data: {e}")
             return pd.DataFrame()
 
-    def store_data_to_csv(
-        self, data: pd.DataFrame, file_name: str = "data.csv", folder: str = "data"
+    def store_data(
+        self, data: pd.DataFrame, name: str = "data", folder: str = "data"
     ) -> None:
-        if not os.path.exists(folder):
-            os.makedirs(folder)
-        file_path = os.path.join(folder, file_name)
-        data.to_csv(file_path, index=False)
+        file_path = table_path(folder, name, self.storage_format)
+        write_table(data, file_path, RAW_TRIPS_SCHEMA)
         self.logger.info(f"Data stored to {file_path}, {len(data)} rows")
 
     def collect_zones_data(self) -> pd.DataFrame:
@@ -80,19 +282,29 @@ class DataCollector:
         if not os.path.exists(folder):
             os.makedirs(folder)
         file_path = os.path.join(folder, file_name)
-        data.to_csv(file_path, index=False)
+
+        # Left alone when unchanged, so its mtime and DVC hash stay the same
+        content = data.to_csv(index=False)
+        if os.path.exists(file_path):
+            with open(file_path, newline="") as f:
+                if f.read() == content:
+                    self.logger.info(f"Zones data unchanged in {file_path}")
+                    return
+
+        with open(file_path, "w", newline="") as f:
+            f.write(content)
         self.logger.info(f"Zones data stored to {file_path}, {len(data)} rows")
 
     def run(
         self,
         days: int = 10,
-        file_name: str = "data.csv",
+        name: str = "data",
         folder: str = "data",
         zones_file_name: str = "zones.csv",
     ) -> None:
-        data = self.get_data(days=days)
+        data = self.get_data(days=days, cache=self.partition_cache)
         if not data.empty:
-            self.store_data_to_csv(data, file_name, folder)
+            self.store_data(data, name, folder)
         else:
             self.logger.warning("No data to store")
 
@@ -1,129 +1,246 @@
+import numpy as np
 import pandas as pd
 import logging
 import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple, Union
+from backend.feature_schema import FeatureSchema
+from model_pipeline.categorical_encoder import CategoricalEncoder
+from model_pipeline.zone_index import LOCATION_COLUMNS, ZoneIndex
+from model_pipeline.storage import (
+    RAW_TRIPS_SCHEMA,
+    ZONES_SCHEMA,
+    TableWriter,
+    iter_table,
+    processed_schema,
+    read_table,
+    table_path,
+    write_table,
+)
+
+# Rows per chunk when run streams the input, 0 processes it all in memory
+PROCESS_CHUNK_ROWS = int(os.getenv("PROCESS_CHUNK_ROWS", "0"))
+
+# Processes for the day partitions, 1 runs everything in the calling process
+PROCESS_WORKERS = int(os.getenv("PROCESS_WORKERS", "1"))
+
+SPLIT_FRACTIONS = (0.7, 0.85)
+
+# The raw trips columns extract_features uses, the others are not loaded
+RAW_COLUMNS = [
+    "tpep_pickup_datetime",
+    "tpep_dropoff_datetime",
+    "passenger_count",
+    "trip_distance",
+    "PULocationID",
+    "DOLocationID",
+    "fare_amount",
+    "total_amount",
+    "Airport_fee",
+    "trip_id",
+]
+
+# What the validity checks read, for the first pass of a chunked run
+VALIDITY_COLUMNS = [
+    "tpep_pickup_datetime",
+    "tpep_dropoff_datetime",
+    "passenger_count",
+    "trip_distance",
+    "fare_amount",
+    "total_amount",
+]
+
+CATEGORICAL_COLUMNS = [
+    "pickup_borough",
+    "pickup_service_zone",
+    "dropoff_borough",
+    "dropoff_service_zone",
+]
+
+# Raw trips columns that are not features
+DROPPED_COLUMNS = {
+    "VendorID",
+    "tpep_pickup_datetime",
+    "tpep_dropoff_datetime",
+    "passenger_count",
+    "RatecodeID",
+    "store_and_fwd_flag",
+    "payment_type",
+    "fare_amount",
+    "extra",
+    "mta_tax",
+    "tip_amount",
+    "tolls_amount",
+    "total_amount",
+    "improvement_surcharge",
+    "congestion_surcharge",
+    "Airport_fee",
+}
+
+
+def _positive(values: pd.Series) -> np.ndarray:
+    # NaN and NA count as not positive
+    return (values > 0).to_numpy(dtype=bool, na_value=False)
+
+
+def _trip_times(df: pd.DataFrame) -> Tuple[pd.Series, np.ndarray]:
+    # Pickup times, positionally indexed, and trip times in minutes
+    pickup = pd.to_datetime(df["tpep_pickup_datetime"]).reset_index(drop=True)
+    dropoff = pd.to_datetime(df["tpep_dropoff_datetime"]).reset_index(drop=True)
+    return pickup, (dropoff - pickup).dt.total_seconds().to_numpy() / 60
+
+
+def _valid_trips(df: pd.DataFrame, trip_time: np.ndarray) -> np.ndarray:
+    return (
+        _positive(df["trip_distance"])
+        & _positive(df["passenger_count"])
+        & _positive(df["fare_amount"])
+        & _positive(df["total_amount"])
+        & (trip_time > 0)
+        & (trip_time < 300)
+    )
+
+
+def _calendar_field(values: pd.Series) -> np.ndarray:
+    # Fits int8, unless NaT pickups left NaN in it
+    return values.to_numpy() if values.hasnans else values.to_numpy(dtype=np.int8)
+
+
+# Set in each worker process by the pool initializer
+_partition_worker = None
+
+
+def _init_partition_worker(zone_index: ZoneIndex, encoder: CategoricalEncoder) -> None:
+    global _partition_worker
+    _partition_worker = (DataProcessor("", "", ""), zone_index, encoder)
+
+
+def _process_partition(df: pd.DataFrame) -> pd.DataFrame:
+    processor, zone_index, encoder = _partition_worker
+    df = processor.extract_features(df)
+    df = processor.merge_location_data(df, zone_index)
+    # Sent back in the compact dtypes, split_and_save_data casts them
+    return processor.encode_categorical(df, encoder)
 
 
 class DataProcessor:
     def __init__(
-        self, data_filename: str, zones_filename: str, output_folder: str
+        self,
+        data_filename: str,
+        zones_filename: str,
+        output_folder: str,
+        storage_format: Optional[str] = None,
+        chunk_rows: int = PROCESS_CHUNK_ROWS,
+        workers: int = PROCESS_WORKERS,
     ) -> None:
         self.logger = logging.getLogger(__name__)
         self.data_filename = data_filename
         self.zones_filename = zones_filename
         self.output_folder = output_folder
+        self.storage_format = storage_format
+        self.chunk_rows = chunk_rows
+        self.workers = workers
 
     def load_data(self) -> pd.DataFrame:
-        df = pd.read_csv(self.data_filename)
-        df_zone = pd.read_csv(self.zones_filename)
+        df = read_table(
+            self.data_filename, columns=RAW_COLUMNS, schema=RAW_TRIPS_SCHEMA
+        )
+        df_zone = read_table(self.zones_filename, schema=ZONES_SCHEMA)
         return df, df_zone
 
     def extract_features(
-        self, df: pd.DataFrame, remove_invalid: bool = True, keep_trip_id: bool = False
+        self,
+        df: pd.DataFrame,
+        remove_invalid: bool = True,
+        keep_trip_id: bool = False,
     ) -> pd.DataFrame:
+        """
+        Sorts the trips by pickup time, drops the invalid ones and derives
+        the pickup time fields, trip_time and is_from_airport. Only the
+        kept columns of the kept rows are copied, and `df` is left as is.
+        """
         logging.info("Start extracting features")
 
-        df["tpep_pickup_datetime"] = pd.to_datetime(df["tpep_pickup_datetime"])
-        df["tpep_dropoff_datetime"] = pd.to_datetime(df["tpep_dropoff_datetime"])
-
-        df = df.sort_values("tpep_pickup_datetime").reset_index(drop=True)
+        pickup, trip_time = _trip_times(df)
 
-        df["pickup_hour"] = df["tpep_pickup_datetime"].dt.hour
-        df["pickup_minute"] = df["tpep_pickup_datetime"].dt.minute
-        df["pickup_dayofweek"] = df["tpep_pickup_datetime"].dt.dayofweek
-        df["pickup_dayofmonth"] = df["tpep_pickup_datetime"].dt.day
-
-        df["trip_time"] = (
-            df["tpep_dropoff_datetime"] - df["tpep_pickup_datetime"]
-        ).apply(lambda x: x.total_seconds() / 60)
+        # Stable, trips picked up at the same time keep their input order
+        # whatever the sort implementation, and the trips of one day sort
+        # the same on their own as among all the trips
+        order = pickup.sort_values(kind="stable").index.to_numpy()
+        # The index sorting and resetting the whole frame gave
+        index = np.arange(len(order))
 
         # Remove rows with invalid values
         if remove_invalid:
-            df = df[
-                (df["trip_distance"] > 0)
-                & (df["passenger_count"] > 0)
-                & (df["fare_amount"] > 0)
-                & (df["total_amount"] > 0)
-                & (df["trip_time"] > 0)
-                & (df["trip_time"] < 300)
-            ]
+            valid = _valid_trips(df, trip_time)[order]
+            order, index = order[valid], index[valid]
 
-        df["is_from_airport"] = df["Airport_fee"].apply(lambda x: 1 if x > 0 else 0)
-
-        df = df.drop(
-            columns=[
-                "VendorID",
-                "tpep_pickup_datetime",
-                "tpep_dropoff_datetime",
-                "passenger_count",
-                "RatecodeID",
-                "store_and_fwd_flag",
-                "payment_type",
-                "fare_amount",
-                "extra",
-                "mta_tax",
-                "tip_amount",
-                "tolls_amount",
-                "total_amount",
-                "improvement_surcharge",
-                "congestion_surcharge",
-                "Airport_fee",
-            ]
+        columns = [
+            col
+            for col in df.columns
+            if col not in DROPPED_COLUMNS and (keep_trip_id or col != "trip_id")
+        ]
+        features = pd.DataFrame({col: df[col].array.take(order) for col in columns})
+        features.index = index
+
+        pickup = pickup.take(order).dt
+        features["pickup_hour"] = _calendar_field(pickup.hour)
+        features["pickup_minute"] = _calendar_field(pickup.minute)
+        features["pickup_dayofweek"] = _calendar_field(pickup.dayofweek)
+        features["pickup_dayofmonth"] = _calendar_field(pickup.day)
+        features["trip_time"] = trip_time[order]
+        features["is_from_airport"] = _positive(df["Airport_fee"])[order].astype(
+            np.int8
         )
-        if not keep_trip_id:
-            df = df.drop(columns=["trip_id"])
 
-        return df
+        return features
 
     def merge_location_data(
-        self, df: pd.DataFrame, df_zone: pd.DataFrame
+        self, df: pd.DataFrame, zones: Union[pd.DataFrame, ZoneIndex]
     ) -> pd.DataFrame:
+        """
+        Replaces PULocationID and DOLocationID with the borough and service
+        zone of the pickup and dropoff zones, as categoricals. IDs missing
+        from the zones get NaN and are logged.
+        :param zones: The zones table or, to build it once for many calls,
+            its ZoneIndex.
+        """
         logging.info("Start merging location data")
-        df = pd.merge(
-            df, df_zone, left_on="PULocationID", right_on="LocationID", how="left"
-        )
-        df = df.rename(
-            columns={
-                "Borough": "pickup_borough",
-                "Zone": "pickup_zone",
-                "service_zone": "pickup_service_zone",
-            }
-        )
-        df = df.drop(columns=["PULocationID", "pickup_zone", "LocationID"])
+        if not isinstance(zones, ZoneIndex):
+            zones = ZoneIndex(zones)
 
-        df = pd.merge(
-            df, df_zone, left_on="DOLocationID", right_on="LocationID", how="left"
-        )
-        df = df.rename(
-            columns={
-                "Borough": "dropoff_borough",
-                "Zone": "dropoff_zone",
-                "service_zone": "dropoff_service_zone",
-            }
-        )
-        df = df.drop(columns=["DOLocationID", "dropoff_zone", "LocationID"])
+        attributes = {}
+        for direction, column in LOCATION_COLUMNS.items():
+            attributes.update(zones.lookup(df[column], direction))
 
+        df = df.drop(columns=list(LOCATION_COLUMNS.values()))
+        # The index a join would have given
+        df.index = pd.RangeIndex(len(df))
+        for name, values in attributes.items():
+            df[name] = values
         return df
 
-    def encode_categorical(self, df: pd.DataFrame) -> pd.DataFrame:
+    def encode_categorical(
+        self, df: pd.DataFrame, encoder: Optional[CategoricalEncoder] = None
+    ) -> pd.DataFrame:
+        """
+        :param encoder: Encodes to its fixed uint8 columns, built once from
+            the zones. When not set, get_dummies encodes the columns as
+            they are, so the columns can depend on the rows.
+        """
         logging.info("Start encoding categorical data")
-        df = pd.get_dummies(
-            df,
-            columns=[
-                "pickup_borough",
-                "pickup_service_zone",
-                "dropoff_borough",
-                "dropoff_service_zone",
-            ],
-            drop_first=True,
-        )
-        return df
+        if encoder is not None:
+            return encoder.transform(df)
+        return pd.get_dummies(df, columns=CATEGORICAL_COLUMNS, drop_first=True)
 
     def split_and_save_data(
         self,
         df: pd.DataFrame,
-        train_filename: str,
-        val_filename: str,
-        test_filename: str,
+        train_name: str,
+        val_name: str,
+        test_name: str,
     ) -> None:
         logging.info("Start splitting and saving data")
         total_rows = len(df)
@@ -134,25 +251,182 @@ class DataProcessor:
         val = df.iloc[train_end:val_end]
         test = df.iloc[val_end:]
 
-        if not os.path.exists(self.output_folder):
-            os.makedirs(self.output_folder)
+        schema = processed_schema(df.columns.tolist())
+        for split, name in ((train, train_name), (val, val_name), (test, test_name)):
+            filepath = table_path(self.output_folder, name, self.storage_format)
+            write_table(split, filepath, schema)
 
-        train_filepath = os.path.join(self.output_folder, train_filename)
-        val_filepath = os.path.join(self.output_folder, val_filename)
-        test_filepath = os.path.join(self.output_folder, test_filename)
+        self.logger.info(
+            f"Data split and saved: train - {len(train)}, val - {len(val)}, test - {len(test)}"
+        )
 
-        train.to_csv(train_filepath, index=False)
-        val.to_csv(val_filepath, index=False)
-        test.to_csv(test_filepath, index=False)
+    def save_feature_schema(
+        self, df: pd.DataFrame, schema_filename: str = "feature_schema.json"
+    ) -> FeatureSchema:
+        feature_schema = FeatureSchema.from_frame(df)
+        schema_filepath = os.path.join(self.output_folder, schema_filename)
+        feature_schema.save(schema_filepath)
+        self.logger.info(
+            f"Feature schema saved to {schema_filepath}, {len(feature_schema)} columns"
+        )
+        return feature_schema
 
+    def split_boundaries(self) -> Tuple[pd.Timestamp, pd.Timestamp]:
+        """
+        First pass of a chunked run: counts the valid trips per pickup
+        minute, reading only the columns the checks need.
+        :return: The pickup minutes val and test start at, so that about
+            70/15/15% of the trips fall in train, val and test.
+        """
+        counts = pd.Series(dtype=np.int64)
+        for chunk in iter_table(
+            self.data_filename,
+            self.chunk_rows,
+            columns=VALIDITY_COLUMNS,
+            schema=RAW_TRIPS_SCHEMA,
+        ):
+            pickup, trip_time = _trip_times(chunk)
+            minutes = pickup[_valid_trips(chunk, trip_time)].dt.floor("min")
+            counts = counts.add(minutes.value_counts(), fill_value=0)
+
+        if counts.empty:
+            raise ValueError(f"No valid trips in {self.data_filename}")
+        cumulative = counts.sort_index().cumsum()
+        # The minute holding the first row of the split, as the in-memory
+        # split would count it
+        boundaries = [
+            cumulative.index[
+                np.searchsorted(
+                    cumulative.to_numpy(), int(cumulative.iloc[-1] * fraction), "right"
+                )
+            ]
+            for fraction in SPLIT_FRACTIONS
+        ]
         self.logger.info(
-            f"Data split and saved: train - {len(train)}, val - {len(val)}, test - {len(test)}"
+            f"Split boundaries from {int(cumulative.iloc[-1])} valid trips: "
+            f"val from {boundaries[0]}, test from {boundaries[1]}"
         )
+        return boundaries[0], boundaries[1]
+
+    def run_chunked(self, names: Tuple[str, str, str] = ("train", "val", "test")):
+        """
+        Processes the input `chunk_rows` rows at a time and appends each
+        chunk to the train, val and test tables, so memory depends on
+        chunk_rows rather than on the size of the input. Rows are split by
+        pickup time at the split_boundaries, and keep the input order but
+        sorted within each chunk.
+        """
+        boundaries = np.array(self.split_boundaries(), dtype="M8[ns]")
+        zone_index = ZoneIndex(read_table(self.zones_filename, schema=ZONES_SCHEMA))
+        encoder = CategoricalEncoder(zone_index.feature_categories)
+
+        # What every chunk is encoded to, from an empty one
+        empty = pd.DataFrame(
+            {col: pd.Series(dtype=RAW_TRIPS_SCHEMA[col]) for col in RAW_COLUMNS}
+        )
+        empty = self.merge_location_data(self.extract_features(empty), zone_index)
+        columns = self.encode_categorical(empty, encoder).columns.tolist()
+        schema = processed_schema(columns)
+
+        writers = [
+            TableWriter(
+                table_path(self.output_folder, name, self.storage_format), schema
+            )
+            for name in names
+        ]
+        try:
+            for chunk in iter_table(
+                self.data_filename,
+                self.chunk_rows,
+                columns=RAW_COLUMNS,
+                schema=RAW_TRIPS_SCHEMA,
+            ):
+                pickup = pd.to_datetime(chunk["tpep_pickup_datetime"]).to_numpy()
+                splits = np.searchsorted(boundaries, pickup, side="right")
+                for i, writer in enumerate(writers):
+                    rows = splits == i
+                    if not rows.any():
+                        continue
+                    df = self.extract_features(chunk[rows])
+                    df = self.merge_location_data(df, zone_index)
+                    writer.write(self.encode_categorical(df, encoder))
+
+            # A split without rows still gets a table with the columns
+            for writer in writers:
+                if writer.n_rows == 0:
+                    writer.write(pd.DataFrame(columns=columns))
+        finally:
+            for writer in writers:
+                writer.close()
+
+        self.logger.info(
+            "Data split and saved: "
+            + ", ".join(
+                f"{name} - {writer.n_rows}" for name, writer in zip(names, writers)
+            )
+        )
+        self.save_feature_schema(pd.DataFrame(columns=columns))
+
+    def run_parallel(self) -> None:
+        """
+        Processes the trips one pickup day at a time in `workers` processes,
+        with the zone index sent to each worker once and at most two days
+        per worker in flight. A day keeps its trips in input order and is
+        sorted in its worker, and the days are merged back in date order,
+        so the output is the same as run's in a single process.
+        """
+        df, df_zone = self.load_data()
+        zone_index = ZoneIndex(df_zone)
+        encoder = CategoricalEncoder(zone_index.feature_categories)
+
+        pickup = pd.to_datetime(df["tpep_pickup_datetime"]).to_numpy()
+        # Trips without a pickup time, day -1, are never valid
+        days, _ = pd.factorize(pickup.astype("M8[D]"), sort=True)
+        order = np.argsort(days, kind="stable")
+        partitions = np.split(order, np.cumsum(np.bincount(days + 1)))[1:]
+
+        # Forking after other libraries started threads can deadlock
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_partition_worker,
+            initargs=(zone_index, encoder),
+        ) as executor:
+            pending = deque()
+            parts = []
+            for rows in partitions:
+                if not len(rows):
+                    continue
+                pending.append(executor.submit(_process_partition, df.take(rows)))
+                # A few days in flight per worker keeps them busy while
+                # bounding the day copies held here
+                while len(pending) > 2 * self.workers:
+                    parts.append(pending.popleft().result())
+            del df
+            while pending:
+                parts.append(pending.popleft().result())
+        self.logger.info(f"Processed {len(parts)} days in {self.workers} processes")
+
+        df = pd.concat(parts, ignore_index=True)
+        del parts
+        self.split_and_save_data(df, "train", "val", "test")
+        self.save_feature_schema(df)
 
     def run(self):
+        if self.chunk_rows:
+            self.run_chunked()
+            return
+        if self.workers > 1:
+            self.run_parallel()
+            return
+
         df, df_zone = self.load_data()
         df = self.extract_features(df)
-        df = self.merge_location_data(df, df_zone)
-        df = self.encode_categorical(df)
-        df = df.astype(float)
-        self.split_and_save_data(df, "train.csv", "val.csv", "test.csv")
+        zone_index = ZoneIndex(df_zone)
+        df = self.merge_location_data(df, zone_index)
+        # Cast to float32 as it is written, not to a float64 copy first
+        df = self.encode_categorical(
+            df, CategoricalEncoder(zone_index.feature_categories)
+        )
+        self.split_and_save_data(df, "train", "val", "test")
+        self.save_feature_schema(df)
@@ -1,4 +1,3 @@
-import pandas as pd
 import xgboost as xgb
 from sklearn.metrics import (
     mean_squared_error,
@@ -9,6 +8,8 @@ import logging
 import json
 import os
 from dvclive import Live
+from backend.feature_schema import FeatureSchema
+from model_pipeline.storage import read_table, read_table_columns
 
 
 class ModelEvaluator:
@@ -25,6 +26,7 @@ class ModelEvaluator:
         # self.report_file = report_file
         # self.report_folder = report_folder
         self.model = None
+        self.feature_schema = None
         self.X_test = None
         self.y_test = None
 
@@ -32,14 +34,28 @@ class ModelEvaluator:
         if os.path.exists(self.model_path):
             self.model = xgb.Booster()
             self.model.load_model(self.model_path)
+            self.feature_schema = FeatureSchema.from_model(self.model)
             self.logger.info(f"Model loaded from {self.model_path}")
         else:
             self.logger.error(f"Model file not found at {self.model_path}")
             raise FileNotFoundError(f"Model file not found at {self.model_path}")
 
     def load_test_data(self):
-        test_df = pd.read_csv(self.test_file)
-        self.X_test = test_df.drop(columns=["trip_time"])
+        if self.feature_schema is not None:
+            missing_columns = self.feature_schema.missing_columns(
+                read_table_columns(self.test_file)
+            )
+            if missing_columns:
+                self.logger.error(f"Test data is missing columns: {missing_columns}")
+                raise ValueError(f"Test data is missing columns: {missing_columns}")
+            test_df = read_table(
+                self.test_file,
+                columns=self.feature_schema.columns + [self.feature_schema.target],
+            )
+            self.X_test = test_df[self.feature_schema.columns]
+        else:
+            test_df = read_table(self.test_file)
+            self.X_test = test_df.drop(columns=["trip_time"])
         self.y_test = test_df["trip_time"]
 
     def evaluate(self):
@@ -7,6 +7,7 @@ from sklearn.metrics import mean_absolute_error
 import logging
 import os
 from dvclive import Live
+from model_pipeline.storage import read_table
 
 
 class ModelTrainer:
@@ -24,9 +25,9 @@ class ModelTrainer:
             os.makedirs(model_dir)
 
     def load_data(self):
-        self.train_df = pd.read_csv(self.train_file)
-        self.val_df = pd.read_csv(self.val_file)
-        self.test_df = pd.read_csv(self.test_file)
+        self.train_df = read_table(self.train_file)
+        self.val_df = read_table(self.val_file)
+        self.test_df = read_table(self.test_file)
 
     def separate_features_and_target(self):
         self.X_train = self.train_df.drop(columns=["trip_time"])
@@ -85,7 +86,11 @@ class ModelTrainer:
 
     def save_model(self, model_filename: str = "xgb.json"):
         model_path = os.path.join(self.model_dir, model_filename)
-        self.best_model.save_model(model_path)
+        # Write then rename, a serving process watching the file never reads
+        # a partially written model
+        tmp_path = os.path.join(self.model_dir, f".{model_filename}.tmp.json")
+        self.best_model.save_model(tmp_path)
+        os.replace(tmp_path, model_path)
         self.logger.info(f"Model saved to {model_path}")
         with Live() as live:
             live.log_artifact(model_path, type="model", name="xgboost")
@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+from typing import Dict, Iterable, List, Optional
+
+# Marks the None values of an object column, stored as strings
+_NULL_SUFFIX = "__null"
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PartitionCache:
+    """
+    Local copy of the trips day tables: one .npz file of column arrays per
+    table and a manifest.json holding, per table, the fingerprint of the
+    table it was fetched from (row count, sum and max of trip_id, sum of
+    total_amount and last dropoff time), the
+    cached column names and the sha256 of its file.
+    """
+
+    def __init__(self, folder: str, manifest_filename: str = "manifest.json"):
+        self.logger = logging.getLogger(__name__)
+        self.folder = folder
+        self.manifest_path = os.path.join(folder, manifest_filename)
+        self._lock = threading.Lock()
+
+        self.manifest = {"tables": {}}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path) as f:
+                    self.manifest = json.load(f)
+            except ValueError:
+                self.logger.warning(
+                    f"Unreadable {self.manifest_path}, starting with an empty cache"
+                )
+
+    def _save_manifest(self) -> None:
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def get(self, table_name: str) -> Optional[dict]:
+        with self._lock:
+            return self.manifest["tables"].get(table_name)
+
+    def load(self, table_name: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        :return: The cached columns, or None when the table is not cached or
+            its file no longer matches the manifest.
+        """
+        entry = self.get(table_name)
+        if entry is None:
+            return None
+
+        path = os.path.join(self.folder, entry["file"])
+        if not os.path.exists(path) or _file_sha256(path) != entry["sha256"]:
+            self.logger.warning(f"Cached {table_name} is missing or corrupted")
+            return None
+
+        columns = {}
+        with np.load(path) as npz:
+            for name in npz.files:
+                if name.endswith(_NULL_SUFFIX):
+                    continue
+                values = npz[name]
+                if f"{name}{_NULL_SUFFIX}" in npz.files:
+                    values = values.astype(object)
+                    values[npz[f"{name}{_NULL_SUFFIX}"]] = None
+                columns[name] = values
+        return columns
+
+    def save(
+        self, table_name: str, columns: Dict[str, np.ndarray], fingerprint: dict
+    ) -> None:
+        arrays = {}
+        for name, values in columns.items():
+            if values.dtype == object:
+                null = np.array([value is None for value in values], dtype=bool)
+                arrays[name] = np.where(null, "", values).astype(str)
+                arrays[f"{name}{_NULL_SUFFIX}"] = null
+            else:
+                arrays[name] = values
+
+        os.makedirs(self.folder, exist_ok=True)
+        filename = f"{table_name}.npz"
+        path = os.path.join(self.folder, filename)
+        tmp_path = os.path.join(self.folder, f".{filename}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.manifest["tables"][table_name] = {
+                **fingerprint,
+                "columns": list(columns),
+                "file": filename,
+                "sha256": _file_sha256(path),
+            }
+            self._save_manifest()
+
+    def evict(self, keep: Iterable[str]) -> List[str]:
+        """
+        Removes the cached tables not in `keep`.
+        :return: The evicted table names.
+        """
+        keep = set(keep)
+        with self._lock:
+            evicted = [name for name in self.manifest["tables"] if name not in keep]
+            for name in evicted:
+                entry = self.manifest["tables"].pop(name)
+                path = os.path.join(self.folder, entry["file"])
+                if os.path.exists(path):
+                    os.remove(path)
+            if evicted:
+                self._save_manifest()
+
+        if evicted:
+            self.logger.info(f"Evicted {len(evicted)} expired tables: {evicted}")
+        return evicted
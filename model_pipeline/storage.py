@@ -0,0 +1,255 @@
+import os
+import logging
+import pandas as pd
+from typing import Dict, Iterator, List, Optional, Tuple
+from backend.feature_schema import TARGET_COLUMN
+
+logger = logging.getLogger(__name__)
+
+STORAGE_FORMATS = {"parquet": ".parquet", "csv": ".csv"}
+STORAGE_FORMAT = os.getenv("STORAGE_FORMAT", "parquet")
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+PARQUET_ROW_GROUP_ROWS = 100000
+
+# The collected trips as they are stored, the columns DataCollector fetches.
+# Location ids fit in int16 and amounts are float32: cents and miles survive
+# the round trip and the model reads float32 anyway.
+RAW_TRIPS_SCHEMA = {
+    "tpep_pickup_datetime": "datetime64[ns]",
+    "tpep_dropoff_datetime": "datetime64[ns]",
+    "passenger_count": "float32",
+    "trip_distance": "float32",
+    "PULocationID": "int16",
+    "DOLocationID": "int16",
+    "fare_amount": "float32",
+    "total_amount": "float32",
+    "Airport_fee": "float32",
+    "trip_id": "int64",
+}
+
+ZONES_SCHEMA = {
+    "LocationID": "int16",
+    "Borough": "object",
+    "Zone": "object",
+    "service_zone": "object",
+}
+
+
+def processed_schema(columns: List[str], target: str = TARGET_COLUMN) -> Dict[str, str]:
+    # Model inputs as float32, what the DMatrix holds, the target stays float64
+    return {column: "float64" if column == target else "float32" for column in columns}
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_format(storage_format: Optional[str] = None) -> str:
+    """
+    :param storage_format: parquet or csv, STORAGE_FORMAT when not set.
+    :return: The format to write with, csv when pyarrow is not installed.
+    """
+    storage_format = (storage_format or STORAGE_FORMAT).lower()
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(
+            f"Unknown storage format {storage_format}, expected one of {list(STORAGE_FORMATS)}"
+        )
+    if storage_format == "parquet" and not _has_pyarrow():
+        logger.warning("pyarrow is not installed, storing tables as CSV")
+        return "csv"
+    return storage_format
+
+
+def table_path(folder: str, name: str, storage_format: Optional[str] = None) -> str:
+    return os.path.join(folder, name + STORAGE_FORMATS[resolve_format(storage_format)])
+
+
+def find_table(path: str) -> str:
+    """
+    Locates a stored table from its path with or without extension, so
+    callers do not depend on the format the producing stage was set to.
+    :return: The path itself when it exists, else the Parquet or CSV file
+        with the same name.
+    """
+    if os.path.exists(path):
+        return path
+    root, extension = os.path.splitext(path)
+    if extension not in STORAGE_FORMATS.values():
+        root = path
+    for extension in STORAGE_FORMATS.values():
+        if os.path.exists(root + extension):
+            return root + extension
+    raise FileNotFoundError(f"No stored table at {path}")
+
+
+def _is_parquet(path: str) -> bool:
+    return path.endswith(STORAGE_FORMATS["parquet"])
+
+
+def _cast(df: pd.DataFrame, schema: Optional[Dict[str, str]]) -> pd.DataFrame:
+    if not schema:
+        return df
+    return df.astype({c: dtype for c, dtype in schema.items() if c in df.columns})
+
+
+def _prepare_path(path: str) -> None:
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    # The same table stored in the other format, readers could pick it up
+    root = os.path.splitext(path)[0]
+    for extension in STORAGE_FORMATS.values():
+        if root + extension != path and os.path.exists(root + extension):
+            os.remove(root + extension)
+
+
+def write_table(
+    df: pd.DataFrame, path: str, schema: Optional[Dict[str, str]] = None
+) -> None:
+    """
+    Writes `df` as Parquet or CSV depending on the extension of `path`, with
+    the columns in `schema` cast to their dtype. The same table stored in
+    the other format is removed, so readers cannot pick up a stale copy.
+    """
+    df = _cast(df, schema)
+    _prepare_path(path)
+    if _is_parquet(path):
+        df.to_parquet(
+            path,
+            index=False,
+            compression=PARQUET_COMPRESSION,
+            row_group_size=PARQUET_ROW_GROUP_ROWS,
+        )
+    else:
+        df.to_csv(path, index=False)
+
+
+class TableWriter:
+    """
+    Appends chunks to a table as write_table would store it whole. Every
+    chunk must have the same columns.
+    """
+
+    def __init__(self, path: str, schema: Optional[Dict[str, str]] = None) -> None:
+        self.path = path
+        self.schema = schema
+        self.n_rows = 0
+        self._writer = None
+        self._file = None
+        _prepare_path(path)
+
+    def write(self, df: pd.DataFrame) -> None:
+        df = _cast(df, self.schema)
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(
+                    self.path, table.schema, compression=PARQUET_COMPRESSION
+                )
+            self._writer.write_table(table, row_group_size=PARQUET_ROW_GROUP_ROWS)
+        else:
+            header = self._file is None
+            if header:
+                self._file = open(self.path, "w", newline="")
+            df.to_csv(self._file, header=header, index=False)
+        self.n_rows += len(df)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def _csv_options(
+    columns: Optional[List[str]], schema: Optional[Dict[str, str]]
+) -> Tuple[Dict[str, str], List[str]]:
+    # Datetime columns are parsed after reading, parse_dates together with
+    # dtype takes a much slower path in pandas
+    dtype, parse_dates = {}, []
+    for column, column_dtype in (schema or {}).items():
+        if columns is not None and column not in columns:
+            continue
+        if column_dtype.startswith("datetime64"):
+            parse_dates.append(column)
+        else:
+            dtype[column] = column_dtype
+    return dtype, parse_dates
+
+
+def _parse_dates(df: pd.DataFrame, parse_dates: List[str]) -> pd.DataFrame:
+    # As to_csv writes them. Inferred from the first value, some timestamps
+    # fall back to parsing every value with dateutil
+    for column in parse_dates:
+        df[column] = pd.to_datetime(df[column], format="ISO8601")
+    return df
+
+
+def read_table(
+    path: str,
+    columns: Optional[List[str]] = None,
+    schema: Optional[Dict[str, str]] = None,
+) -> pd.DataFrame:
+    """
+    Reads a table stored by write_table, Parquet memory-mapped.
+    :param columns: Columns to load, all when not set.
+    :param schema: Dtypes of the CSV columns, Parquet files carry their own.
+    """
+    path = find_table(path)
+    if _is_parquet(path):
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+
+    dtype, parse_dates = _csv_options(columns, schema)
+    return _parse_dates(pd.read_csv(path, usecols=columns, dtype=dtype), parse_dates)
+
+
+def iter_table(
+    path: str,
+    chunk_rows: int,
+    columns: Optional[List[str]] = None,
+    schema: Optional[Dict[str, str]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    read_table `chunk_rows` rows at a time, so memory does not grow with the
+    size of the table.
+    """
+    path = find_table(path)
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        try:
+            for batch in parquet_file.iter_batches(
+                batch_size=chunk_rows, columns=columns
+            ):
+                yield batch.to_pandas()
+        finally:
+            parquet_file.close()
+        return
+
+    dtype, parse_dates = _csv_options(columns, schema)
+    with pd.read_csv(
+        path, usecols=columns, dtype=dtype, chunksize=chunk_rows
+    ) as reader:
+        for df in reader:
+            yield _parse_dates(df, parse_dates)
+
+
+def read_table_columns(path: str) -> List[str]:
+    """
+    :return: The column names of a stored table, without reading its rows.
+    """
+    path = find_table(path)
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(path).names
+    return pd.read_csv(path, nrows=0).columns.tolist()
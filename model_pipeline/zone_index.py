@@ -0,0 +1,91 @@
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+# The trip column holding the zone of each end of the trip
+LOCATION_COLUMNS = {
+    "pickup": "PULocationID",
+    "dropoff": "DOLocationID",
+}
+
+# The zone attributes looked up, by the feature name they get
+ZONE_ATTRIBUTES = {
+    "borough": "Borough",
+    "service_zone": "service_zone",
+}
+
+
+class ZoneIndex:
+    """
+    The zone attributes as arrays of category codes indexed by LocationID,
+    so trips get the attributes of their zones by gathering from them rather
+    than by joining the zones table: no copy of the trips per attribute, and
+    one row out per trip even if the table repeats a LocationID.
+    """
+
+    def __init__(self, df_zone: pd.DataFrame) -> None:
+        self.logger = logging.getLogger(__name__)
+
+        location_ids = df_zone["LocationID"].to_numpy(dtype=np.int64)
+        if len(np.unique(location_ids)) < len(location_ids):
+            self.logger.warning(
+                "The zones table repeats LocationIDs, the last row of each is used"
+            )
+        size = int(location_ids.max()) + 1 if len(location_ids) else 0
+
+        self.location_valid = np.zeros(size, dtype=bool)
+        self.location_valid[location_ids] = True
+
+        # Sorted values of each attribute and, per LocationID, the code of
+        # its value, -1 for NaN and for IDs not in the table
+        self.categories = {}
+        self.codes = {}
+        for feature, attribute in ZONE_ATTRIBUTES.items():
+            values = df_zone[attribute]
+            self.categories[feature] = sorted(values.dropna().unique())
+            codes = np.full(size, -1, dtype=np.int8)
+            codes[location_ids] = pd.Categorical(
+                values, categories=self.categories[feature]
+            ).codes
+            self.codes[feature] = codes
+
+    @property
+    def feature_categories(self) -> Dict[str, List[str]]:
+        """
+        :return: The values of each categorical feature, pickup_borough to
+            dropoff_service_zone.
+        """
+        return {
+            f"{direction}_{feature}": categories
+            for direction in LOCATION_COLUMNS
+            for feature, categories in self.categories.items()
+        }
+
+    def lookup(
+        self, location_ids: pd.Series, direction: str
+    ) -> Dict[str, pd.Categorical]:
+        """
+        :param direction: pickup or dropoff, the prefix of the features.
+        :return: The zone attributes of each trip by feature name, NaN for
+            IDs not in the zones table, which are counted and logged.
+        """
+        ids = location_ids.to_numpy(dtype=np.int64, na_value=-1)
+        known = (ids >= 0) & (ids < len(self.location_valid))
+        known[known] = self.location_valid[ids[known]]
+
+        unknown = ~known
+        if unknown.any():
+            self.logger.error(
+                f"{unknown.sum()} {direction} location ID not found, example ID from trips: {ids[unknown][0]}"
+            )
+
+        rows = np.where(known, ids, 0)
+        attributes = {}
+        for feature, codes in self.codes.items():
+            trip_codes = codes[rows] if len(codes) else np.full(len(ids), -1, np.int8)
+            trip_codes[unknown] = -1
+            attributes[f"{direction}_{feature}"] = pd.Categorical.from_codes(
+                trip_codes, categories=self.categories[feature]
+            )
+        return attributes
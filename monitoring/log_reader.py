@@ -1,14 +1,19 @@
 import os
-import boto3
 import json
 import gzip
 import pandas as pd
 from io import BytesIO
+from typing import List
 from dotenv import load_dotenv
 
+LOG_PREFIX = "INFO:backend.utils:"
+
 
 class LogReader:
     def __init__(self):
+        # Only needed to download, parse_message works without it
+        import boto3
+
         load_dotenv()
 
         self.s3_client = boto3.client(
@@ -73,17 +78,26 @@ class LogReader:
                     ) > pd.Timedelta(minutes=last_n_minutes):
                         continue
 
-                    if log_entry["message"].startswith(
-                        "INFO:backend.utils:prediction_result: "
-                    ):
-                        log_entry["message"] = log_entry["message"].replace(
-                            "INFO:backend.utils:prediction_result: ", ""
-                        )
-                        log_data = json.loads(log_entry["message"])
-                        all_data.append(self.extract_features(log_data))
+                    all_data += self.parse_message(log_entry["message"])
 
         return pd.DataFrame(all_data)
 
+    @classmethod
+    def parse_message(cls, message: str) -> List[dict]:
+        """
+        Parse a prediction log line written by backend.utils.
+        :param message: The log line, e.g. "INFO:backend.utils:prediction_result: {...}".
+        :return: The extracted data of each prediction in the line, none for
+            other lines.
+        """
+        if message.startswith(f"{LOG_PREFIX}prediction_result: "):
+            log_data = json.loads(message[len(f"{LOG_PREFIX}prediction_result: ") :])
+            return [cls.extract_features(log_data)]
+        if message.startswith(f"{LOG_PREFIX}prediction_results: "):
+            log_data = json.loads(message[len(f"{LOG_PREFIX}prediction_results: ") :])
+            return [cls.extract_features(entry) for entry in log_data]
+        return []
+
     @staticmethod
     def extract_features(log_entry: dict) -> dict:
         """
@@ -94,6 +108,8 @@ class LogReader:
         data = log_entry["extracted_features"]
         data["prediction"] = log_entry["prediction"]
         data["trip_id"] = log_entry["trip_id"]
+        if "model_version" in log_entry:
+            data["model_version"] = log_entry["model_version"]
         return data
 
 
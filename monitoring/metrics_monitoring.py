@@ -3,12 +3,15 @@ import prefect
 from dotenv import load_dotenv
 import pandas as pd
 from typing import List
+from model_pipeline.storage import read_table
 from evidently.report import Report
 from evidently.metric_preset import RegressionPreset, TargetDriftPreset
 from evidently.ui.workspace.cloud import CloudWorkspace
 
+import model_pipeline.categorical_encoder
 import model_pipeline.data_collector
 import model_pipeline.data_processor
+import model_pipeline.zone_index
 import monitoring.log_reader
 
 
@@ -21,8 +24,13 @@ def get_data_from_db() -> pd.DataFrame:
     zones_df = collector.collect_zones_data()
 
     df = processor.extract_features(df, keep_trip_id=True)
-    df = processor.merge_location_data(df, zones_df)
-    df = processor.encode_categorical(df)
+    zone_index = model_pipeline.zone_index.ZoneIndex(zones_df)
+    df = processor.merge_location_data(df, zone_index)
+    # The columns the model was trained on, whichever zones the trips visit
+    encoder = model_pipeline.categorical_encoder.CategoricalEncoder(
+        zone_index.feature_categories
+    )
+    df = processor.encode_categorical(df, encoder)
 
     trip_ids = df.trip_id
     df = df.drop(columns=["trip_id"])
@@ -43,10 +51,10 @@ def get_data_from_logs() -> pd.DataFrame:
 
 
 @prefect.task
-def read_data_from_csvs(types: List[str]) -> pd.DataFrame:
+def read_data_from_tables(types: List[str]) -> pd.DataFrame:
     dfs = []
     for type in types:
-        df = pd.read_csv(f"./data/{type}.csv")
+        df = read_table(f"./data/{type}")
         dfs.append(df)
     return pd.concat(dfs)
 
@@ -66,7 +74,7 @@ def generate_metrics_report(df: pd.DataFrame) -> None:
 def generate_target_drift_report(curr_df: pd.DataFrame, ref_df: pd.DataFrame) -> None:
     ref_df = ref_df.rename(columns={"trip_time": "target"})
     curr_df = curr_df.rename(columns={"trip_time": "target"})
-    curr_df = curr_df.drop(columns=["prediction"])
+    curr_df = curr_df.drop(columns=["prediction", "model_version"], errors="ignore")
     print("Len df", len(ref_df))
     print("Len target ", len(ref_df["target"]))
 
@@ -101,7 +109,7 @@ def generate_flow_run_name():
 def model_metrics_report() -> None:
     db_df = get_data_from_db()
     logs_df = get_data_from_logs()
-    train_val_df = read_data_from_csvs(["train", "val"])
+    train_val_df = read_data_from_tables(["train", "val"])
     print("DB DF", db_df["trip_id"].iloc[:5])
     print("LOGS DF", logs_df["trip_id"].iloc[:5])
     merged_df = pd.merge(logs_df, db_df, on="trip_id", how="inner")
@@ -4,6 +4,7 @@ from monitoring.log_reader import LogReader
 import xgboost as xgb
 import prefect
 from typing import List
+from model_pipeline.storage import read_table
 
 from evidently.ui.workspace.cloud import CloudWorkspace
 from evidently.report import Report
@@ -21,10 +22,10 @@ def get_data_from_logs() -> pd.DataFrame:
 
 
 @prefect.task
-def read_data_from_csvs(types: List[str]) -> pd.DataFrame:
+def read_data_from_tables(types: List[str]) -> pd.DataFrame:
     dfs = []
     for type in types:
-        df = pd.read_csv(f"./data/{type}.csv")
+        df = read_table(f"./data/{type}")
         dfs.append(df)
     return pd.concat(dfs)
 
@@ -33,7 +34,9 @@ def read_data_from_csvs(types: List[str]) -> pd.DataFrame:
 def create_data_report(df_current: pd.DataFrame, df_ref: pd.DataFrame):
 
     report_cols = [
-        col for col in df_current.columns if col not in ["trip_id", "prediction"]
+        col
+        for col in df_current.columns
+        if col not in ["trip_id", "prediction", "model_version"]
     ]
 
     data_report = Report(
@@ -61,7 +64,9 @@ def create_prediction_drift_report(df_current: pd.DataFrame, df_ref: pd.DataFram
     )
 
     report_cols = [
-        col for col in df_current.columns if col not in ["trip_id", "trip_time"]
+        col
+        for col in df_current.columns
+        if col not in ["trip_id", "trip_time", "model_version"]
     ]
 
     prediction_report = Report(
@@ -100,8 +105,8 @@ def generate_flow_run_name():
 )
 def monitoring_report() -> None:
     df_current = get_data_from_logs()
-    df_train_val = read_data_from_csvs(types=["train", "val"])
-    df_test = read_data_from_csvs(types=["test"])
+    df_train_val = read_data_from_tables(types=["train", "val"])
+    df_test = read_data_from_tables(types=["test"])
     data_report = create_data_report(df_current=df_current, df_ref=df_train_val)
     prediction_report = create_prediction_drift_report(
         df_current=df_current, df_ref=df_test
@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CONFIGURATIONS = {
+    "xgboost": {"MODEL_ENGINE": "xgboost"},
+    "numpy": {"MODEL_ENGINE": "numpy", "MODEL_ENGINE_CHECK_PARITY": "false"},
+}
+
+
+def first_prediction() -> None:
+    # Runs in a fresh interpreter: start the app lifecycle and send one request
+    from fastapi.testclient import TestClient
+    from backend.app import app
+
+    request = {
+        "trip_id": "cold-start",
+        "request_datetime": "2024-08-03T10/11/12+0000",
+        "trip_distance": 2.5,
+        "PULocationID": 132,
+        "DOLocationID": 48,
+        "Airport": 1,
+    }
+    with TestClient(app) as client:
+        started_at = time.perf_counter()
+        response = client.post("/api/v1/predict", json=request)
+        first_request_seconds = time.perf_counter() - started_at
+        response.raise_for_status()
+        state = client.get("/api/v1/ready").json()
+
+    state["first_request_seconds"] = first_request_seconds
+    print(json.dumps(state))
+
+
+def run(runs: int, configurations: list) -> dict:
+    results = {}
+    for name in configurations:
+        env = {**os.environ, **CONFIGURATIONS[name]}
+        wall_seconds, states = [], []
+
+        for _ in range(runs):
+            started_at = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, "-m", "scripts.benchmark_cold_start", "--child"],
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            wall_seconds.append(time.perf_counter() - started_at)
+            states.append(json.loads(output.strip().splitlines()[-1]))
+
+        results[name] = {
+            "process_wall_seconds": statistics.median(wall_seconds),
+            **{
+                key: statistics.median(state[key] for state in states)
+                for key in (
+                    "import_seconds",
+                    "load_seconds",
+                    "warmup_seconds",
+                    "time_to_first_prediction_seconds",
+                    "first_request_seconds",
+                )
+            },
+        }
+        print(name, json.dumps(results[name], indent=2))
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--configurations",
+        nargs="+",
+        default=list(CONFIGURATIONS),
+        choices=list(CONFIGURATIONS),
+    )
+    parser.add_argument("--output", help="Optional JSON file for the medians")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        first_prediction()
+    else:
+        results = run(args.runs, args.configurations)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
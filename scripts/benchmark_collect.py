@@ -0,0 +1,63 @@
+import os
+import time
+import tempfile
+import argparse
+import tracemalloc
+import pandas as pd
+from model_pipeline.data_collector import DataCollector
+from tests.trips_db import build_trips_db, get_data_serial
+
+
+def measure(fn) -> tuple:
+    started_at = time.perf_counter()
+    df = fn()
+    elapsed = time.perf_counter() - started_at
+
+    # Separate run, tracemalloc slows allocation heavy code down
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, elapsed, peak / 2**20
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--db", default=os.path.join(tempfile.gettempdir(), "nytaxi-trips.sqlite")
+    )
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--rows-per-day", type=int, default=50000)
+    parser.add_argument("--trips-file", default="data/data")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    build_trips_db(args.db, args.days, args.rows_per_day, args.trips_file)
+    collector = DataCollector(
+        connection_string=f"sqlite:///{args.db}",
+        schema=None,
+        workers=args.workers,
+        chunk_rows=args.chunk_rows,
+    )
+
+    serial, serial_seconds, serial_mb = measure(
+        lambda: get_data_serial(collector, args.days)
+    )
+    streamed, streamed_seconds, streamed_mb = measure(
+        lambda: collector.get_data(days=args.days)
+    )
+
+    data_mb = streamed.memory_usage(deep=True).sum() / 2**20
+    print(f"{len(streamed)} rows, {data_mb:.1f} MB as a DataFrame")
+    print(f"{'path':<10} {'seconds':>8} {'peak MB':>8}")
+    print(f"{'serial':<10} {serial_seconds:>8.2f} {serial_mb:>8.1f}")
+    print(f"{'streamed':<10} {streamed_seconds:>8.2f} {streamed_mb:>8.1f}")
+
+    serial["tpep_pickup_datetime"] = pd.to_datetime(serial["tpep_pickup_datetime"])
+    serial["tpep_dropoff_datetime"] = pd.to_datetime(serial["tpep_dropoff_datetime"])
+    pd.testing.assert_frame_equal(serial[streamed.columns], streamed, check_dtype=False)
+    print(
+        f"Same rows and values as the serial path, {len(streamed.columns)} of "
+        f"its {len(serial.columns)} columns"
+    )
@@ -0,0 +1,135 @@
+import gc
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from scipy import sparse
+from backend.feature_schema import TARGET_COLUMN
+from model_pipeline.categorical_encoder import CategoricalEncoder
+from model_pipeline.data_processor import CATEGORICAL_COLUMNS, DataProcessor
+from model_pipeline.storage import ZONES_SCHEMA, read_table
+from scripts.benchmark_processing import make_trips
+
+
+def memory_status() -> dict:
+    # Linux only, the resident and peak resident MB of this process
+    status = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, value = line.split(":", 1)
+            if key in ("VmRSS", "VmHWM"):
+                status[key] = int(value.split()[0]) / 1024
+    return status
+
+
+def reset_peak_memory() -> None:
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+def dense_csr(values: np.ndarray) -> sparse.csr_matrix:
+    # Every value stored, zeros too: entries a CSR matrix leaves out are
+    # missing to xgboost
+    n_rows, n_columns = values.shape
+    return sparse.csr_matrix(
+        (
+            values.ravel(),
+            np.tile(np.arange(n_columns), n_rows),
+            np.arange(n_rows + 1) * n_columns,
+        ),
+        shape=values.shape,
+    )
+
+
+def get_dummies_features(df: pd.DataFrame, encoder: CategoricalEncoder):
+    # DataProcessor.run before the encoder
+    return pd.get_dummies(df, columns=CATEGORICAL_COLUMNS, drop_first=True).astype(
+        float
+    )
+
+
+def uint8_features(df: pd.DataFrame, encoder: CategoricalEncoder):
+    return encoder.transform(df)
+
+
+def csr_features(df: pd.DataFrame, encoder: CategoricalEncoder):
+    numeric = df.drop(columns=CATEGORICAL_COLUMNS).to_numpy(dtype=np.float32)
+    return sparse.hstack(
+        [dense_csr(numeric), encoder.transform_sparse(df)], format="csr"
+    )
+
+
+VARIANTS = {
+    "get_dummies float64": get_dummies_features,
+    "uint8 block": uint8_features,
+    "CSR": csr_features,
+}
+
+
+def size_mb(features) -> float:
+    if sparse.issparse(features):
+        nbytes = features.data.nbytes + features.indices.nbytes
+        return (nbytes + features.indptr.nbytes) / 2**20
+    return features.memory_usage(deep=True).sum() / 2**20
+
+
+def check_same_features(df: pd.DataFrame, encoder: CategoricalEncoder) -> None:
+    expected = get_dummies_features(df, encoder).to_numpy()
+    np.testing.assert_array_equal(uint8_features(df, encoder).to_numpy(float), expected)
+    np.testing.assert_array_equal(
+        csr_features(df, encoder).toarray(), expected.astype(np.float32)
+    )
+
+
+def run(rows: int, zones_file: str, seed: int) -> None:
+    processor = DataProcessor("", "", "")
+    df_zone = read_table(zones_file, schema=ZONES_SCHEMA)
+    encoder = CategoricalEncoder.from_zones(df_zone)
+
+    df = processor.extract_features(make_trips(rows, seed))
+    df = processor.merge_location_data(df, df_zone)
+    label = df.pop(TARGET_COLUMN).to_numpy()
+    gc.collect()
+
+    check_same_features(df.head(100_000), encoder)
+
+    print(f"{len(df)} rows, {len(encoder)} encoded columns")
+    print(
+        f"{'encoding':<20} {'encode s':>9} {'matrix MB':>10} {'DMatrix s':>10} "
+        f"{'peak MB':>8}"
+    )
+    for name, encode in VARIANTS.items():
+        rss_mb = memory_status()["VmRSS"]
+        reset_peak_memory()
+
+        started_at = time.perf_counter()
+        features = encode(df, encoder)
+        encode_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        dmatrix = xgb.DMatrix(features, label=label)
+        dmatrix_seconds = time.perf_counter() - started_at
+        assert dmatrix.num_row() == len(df)
+
+        # What encoding and building the DMatrix added to the process
+        peak_mb = memory_status()["VmHWM"] - rss_mb
+        print(
+            f"{name:<20} {encode_seconds:>9.2f} {size_mb(features):>10.1f} "
+            f"{dmatrix_seconds:>10.2f} {peak_mb:>8.1f}"
+        )
+        del features, dmatrix
+        gc.collect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Encoding the zone features and building the DMatrix, "
+        "get_dummies vs the fixed vocabulary encoder"
+    )
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--zones-file", default="data/zones.csv")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run(args.rows, args.zones_file, args.seed)
@@ -0,0 +1,62 @@
+import argparse
+import timeit
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from backend.model_executor import ModelExecutor
+from backend.tree_engine import TreeEnsemble
+from model_pipeline.storage import read_table
+
+
+def time_per_call(fn, repeat: int) -> float:
+    # Best of `repeat` runs of at least 0.2s each, in microseconds per call
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def run(model_path: str, test_file: str, batch_sizes: list, repeat: int) -> None:
+    model_executor = ModelExecutor(model_path=model_path)
+    tree_ensemble = TreeEnsemble.from_json_file(model_path)
+    columns = model_executor.feature_schema.columns
+
+    test_df = read_table(test_file, columns=columns)
+    features = test_df.to_numpy(dtype=np.float32)
+
+    max_difference = tree_ensemble.check_parity(model_executor.model, features)
+    print(f"Tree engine parity on {len(features)} rows: max |diff| {max_difference}")
+
+    print(f"{'batch':>6} {'path':<28} {'us/call':>10} {'us/row':>10}")
+    for batch_size in batch_sizes:
+        rows = np.resize(features, (batch_size, features.shape[1]))
+        df = pd.DataFrame(rows.astype(np.float64), columns=columns)
+        buffer = model_executor.new_buffer(batch_size)
+
+        def dataframe_dmatrix():
+            model_executor.model.predict(xgb.DMatrix(df))
+
+        def inplace_reused_buffer():
+            buffer[:] = rows
+            model_executor.predict_batch(buffer)
+
+        def numpy_tree_engine():
+            tree_ensemble.predict(rows)
+
+        for name, fn in (
+            ("DataFrame + DMatrix", dataframe_dmatrix),
+            ("float32 inplace_predict", inplace_reused_buffer),
+            ("numpy tree engine", numpy_tree_engine),
+        ):
+            us = time_per_call(fn, repeat)
+            print(f"{batch_size:>6} {name:<28} {us:>10.1f} {us / batch_size:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default="models/xgb.json")
+    parser.add_argument("--test-file", default="data/test")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 1024])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    run(args.model_path, args.test_file, args.batch_sizes, args.repeat)
@@ -0,0 +1,69 @@
+import argparse
+import timeit
+from backend import metrics
+from backend.api import (
+    extract_and_predict,
+    extract_and_predict_batch,
+    get_serving_model,
+)
+from backend.api_models import PredictionRequest
+
+
+def time_per_call(fn, repeat: int) -> tuple:
+    # Many short runs with disabled and enabled alternating, so drift on a
+    # noisy machine hits both alike; best run in microseconds per call
+    timer = timeit.Timer(fn)
+    number = max(1, timer.autorange()[0] // 4)
+    timings = {None: [], "enabled": []}
+    for _ in range(repeat):
+        for state in timings:
+            metrics.set_serving_metrics(
+                metrics.ServingMetrics() if state is not None else None
+            )
+            timings[state].append(timer.timeit(number=number) / number * 1e6)
+    return min(timings[None]), min(timings["enabled"])
+
+
+def run(repeat: int, batch_size: int) -> None:
+    get_serving_model()
+    request = PredictionRequest(
+        trip_id="benchmark",
+        request_datetime="2024-08-03T10/11/12+0000",
+        trip_distance=2.5,
+        PULocationID=132,
+        DOLocationID=48,
+        Airport=1,
+    )
+    requests = [request] * batch_size
+
+    def laps():
+        timer = metrics.stage_timer()
+        timer.lap("a")
+        timer.lap("b")
+        timer.lap("c")
+
+    paths = (
+        ("3 stage laps", laps),
+        ("extract_and_predict", lambda: extract_and_predict(request)),
+        (
+            f"extract_and_predict_batch({batch_size})",
+            lambda: extract_and_predict_batch(requests),
+        ),
+    )
+
+    print(f"{'path':<32} {'disabled us':>12} {'enabled us':>12} {'overhead':>9}")
+    for name, fn in paths:
+        disabled, enabled = time_per_call(fn, repeat)
+        print(
+            f"{name:<32} {disabled:>12.2f} {enabled:>12.2f} "
+            f"{(enabled - disabled) / disabled:>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=25)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    run(args.repeat, args.batch_size)
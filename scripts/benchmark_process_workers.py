@@ -0,0 +1,55 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import argparse
+import pandas as pd
+from model_pipeline.data_processor import DataProcessor
+from model_pipeline.storage import RAW_TRIPS_SCHEMA, read_table, write_table
+from scripts.benchmark_processing import make_trips
+
+SPLITS = ["train", "val", "test"]
+
+
+def run(rows: int, zones_file: str, workers: list, seed: int) -> None:
+    folder = tempfile.mkdtemp(prefix="nytaxi-process-")
+    try:
+        data_file = os.path.join(folder, "data.parquet")
+        write_table(make_trips(rows, seed), data_file, RAW_TRIPS_SCHEMA)
+
+        print(f"{rows} rows over 31 days, {os.cpu_count()} CPUs")
+        print(f"{'workers':>7} {'seconds':>8} {'speedup':>8}")
+        reference, serial_seconds = None, None
+        for n_workers in workers:
+            output_folder = os.path.join(folder, f"workers-{n_workers}")
+            processor = DataProcessor(
+                data_file, zones_file, output_folder, chunk_rows=0, workers=n_workers
+            )
+            started_at = time.perf_counter()
+            processor.run()
+            seconds = time.perf_counter() - started_at
+
+            output = {split: read_table(f"{output_folder}/{split}") for split in SPLITS}
+            if reference is None:
+                reference, serial_seconds = output, seconds
+            for split in SPLITS:
+                pd.testing.assert_frame_equal(output[split], reference[split])
+            print(f"{n_workers:>7} {seconds:>8.2f} {serial_seconds / seconds:>8.2f}")
+        print(f"Same train, val and test as with {workers[0]} worker(s)")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="DataProcessor.run over day partitions with several workers"
+    )
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--zones-file", default="data/zones.csv")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    run(args.rows, args.zones_file, args.workers, args.seed)
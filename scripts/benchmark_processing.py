@@ -0,0 +1,151 @@
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+from model_pipeline.data_processor import DataProcessor
+from model_pipeline.storage import RAW_TRIPS_SCHEMA
+
+
+def make_trips(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic raw trips with the stored dtypes, a month of pickups and some
+    rows failing each validity check.
+    """
+    rng = np.random.default_rng(seed)
+    pickup = np.datetime64("2024-08-01") + rng.integers(0, 31 * 86400, n_rows).astype(
+        "m8[s]"
+    )
+    duration = rng.integers(-60, 6 * 3600, n_rows).astype("m8[s]")
+    columns = {}
+    for name, dtype in RAW_TRIPS_SCHEMA.items():
+        if name == "tpep_pickup_datetime":
+            columns[name] = pickup.astype("M8[ns]")
+        elif name == "tpep_dropoff_datetime":
+            columns[name] = (pickup + duration).astype("M8[ns]")
+        elif name == "trip_id":
+            columns[name] = np.arange(n_rows)
+        elif name in ("PULocationID", "DOLocationID"):
+            columns[name] = rng.integers(1, 266, n_rows).astype(dtype)
+        else:
+            columns[name] = np.round(rng.uniform(-1, 60, n_rows), 2).astype(dtype)
+    columns["Airport_fee"] = np.where(rng.random(n_rows) < 0.1, 1.75, 0).astype(
+        np.float32
+    )
+    return pd.DataFrame(columns)
+
+
+def wide_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # The columns in the float64 and int64 the CSV reader inferred
+    return df.astype(
+        {
+            name: "float64" if df[name].dtype.kind == "f" else "int64"
+            for name in df.columns
+            if df[name].dtype.kind in "fiu"
+        }
+    )
+
+
+def extract_features_before(df: pd.DataFrame) -> pd.DataFrame:
+    # DataProcessor.extract_features before it was vectorized
+    df["tpep_pickup_datetime"] = pd.to_datetime(df["tpep_pickup_datetime"])
+    df["tpep_dropoff_datetime"] = pd.to_datetime(df["tpep_dropoff_datetime"])
+
+    df = df.sort_values("tpep_pickup_datetime").reset_index(drop=True)
+
+    df["pickup_hour"] = df["tpep_pickup_datetime"].dt.hour
+    df["pickup_minute"] = df["tpep_pickup_datetime"].dt.minute
+    df["pickup_dayofweek"] = df["tpep_pickup_datetime"].dt.dayofweek
+    df["pickup_dayofmonth"] = df["tpep_pickup_datetime"].dt.day
+
+    df["trip_time"] = (df["tpep_dropoff_datetime"] - df["tpep_pickup_datetime"]).apply(
+        lambda x: x.total_seconds() / 60
+    )
+
+    df = df[
+        (df["trip_distance"] > 0)
+        & (df["passenger_count"] > 0)
+        & (df["fare_amount"] > 0)
+        & (df["total_amount"] > 0)
+        & (df["trip_time"] > 0)
+        & (df["trip_time"] < 300)
+    ]
+
+    df["is_from_airport"] = df["Airport_fee"].apply(lambda x: 1 if x > 0 else 0)
+
+    df = df.drop(
+        columns=[
+            "VendorID",
+            "tpep_pickup_datetime",
+            "tpep_dropoff_datetime",
+            "passenger_count",
+            "RatecodeID",
+            "store_and_fwd_flag",
+            "payment_type",
+            "fare_amount",
+            "extra",
+            "mta_tax",
+            "tip_amount",
+            "tolls_amount",
+            "total_amount",
+            "improvement_surcharge",
+            "congestion_surcharge",
+            "Airport_fee",
+        ],
+        # The stored trips only have the columns DataCollector fetches
+        errors="ignore",
+    )
+    return df.drop(columns=["trip_id"])
+
+
+def measure(fn, df: pd.DataFrame) -> tuple:
+    started_at = time.perf_counter()
+    result = fn(df.copy())
+    elapsed = time.perf_counter() - started_at
+
+    # Separate run, tracemalloc slows allocation heavy code down. The input
+    # copy is made before tracing starts.
+    df = df.copy()
+    tracemalloc.start()
+    fn(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="DataProcessor.extract_features before and after vectorizing"
+    )
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    processor = DataProcessor("", "", "")
+    compact = make_trips(args.rows, args.seed)
+    wide = wide_frame(compact)
+
+    print(f"{args.rows} rows")
+    print(f"{'path':<28} {'input MB':>9} {'seconds':>8} {'peak MB':>8}")
+    results = []
+    for name, fn, df in (
+        ("before, CSV dtypes", extract_features_before, wide),
+        ("vectorized, CSV dtypes", processor.extract_features, wide),
+        ("vectorized, stored dtypes", processor.extract_features, compact),
+    ):
+        result, seconds, peak_mb = measure(fn, df)
+        input_mb = df.memory_usage(deep=True).sum() / 2**20
+        print(f"{name:<28} {input_mb:>9.1f} {seconds:>8.2f} {peak_mb:>8.1f}")
+        results.append(result)
+
+    # The previous sort was not stable, trips picked up in the same second
+    # may come in another order
+    columns = results[0].columns.tolist()
+    expected = results[0].astype(float).sort_values(columns, ignore_index=True)
+    for result in results[1:]:
+        pd.testing.assert_frame_equal(
+            result.astype(float).sort_values(columns, ignore_index=True),
+            expected,
+            check_column_type=False,
+        )
+    print(f"Same {len(results[0])} rows and values as before")
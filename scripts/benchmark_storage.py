@@ -0,0 +1,85 @@
+import os
+import time
+import shutil
+import tempfile
+import argparse
+import pandas as pd
+from model_pipeline.data_processor import RAW_COLUMNS
+from model_pipeline.storage import (
+    RAW_TRIPS_SCHEMA,
+    processed_schema,
+    read_table,
+    read_table_columns,
+    write_table,
+)
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started_at)
+    return min(timings)
+
+
+def run(tables: dict, scale: int, repeat: int) -> None:
+    folder = tempfile.mkdtemp(prefix="nytaxi-storage-")
+    try:
+        print(
+            f"{'table':<8} {'format':<8} {'rows':>9} {'MB':>8} {'write s':>8} "
+            f"{'read s':>8} {'cols s':>8} {'infer s':>8}"
+        )
+        for name, (path, schema, columns) in tables.items():
+            df = read_table(path, schema=schema)
+            df = pd.concat([df] * scale, ignore_index=True)
+            schema = schema or processed_schema(df.columns.tolist())
+
+            for extension in (".csv", ".parquet"):
+                filepath = os.path.join(folder, name + extension)
+                write_seconds = best_of(lambda: write_table(df, filepath, schema), 1)
+                # The CSV reader gets the schema, so it skips dtype inference
+                read_seconds = best_of(
+                    lambda: read_table(filepath, schema=schema), repeat
+                )
+                columns_seconds = best_of(
+                    lambda: read_table(filepath, columns=columns, schema=schema),
+                    repeat,
+                )
+                # How every stage read its CSV input before
+                infer = (
+                    f"{best_of(lambda: pd.read_csv(filepath), repeat):>8.2f}"
+                    if extension == ".csv"
+                    else f"{'-':>8}"
+                )
+                size_mb = os.path.getsize(filepath) / 2**20
+                print(
+                    f"{name:<8} {extension[1:]:<8} {len(df):>9} {size_mb:>8.1f} "
+                    f"{write_seconds:>8.2f} {read_seconds:>8.2f} "
+                    f"{columns_seconds:>8.2f} {infer}"
+                )
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Disk size and parse time of the pipeline tables, CSV vs Parquet"
+    )
+    parser.add_argument("--data-file", default="data/data")
+    parser.add_argument("--train-file", default="data/train")
+    parser.add_argument(
+        "--scale", type=int, default=10, help="Copies of the rows to benchmark on"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    train_columns = read_table_columns(args.train_file)
+    run(
+        {
+            "data": (args.data_file, RAW_TRIPS_SCHEMA, RAW_COLUMNS),
+            "train": (args.train_file, None, train_columns[:4]),
+        },
+        args.scale,
+        args.repeat,
+    )
@@ -0,0 +1,155 @@
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import subprocess
+import httpx
+
+CONFIGURATIONS = {
+    "private": {"SHARED_MODEL": "false", "MODEL_ENGINE": "xgboost"},
+    "private-numpy": {"SHARED_MODEL": "false", "MODEL_ENGINE": "numpy"},
+    "shared": {"SHARED_MODEL": "true"},
+}
+
+REQUEST = {
+    "trip_id": "benchmark",
+    "request_datetime": "2024-08-03T10/11/12+0000",
+    "trip_distance": 2.5,
+    "PULocationID": 132,
+    "DOLocationID": 48,
+    "Airport": 1,
+}
+
+
+def worker_pids(parent_pid: int) -> list:
+    with open(f"/proc/{parent_pid}/task/{parent_pid}/children") as f:
+        children = [int(pid) for pid in f.read().split()]
+
+    # Skip helpers such as the multiprocessing resource tracker
+    pids = []
+    for pid in children:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            if b"spawn_main" in f.read():
+                pids.append(pid)
+    return pids or [parent_pid]
+
+
+def memory_mb(pid: int) -> dict:
+    # Pss splits shared pages between the processes mapping them
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss"):
+                memory[key.lower()] = int(value.split()[0]) / 1024
+    return memory
+
+
+def wait_ready(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/api/v1/ready").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+async def load(url: str, concurrency: int, duration: float) -> dict:
+    completed, errors = 0, 0
+    deadline = time.monotonic() + duration
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        nonlocal completed, errors
+        while time.monotonic() < deadline:
+            response = await client.post(f"{url}/api/v1/predict", json=REQUEST)
+            if response.status_code == 200:
+                completed += 1
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        started_at = time.monotonic()
+        await asyncio.gather(*[client_loop(client) for _ in range(concurrency)])
+        elapsed = time.monotonic() - started_at
+
+    return {"requests_per_second": completed / elapsed, "errors": errors}
+
+
+def run_one(name: str, workers: int, args: argparse.Namespace) -> dict:
+    env = {
+        **os.environ,
+        **CONFIGURATIONS[name],
+        "SERVING_WORKERS": str(workers),
+        "PORT": str(args.port),
+    }
+    url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "backend.app"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(url)
+        # /ready is answered by one worker, let the others finish starting
+        time.sleep(args.settle_seconds)
+        result = asyncio.run(load(url, args.concurrency, args.duration))
+
+        memory = [memory_mb(pid) for pid in worker_pids(server.pid)]
+        result.update(
+            {
+                "workers": len(memory),
+                "rss_mb_per_worker": sum(m["rss"] for m in memory) / len(memory),
+                "pss_mb_per_worker": sum(m["pss"] for m in memory) / len(memory),
+                "pss_mb_total": sum(m["pss"] for m in memory),
+            }
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+    return result
+
+
+def run(args: argparse.Namespace) -> dict:
+    results = {}
+    for name in args.configurations:
+        results[name] = {}
+        for workers in args.workers:
+            result = run_one(name, workers, args)
+            results[name][workers] = result
+            print(
+                f"{name:<8} workers {workers:>2}: {result['requests_per_second']:>8.1f} req/s, "
+                f"RSS {result['rss_mb_per_worker']:.1f} MB/worker, "
+                f"PSS {result['pss_mb_per_worker']:.1f} MB/worker, "
+                f"{result['errors']} errors"
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument(
+        "--configurations",
+        nargs="+",
+        default=list(CONFIGURATIONS),
+        choices=list(CONFIGURATIONS),
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--settle-seconds", type=float, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
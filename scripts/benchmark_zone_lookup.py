@@ -0,0 +1,72 @@
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from model_pipeline.data_processor import CATEGORICAL_COLUMNS, DataProcessor
+from model_pipeline.storage import ZONES_SCHEMA, read_table
+from model_pipeline.zone_index import ZoneIndex
+from scripts.benchmark_processing import make_trips, measure
+
+
+def merge_location_data_before(df: pd.DataFrame, df_zone: pd.DataFrame):
+    # DataProcessor.merge_location_data before the zone index
+    df = pd.merge(
+        df, df_zone, left_on="PULocationID", right_on="LocationID", how="left"
+    )
+    df = df.rename(
+        columns={
+            "Borough": "pickup_borough",
+            "Zone": "pickup_zone",
+            "service_zone": "pickup_service_zone",
+        }
+    )
+    df = df.drop(columns=["PULocationID", "pickup_zone", "LocationID"])
+
+    df = pd.merge(
+        df, df_zone, left_on="DOLocationID", right_on="LocationID", how="left"
+    )
+    df = df.rename(
+        columns={
+            "Borough": "dropoff_borough",
+            "Zone": "dropoff_zone",
+            "service_zone": "dropoff_service_zone",
+        }
+    )
+    return df.drop(columns=["DOLocationID", "dropoff_zone", "LocationID"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Zone attributes of the trips, pd.merge vs the zone index"
+    )
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--zones-file", default="data/zones.csv")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Shows the count of unknown IDs the lookup logs
+    logging.basicConfig(level=logging.ERROR)
+
+    processor = DataProcessor("", "", "")
+    df_zone = read_table(args.zones_file, schema=ZONES_SCHEMA)
+    df = processor.extract_features(make_trips(args.rows, args.seed))
+    # A few IDs the zones table does not have
+    unknown = np.random.default_rng(args.seed).random(len(df)) < 1e-4
+    df.loc[unknown, "DOLocationID"] = 999
+
+    zone_index = ZoneIndex(df_zone)
+    print(f"{len(df)} rows, {unknown.sum()} unknown dropoff IDs")
+    print(f"{'path':<12} {'seconds':>8} {'peak MB':>8}")
+    results = []
+    for name, fn in (
+        ("pd.merge", lambda df: merge_location_data_before(df, df_zone)),
+        ("zone index", lambda df: processor.merge_location_data(df, zone_index)),
+    ):
+        result, seconds, peak_mb = measure(fn, df)
+        print(f"{name:<12} {seconds:>8.2f} {peak_mb:>8.1f}")
+        results.append(result)
+
+    expected, result = results
+    result = result.astype({column: object for column in CATEGORICAL_COLUMNS})
+    pd.testing.assert_frame_equal(result, expected)
+    print(f"Same {len(expected)} rows and values as before")
@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import subprocess
+import numpy as np
+import httpx
+from typing import List, Optional
+
+REQUEST_DATETIME_FORMAT = "%Y-%m-%dT%H/%M/%S+0000"
+
+
+def load_request_file(path: str) -> List[dict]:
+    # One PredictionRequest payload per line, e.g. recorded from the API
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def requests_from_trips(path: str, limit: int, seed: int) -> List[dict]:
+    from model_pipeline.storage import RAW_TRIPS_SCHEMA, read_table
+
+    df = read_table(
+        path,
+        columns=[
+            "trip_id",
+            "tpep_pickup_datetime",
+            "trip_distance",
+            "PULocationID",
+            "DOLocationID",
+            "Airport_fee",
+        ],
+        schema=RAW_TRIPS_SCHEMA,
+    )
+    if len(df) > limit:
+        df = df.sample(n=limit, random_state=seed)
+
+    return [
+        {
+            "trip_id": str(row.trip_id),
+            "request_datetime": row.tpep_pickup_datetime.strftime(
+                REQUEST_DATETIME_FORMAT
+            ),
+            "trip_distance": float(row.trip_distance),
+            "PULocationID": int(row.PULocationID),
+            "DOLocationID": int(row.DOLocationID),
+            "Airport": int(row.Airport_fee > 0),
+        }
+        for row in df.itertuples()
+    ]
+
+
+def synthetic_requests(n: int, seed: int, max_location_id: int = 265) -> List[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "trip_id": f"synthetic-{i}",
+            "request_datetime": (
+                f"2024-08-{rng.randint(1, 31):02d}T{rng.randint(0, 23):02d}/"
+                f"{rng.randint(0, 59):02d}/{rng.randint(0, 59):02d}+0000"
+            ),
+            "trip_distance": round(rng.lognormvariate(0.7, 0.8), 2),
+            "PULocationID": rng.randint(1, max_location_id),
+            "DOLocationID": rng.randint(1, max_location_id),
+            "Airport": int(rng.random() < 0.1),
+        }
+        for i in range(n)
+    ]
+
+
+def load_payloads(args: argparse.Namespace) -> tuple:
+    if args.requests_file:
+        return load_request_file(args.requests_file), args.requests_file
+    if args.trips_file:
+        from model_pipeline.storage import find_table
+
+        try:
+            trips_file = find_table(args.trips_file)
+        except FileNotFoundError:
+            trips_file = None
+        if trips_file is not None:
+            return (
+                requests_from_trips(trips_file, args.payloads, args.seed),
+                trips_file,
+            )
+    return synthetic_requests(args.payloads, args.seed), "synthetic"
+
+
+def summarize(
+    latencies: List[float], errors: int, elapsed: float, rows_per_request: int
+) -> dict:
+    completed = len(latencies)
+    total = completed + errors
+    latency_ms = np.asarray(latencies) * 1000
+    summary = {
+        "requests": total,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "duration_seconds": elapsed,
+        "throughput_rps": completed / elapsed if elapsed else 0.0,
+        "rows_per_second": completed * rows_per_request / elapsed if elapsed else 0.0,
+    }
+    if completed:
+        summary["latency_ms"] = {
+            "mean": float(latency_ms.mean()),
+            "p50": float(np.percentile(latency_ms, 50)),
+            "p95": float(np.percentile(latency_ms, 95)),
+            "p99": float(np.percentile(latency_ms, 99)),
+            "max": float(latency_ms.max()),
+        }
+    return summary
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    path: str,
+    bodies: List[dict],
+    n_requests: int,
+    concurrency: int,
+    rate: Optional[float],
+) -> tuple:
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i: int, scheduled_at: Optional[float]) -> None:
+        nonlocal errors
+        async with semaphore:
+            if scheduled_at is None:
+                scheduled_at = time.perf_counter()
+            try:
+                response = await client.post(path, json=bodies[i % len(bodies)])
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+        if ok:
+            # From the scheduled send time, so queueing behind a slow server
+            # counts against latency at a fixed arrival rate
+            latencies.append(time.perf_counter() - scheduled_at)
+        else:
+            errors += 1
+
+    started_at = time.perf_counter()
+    if rate is None:
+        # Closed loop, at most `concurrency` requests in flight
+        await asyncio.gather(*[send(i, None) for i in range(n_requests)])
+    else:
+        # Open loop at a fixed arrival rate, `concurrency` caps the requests
+        # in flight so an overloaded app shows up as growing latency
+        tasks = []
+        for i in range(n_requests):
+            scheduled_at = started_at + i / rate
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(i, scheduled_at)))
+        await asyncio.gather(*tasks)
+
+    return latencies, errors, time.perf_counter() - started_at
+
+
+async def run(args: argparse.Namespace, payloads: List[dict]) -> dict:
+    # Imported here, loading the app reads the model and zones
+    from backend.app import app, lifespan
+
+    endpoints = {
+        "predict": ("/api/v1/predict", payloads, 1),
+        "predict_batch": (
+            "/api/v1/predict_batch",
+            [
+                {"data": payloads[i : i + args.batch_size]}
+                for i in range(0, len(payloads), args.batch_size)
+            ],
+            args.batch_size,
+        ),
+    }
+
+    results = {}
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://load-test", timeout=60
+        ) as client:
+            for name in args.endpoints:
+                path, bodies, rows_per_request = endpoints[name]
+                n_requests = args.requests
+                if name == "predict_batch":
+                    n_requests = max(1, args.requests // args.batch_size)
+
+                await replay(client, path, bodies, args.warmup, args.concurrency, None)
+                latencies, errors, elapsed = await replay(
+                    client, path, bodies, n_requests, args.concurrency, args.rate
+                )
+                results[name] = summarize(latencies, errors, elapsed, rows_per_request)
+                print(name, json.dumps(results[name], indent=2))
+
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay PredictionRequest payloads against the app in-process"
+    )
+    parser.add_argument("--requests-file", help="JSONL file, one payload per line")
+    parser.add_argument(
+        "--trips-file",
+        default="data/data",
+        help="Raw trips, Parquet or CSV, turned into payloads when no requests file is given",
+    )
+    parser.add_argument("--payloads", type=int, default=5000)
+    parser.add_argument(
+        "--endpoints",
+        nargs="+",
+        default=["predict", "predict_batch"],
+        choices=["predict", "predict_batch"],
+    )
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--rate", type=float, help="Requests per second, closed loop if not set"
+    )
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="reports/load_test.json")
+    parser.add_argument("--log-file", default=os.devnull)
+    args = parser.parse_args()
+
+    # Prediction logs are still produced so their cost is measured, but kept
+    # out of the terminal
+    logging.basicConfig(level=logging.INFO, filename=args.log_file)
+
+    payloads, source = load_payloads(args)
+    results = asyncio.run(run(args, payloads))
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "source": source,
+        "payloads": len(payloads),
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "batch_size": args.batch_size,
+        "environment": {
+            key: value
+            for key, value in os.environ.items()
+            if key.startswith(
+                ("MICRO_BATCH", "MODEL_", "INFERENCE_", "PREDICTION_", "SHARED_")
+            )
+        },
+        "endpoints": results,
+    }
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Report written to {args.output}", file=sys.stderr)
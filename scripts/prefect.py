@@ -14,19 +14,19 @@ def data_collection():
 
 @prefect.task
 def data_processing():
-    processor = DataProcessor("data/data.csv", "data/zones.csv", "data")
+    processor = DataProcessor("data/data", "data/zones.csv", "data")
     processor.run()
 
 
 @prefect.task
 def model_training(n_trials: int):
-    trainer = ModelTrainer("data/train.csv", "data/val.csv", "data/test.csv")
+    trainer = ModelTrainer("data/train", "data/val", "data/test")
     trainer.run(n_trials=n_trials)
 
 
 @prefect.task
 def model_evaluator():
-    evaluator = ModelEvaluator(model_path="models/xgb.json", test_file="data/test.csv")
+    evaluator = ModelEvaluator(model_path="models/xgb.json", test_file="data/test")
     evaluator.run()
 
 
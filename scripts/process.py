@@ -7,7 +7,7 @@ if __name__ == "__main__":
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
     processor = DataProcessor(
-        data_filename="data/data.csv",
+        data_filename="data/data",
         zones_filename="data/zones.csv",
         output_folder="data",
     )
@@ -0,0 +1,297 @@
+import sys
+import time
+import logging
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from backend.api_models import PredictionRequest
+from backend.bulk_scoring import score_columns
+from backend.serving_model import ServingModel
+
+TRIP_COLUMNS = [
+    "trip_id",
+    "tpep_pickup_datetime",
+    "trip_distance",
+    "PULocationID",
+    "DOLocationID",
+    "Airport_fee",
+]
+# Request fields without a default, a trip missing one is not scored
+REQUIRED_COLUMNS = ["trip_distance", "PULocationID", "DOLocationID"]
+
+logger = logging.getLogger(__name__)
+
+# Loaded once per worker process by the pool initializer
+_serving_model = None
+
+
+def load_model(model_options: dict) -> ServingModel:
+    global _serving_model
+    _serving_model = ServingModel(**model_options)
+    return _serving_model
+
+
+def score_chunk(columns: Dict[str, np.ndarray]) -> tuple:
+    return score_columns(_serving_model, columns)
+
+
+def read_chunks(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(
+            batch_size=chunk_rows, columns=TRIP_COLUMNS
+        ):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=TRIP_COLUMNS, chunksize=chunk_rows)
+
+
+def missing_value_errors(df: pd.DataFrame) -> List[Optional[str]]:
+    # The API would reject these requests before extracting features
+    missing = df[REQUIRED_COLUMNS].isna().to_numpy()
+    errors = [None] * len(df)
+    for i in np.flatnonzero(missing.any(axis=1)):
+        names = [name for name, na in zip(REQUIRED_COLUMNS, missing[i]) if na]
+        errors[i] = f"Missing {', '.join(names)}"
+    return errors
+
+
+def merge_scores(
+    errors: List[Optional[str]],
+    scored: tuple,
+) -> Tuple[np.ndarray, List[Optional[str]]]:
+    """
+    :param errors: The missing value errors of every row of the chunk.
+    :param scored: The predictions and errors of the rows without one.
+    :return: The predictions and errors of every row.
+    """
+    scored_predictions, scored_errors = scored
+    valid = np.array([error is None for error in errors], dtype=bool)
+    predictions = np.full(len(errors), np.nan)
+    predictions[valid] = scored_predictions
+
+    scored_errors = iter(scored_errors)
+    errors = [next(scored_errors) if error is None else error for error in errors]
+    return predictions, errors
+
+
+def request_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    # The PredictionRequest fields the API would receive for these trips
+    pickup = df["tpep_pickup_datetime"]
+    if pd.api.types.is_datetime64_any_dtype(pickup):
+        # Wall-clock time, as a request string with an offset is read
+        if pickup.dt.tz is not None:
+            pickup = pickup.dt.tz_localize(None)
+        request_datetime = np.datetime_as_string(
+            pickup.to_numpy(dtype="M8[s]"), unit="s"
+        )
+    else:
+        request_datetime = pickup.astype(str).to_numpy(dtype=object)
+
+    return {
+        "trip_id": df["trip_id"].astype(str).to_numpy(dtype=object),
+        "request_datetime": request_datetime,
+        "trip_distance": df["trip_distance"].to_numpy(dtype=np.float64),
+        "PULocationID": df["PULocationID"].to_numpy(dtype=np.int64),
+        "DOLocationID": df["DOLocationID"].to_numpy(dtype=np.int64),
+        "Airport": (df["Airport_fee"] > 0).to_numpy(dtype=np.int64),
+    }
+
+
+class PredictionWriter:
+    """
+    Appends trip_id, prediction and error chunk by chunk to a CSV file, or a
+    Parquet file when the path ends with .parquet.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self._writer = None
+        self._file = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            header = self._file is None
+            if header:
+                self._file = open(self.path, "w", newline="")
+            df.to_csv(self._file, header=header, index=False)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def check_against_api(
+    serving_model: ServingModel,
+    columns: Dict[str, np.ndarray],
+    predictions: np.ndarray,
+    errors: List[Optional[str]],
+    n_rows: int,
+) -> None:
+    # The per-row path behind /predict, on the first rows of the output
+    for i in range(min(n_rows, len(predictions))):
+        request = PredictionRequest(
+            trip_id=columns["trip_id"][i],
+            request_datetime=str(columns["request_datetime"][i]),
+            trip_distance=columns["trip_distance"][i],
+            PULocationID=columns["PULocationID"][i],
+            DOLocationID=columns["DOLocationID"][i],
+            Airport=columns["Airport"][i],
+        )
+        try:
+            features = serving_model.feature_extractor.extract_feature_vector(request)
+        except ValueError:
+            if errors[i] is None:
+                raise RuntimeError(f"Row {i} scored offline but fails in the API")
+            continue
+
+        expected = serving_model.model_executor.predict(features)
+        if errors[i] is not None or predictions[i] != expected:
+            raise RuntimeError(
+                f"Row {i} scored {predictions[i]} offline but {expected} in the API"
+            )
+    logger.info(f"First {min(n_rows, len(predictions))} rows match the API")
+
+
+def run(args: argparse.Namespace) -> None:
+    model_options = {
+        "model_path": args.model,
+        "schema_path": args.schema,
+        "zones_filename": args.zones_filename,
+        "data_folder": args.data_folder,
+        "engine": args.engine,
+        # One thread per process, the pool provides the parallelism
+        "nthread": 1 if args.workers > 1 else None,
+    }
+
+    executor = None
+    serving_model = None
+    if args.workers > 1:
+        # Forking after xgboost has started its OpenMP threads can deadlock
+        executor = ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=load_model,
+            initargs=(model_options,),
+        )
+    if args.workers <= 1 or args.check_rows:
+        serving_model = load_model(model_options)
+
+    writer = PredictionWriter(args.output)
+    pending = deque()
+    n_rows, n_errors = 0, 0
+    started_at = time.perf_counter()
+    reported_at = started_at
+
+    def write_oldest() -> None:
+        nonlocal n_rows, n_errors, reported_at
+        trip_ids, missing, columns, future = pending.popleft()
+        scored = future.result()
+        if n_rows == 0 and args.check_rows:
+            check_against_api(serving_model, columns, *scored, args.check_rows)
+        predictions, errors = merge_scores(missing, scored)
+
+        writer.write(
+            pd.DataFrame(
+                {
+                    "trip_id": trip_ids,
+                    "prediction": predictions,
+                    "error": errors,
+                }
+            )
+        )
+        n_rows += len(predictions)
+        n_errors += sum(error is not None for error in errors)
+
+        now = time.perf_counter()
+        if now - reported_at >= args.progress_seconds:
+            logger.info(
+                f"Scored {n_rows} rows, {n_rows / (now - started_at):.0f} rows/s"
+            )
+            reported_at = now
+
+    try:
+        for df in read_chunks(args.input, args.chunk_rows):
+            trip_ids = df["trip_id"].astype(str).to_numpy(dtype=object)
+            missing = missing_value_errors(df)
+            if any(error is not None for error in missing):
+                df = df[[error is None for error in missing]]
+            columns = request_columns(df)
+            if executor is None:
+                future = Future()
+                future.set_result(score_columns(serving_model, columns))
+            else:
+                # trip_id stays here, workers only need the feature inputs
+                future = executor.submit(
+                    score_chunk,
+                    {
+                        name: column
+                        for name, column in columns.items()
+                        if name != "trip_id"
+                    },
+                )
+            pending.append((trip_ids, missing, columns, future))
+
+            # A few chunks in flight per worker keeps them busy while
+            # bounding memory, and chunks are written in input order
+            while len(pending) > 2 * max(args.workers, 1):
+                write_oldest()
+
+        while pending:
+            write_oldest()
+    finally:
+        writer.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - started_at
+    logger.info(
+        f"Scored {n_rows} rows ({n_errors} errors) in {elapsed:.1f}s, "
+        f"{n_rows / elapsed:.0f} rows/s, predictions written to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Score a raw trips CSV or Parquet file with the serving features"
+    )
+    parser.add_argument("input", help="Raw trips, .csv or .parquet")
+    parser.add_argument("output", help="Predictions, .csv or .parquet")
+    parser.add_argument("--model", default="models/xgb.json")
+    parser.add_argument("--schema", default="data/feature_schema.json")
+    parser.add_argument("--data-folder", default="data")
+    parser.add_argument("--zones-filename", default="zones.csv")
+    parser.add_argument("--engine", default="xgboost", choices=["xgboost", "numpy"])
+    parser.add_argument("--chunk-rows", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--progress-seconds", type=float, default=5)
+    parser.add_argument(
+        "--check-rows",
+        type=int,
+        default=0,
+        help="Compare the first rows with the per-row API path before writing",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        stream=sys.stderr,
+    )
+    run(args)
@@ -6,5 +6,5 @@ if __name__ == "__main__":
         level=logging.INFO,
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
-    trainer = ModelTrainer("data/train.csv", "data/val.csv", "data/test.csv")
+    trainer = ModelTrainer("data/train", "data/val", "data/test")
     trainer.run(n_trials=50)
@@ -0,0 +1,140 @@
+import io
+import json
+import shutil
+import logging
+import pytest
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import backend.api
+import backend.utils
+from backend.utils import PredictionLogWriter
+from model_pipeline.data_collector import DataCollector
+from monitoring.log_reader import LogReader
+from tests.trips_db import build_trips_db
+
+MODEL_PATH = "models/xgb.json"
+TRIPS_DB_DAYS = 3
+
+
+def write_model(path: str, base_score_shift: float = 0.0) -> None:
+    # A different model version, predicting base_score_shift more
+    with open(MODEL_PATH) as f:
+        model = json.load(f)
+    params = model["learner"]["learner_model_param"]
+    params["base_score"] = f"{float(params['base_score']) + base_score_shift:E}"
+    with open(path, "w") as f:
+        json.dump(model, f)
+
+
+def prediction_request(trip_id: str = "1", **fields) -> dict:
+    return {
+        "trip_id": trip_id,
+        "request_datetime": "2024-08-09T12/08/59+0000",
+        "trip_distance": 5.61,
+        "PULocationID": 34,
+        "DOLocationID": 69,
+        "Airport": 0,
+        **fields,
+    }
+
+
+@pytest.fixture
+def model_path(tmp_path) -> str:
+    path = str(tmp_path / "xgb.json")
+    shutil.copy(MODEL_PATH, path)
+    return path
+
+
+@pytest.fixture
+def prediction_log():
+    # Rows of the prediction logs written while the fixture is active
+    logger = logging.getLogger("backend.utils")
+    level, propagate = logger.level, logger.propagate
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    def rows() -> list:
+        backend.utils.get_prediction_log_writer().flush()
+        return [
+            row
+            for line in stream.getvalue().splitlines()
+            for row in LogReader.parse_message(line)
+        ]
+
+    yield rows
+    logger.removeHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = propagate
+
+
+@pytest.fixture
+def api_client(monkeypatch, model_path):
+    """
+    Makes a client of the API router serving a copy of the model, with the
+    module settings given as keyword arguments. Each client starts from
+    fresh serving state and the previous one is shut down.
+    """
+    monkeypatch.setattr(backend.api, "MODEL_PATH", model_path)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        await backend.api.shutdown_serving()
+
+    clients = []
+
+    def make_client(**settings) -> TestClient:
+        while clients:
+            clients.pop().__exit__(None, None, None)
+        for name, value in {
+            "_serving_model": None,
+            "_serving_models": {},
+            "_inference_executor": None,
+            "_model_reload_lock": None,
+            "_model_watcher": None,
+            "_retiring": set(),
+            "serving_state": {"ready": False},
+            **settings,
+        }.items():
+            assert hasattr(backend.api, name), name
+            monkeypatch.setattr(backend.api, name, value)
+        monkeypatch.setattr(
+            backend.utils,
+            "_prediction_log_writer",
+            PredictionLogWriter(logger_name="backend.utils"),
+        )
+
+        app = FastAPI(lifespan=lifespan)
+        app.include_router(backend.api.router)
+        client = TestClient(app)
+        client.__enter__()
+        clients.append(client)
+        return client
+
+    yield make_client
+    while clients:
+        clients.pop().__exit__(None, None, None)
+
+
+@pytest.fixture
+def trips_db(tmp_path) -> str:
+    # One day table per day up to today, sampled from data/data
+    path = str(tmp_path / "trips.sqlite")
+    build_trips_db(path, TRIPS_DB_DAYS, rows_per_day=300, trips_file="data/data")
+    return path
+
+
+@pytest.fixture
+def collector(trips_db) -> DataCollector:
+    return DataCollector(
+        connection_string=f"sqlite:///{trips_db}",
+        schema=None,
+        workers=2,
+        chunk_rows=100,
+        cache_folder=None,
+    )
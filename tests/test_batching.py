@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import numpy as np
+import pytest
+from backend.batching import MicroBatcher, MicroBatcherClosed, MicroBatcherOverloaded
+from backend.inference import InferenceExecutor
+
+
+class RecordingModel:
+    def __init__(self, error: Exception = None) -> None:
+        self.batches = []
+        self.error = error
+        # Cleared to hold batches in the model
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def predict_batch(self, features: np.ndarray) -> np.ndarray:
+        self.batches.append(features)
+        self.gate.wait(timeout=10)
+        if self.error is not None:
+            raise self.error
+        return features.sum(axis=1)
+
+
+def test_micro_batcher_coalesces_requests():
+    model = RecordingModel()
+    batcher = MicroBatcher(model.predict_batch, max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        rows = [np.full(3, i, dtype=np.float32) for i in range(5)]
+        predictions = await asyncio.gather(*[batcher.predict(row) for row in rows])
+        await batcher.stop()
+        return predictions
+
+    predictions = asyncio.run(scenario())
+    assert predictions == [0.0, 3.0, 6.0, 9.0, 12.0]
+    assert [len(batch) for batch in model.batches] == [5]
+    assert batcher.stats()["batches"] == 1
+
+
+def test_micro_batcher_error_reaches_every_caller():
+    model = RecordingModel(error=ValueError("broken model"))
+    batcher = MicroBatcher(model.predict_batch, max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        rows = [np.zeros(3, dtype=np.float32) for _ in range(4)]
+        results = await asyncio.gather(
+            *[batcher.predict(row) for row in rows], return_exceptions=True
+        )
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert len(model.batches) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.parametrize("collect_seconds", [0, 0.05])
+def test_micro_batcher_stop_fails_unscored_requests(collect_seconds):
+    # Still queued, or collected into a batch that waits for more
+    model = RecordingModel()
+    batcher = MicroBatcher(model.predict_batch, max_batch_size=8, max_wait_ms=10_000)
+
+    async def scenario():
+        tasks = [
+            asyncio.create_task(batcher.predict(np.zeros(3, dtype=np.float32)))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(collect_seconds)
+        await batcher.stop()
+        results = await asyncio.wait_for(
+            asyncio.gather(*tasks, return_exceptions=True), timeout=1
+        )
+
+        # A stopped batcher is not restarted by a late request
+        with pytest.raises(MicroBatcherClosed):
+            await batcher.predict(np.zeros(3, dtype=np.float32))
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, MicroBatcherClosed) for result in results)
+    assert model.batches == []
+    assert batcher._task is None
+
+
+def test_micro_batcher_refuses_requests_when_overloaded():
+    model = RecordingModel()
+    model.gate.clear()
+    executor = InferenceExecutor("thread", max_workers=2)
+    batcher = MicroBatcher(
+        model.predict_batch,
+        max_batch_size=1,
+        max_wait_ms=0,
+        inference_executor=executor,
+        max_queue_size=2,
+        max_batches_in_flight=1,
+    )
+
+    async def scenario():
+        rows = [np.full(3, i, dtype=np.float32) for i in range(4)]
+        # One batch held in the model, the next two requests queued
+        tasks = [asyncio.create_task(batcher.predict(rows[0]))]
+        while not model.batches:
+            await asyncio.sleep(0.01)
+        tasks += [asyncio.create_task(batcher.predict(row)) for row in rows[1:3]]
+        await asyncio.sleep(0.05)
+        assert batcher.stats()["batches_in_flight"] == 1
+        assert batcher.stats()["queue_depth"] == 2
+
+        with pytest.raises(MicroBatcherOverloaded):
+            await batcher.predict(rows[3])
+
+        model.gate.set()
+        predictions = await asyncio.wait_for(asyncio.gather(*tasks), timeout=10)
+        await batcher.stop()
+        return predictions
+
+    try:
+        predictions = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    assert predictions == [0.0, 3.0, 6.0]
+    assert batcher.stats()["rejected"] == 1
+    assert [len(batch) for batch in model.batches] == [1, 1, 1]
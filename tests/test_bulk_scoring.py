@@ -0,0 +1,256 @@
+import io
+import struct
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import backend.api
+from backend.bulk_scoring import (
+    ARROW_STREAM_TYPE,
+    COLUMNS_TYPE,
+    BulkPayloadError,
+    ColumnsCodec,
+)
+from tests.conftest import prediction_request
+
+
+def encode_strings(values, offsets=None) -> bytes:
+    encoded = [value.encode() if isinstance(value, str) else value for value in values]
+    if offsets is None:
+        offsets = np.concatenate([[0], np.cumsum([len(value) for value in encoded])])
+    return np.asarray(offsets, dtype="<i4").tobytes() + b"".join(encoded)
+
+
+def columns_payload(trip_ids=("a", "b"), trip_id_offsets=None) -> bytes:
+    n_rows = len(trip_ids)
+    return b"".join(
+        [
+            struct.pack("<I", n_rows),
+            encode_strings(trip_ids, trip_id_offsets),
+            encode_strings(["2024-01-05 10:00:00"] * n_rows),
+            np.full(n_rows, 2.5, dtype="<f8").tobytes(),
+            np.full(n_rows, 100, dtype="<i4").tobytes(),
+            np.full(n_rows, 200, dtype="<i4").tobytes(),
+            np.zeros(n_rows, dtype="<i4").tobytes(),
+            struct.pack("<I", 0),
+        ]
+    )
+
+
+def read_all(payload: bytes) -> list:
+    return list(ColumnsCodec(max_frame_rows=100).read_frames(io.BytesIO(payload)))
+
+
+BAD_PAYLOADS = {
+    "decreasing offsets": columns_payload(trip_id_offsets=[0, 1, 0]),
+    "offsets not from 0": columns_payload(trip_id_offsets=[1, 1, 2]),
+    "offsets past the body": columns_payload(trip_id_offsets=[0, 1, 1 << 20]),
+    "truncated body": columns_payload()[:-10],
+    "invalid utf-8": columns_payload(trip_ids=(b"\xff\xfe", "b")),
+}
+
+
+def test_columns_codec_reads_frames():
+    (frame,) = read_all(columns_payload())
+    assert frame["trip_id"].tolist() == ["a", "b"]
+    assert frame["PULocationID"].tolist() == [100, 100]
+
+
+@pytest.mark.parametrize("name", BAD_PAYLOADS)
+def test_columns_codec_rejects_malformed_payloads(name):
+    with pytest.raises(BulkPayloadError):
+        read_all(BAD_PAYLOADS[name])
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(backend.api.router)
+    # Malformed payloads fail before any row is scored
+    app.dependency_overrides[backend.api.get_serving_model] = lambda: SimpleNamespace(
+        version="test"
+    )
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("name", BAD_PAYLOADS)
+def test_predict_bulk_rejects_malformed_columns(client, name):
+    response = client.post(
+        "/predict_bulk",
+        content=BAD_PAYLOADS[name],
+        headers={"content-type": COLUMNS_TYPE},
+    )
+    assert response.status_code == 400
+
+
+def test_predict_bulk_rejects_unknown_arrow_column(client):
+    pa = pytest.importorskip("pyarrow")
+    batch = pa.record_batch(
+        {
+            "trip_id": ["a"],
+            "request_datetime": ["2024-01-05 10:00:00"],
+            "trip_distance": [2.5],
+            "pickup_location": [100],
+            "DOLocationID": [200],
+            "Airport": [0],
+        }
+    )
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+
+    response = client.post(
+        "/predict_bulk",
+        content=sink.getvalue(),
+        headers={"content-type": ARROW_STREAM_TYPE},
+    )
+    assert response.status_code == 400
+    assert "PULocationID" in response.json()["detail"]
+
+
+# Scored rows, an unknown zone scored as such and an unparsable datetime
+REQUESTS = [
+    prediction_request(str(i), trip_distance=0.5 + i, PULocationID=40 + 7 * i)
+    for i in range(8)
+] + [
+    prediction_request("unknown zone", DOLocationID=999),
+    prediction_request("bad date", request_datetime="yesterday"),
+]
+
+
+def request_frame(requests: list) -> dict:
+    return {name: [request[name] for request in requests] for name in REQUESTS[0]}
+
+
+def encode_columns_frame(frame: dict) -> bytes:
+    n_rows = len(frame["trip_id"])
+    return b"".join(
+        [
+            struct.pack("<I", n_rows),
+            encode_strings(frame["trip_id"]),
+            encode_strings(frame["request_datetime"]),
+            np.asarray(frame["trip_distance"], dtype="<f8").tobytes(),
+            np.asarray(frame["PULocationID"], dtype="<i4").tobytes(),
+            np.asarray(frame["DOLocationID"], dtype="<i4").tobytes(),
+            np.asarray(frame["Airport"], dtype="<i4").tobytes(),
+        ]
+    )
+
+
+def decode_strings(reader: io.BytesIO, n_rows: int) -> list:
+    offsets = np.frombuffer(reader.read(4 * (n_rows + 1)), dtype="<i4")
+    data = reader.read(int(offsets[-1]))
+    return [data[a:b].decode() for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+def decode_columns_response(content: bytes) -> list:
+    reader = io.BytesIO(content)
+    rows = []
+    while True:
+        (n_rows,) = struct.unpack("<I", reader.read(4))
+        if n_rows == 0:
+            assert reader.read() == b""
+            return rows
+        trip_ids = decode_strings(reader, n_rows)
+        predictions = np.frombuffer(reader.read(8 * n_rows), dtype="<f8")
+        errors = decode_strings(reader, n_rows)
+        rows += [
+            (trip_id, None if np.isnan(p) else float(p), error or None)
+            for trip_id, p, error in zip(trip_ids, predictions, errors)
+        ]
+
+
+def encode_arrow_frames(frames: list) -> bytes:
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    schema = pa.schema(
+        [
+            ("trip_id", pa.string()),
+            ("request_datetime", pa.string()),
+            ("trip_distance", pa.float64()),
+            ("PULocationID", pa.int32()),
+            ("DOLocationID", pa.int32()),
+            ("Airport", pa.int32()),
+        ]
+    )
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for frame in frames:
+            writer.write_batch(pa.record_batch(frame, schema=schema))
+    return sink.getvalue()
+
+
+def decode_arrow_response(content: bytes) -> list:
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(content).read_all()
+    return list(
+        zip(
+            table["trip_id"].to_pylist(),
+            table["prediction"].to_pylist(),
+            table["error"].to_pylist(),
+        )
+    )
+
+
+def expected_rows(client, requests: list) -> list:
+    response = client.post("/predict_batch", json={"data": requests}).json()
+    return [
+        (item["trip_id"], item["prediction"], item["error"])
+        for item in response["predictions"]
+    ]
+
+
+def split_frames(requests: list, sizes: list) -> list:
+    frames, start = [], 0
+    for size in sizes:
+        frames.append(request_frame(requests[start : start + size]))
+        start += size
+    return frames
+
+
+def post_bulk(client, content: bytes, content_type: str):
+    response = client.post(
+        "/predict_bulk", content=content, headers={"content-type": content_type}
+    )
+    assert response.status_code == 200
+    return response
+
+
+def test_predict_bulk_columns_matches_predict_batch(api_client):
+    # Chunks of 3 rows across frames of 6 and 4
+    client = api_client(BULK_CHUNK_ROWS=3)
+    expected = expected_rows(client, REQUESTS)
+    assert [row[2] is not None for row in expected] == [False] * 9 + [True]
+
+    frames = split_frames(REQUESTS, [6, 4])
+    content = b"".join(encode_columns_frame(frame) for frame in frames)
+    response = post_bulk(client, content + struct.pack("<I", 0), COLUMNS_TYPE)
+
+    assert response.headers["x-model-version"] == backend.api._serving_model.version
+    rows = decode_columns_response(response.content)
+    assert rows == expected
+
+
+def test_predict_bulk_columns_empty_payload(api_client):
+    client = api_client(BULK_CHUNK_ROWS=3)
+    response = post_bulk(client, struct.pack("<I", 0), COLUMNS_TYPE)
+    assert decode_columns_response(response.content) == []
+
+
+def test_predict_bulk_arrow_matches_predict_batch(api_client):
+    pytest.importorskip("pyarrow")
+    client = api_client(BULK_CHUNK_ROWS=3)
+    expected = expected_rows(client, REQUESTS)
+
+    # An empty record batch between two frames
+    frames = split_frames(REQUESTS, [6, 0, 4])
+    response = post_bulk(client, encode_arrow_frames(frames), ARROW_STREAM_TYPE)
+
+    rows = decode_arrow_response(response.content)
+    assert rows == expected
+
+    empty = post_bulk(client, encode_arrow_frames([]), ARROW_STREAM_TYPE)
+    assert decode_arrow_response(empty.content) == []
@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import pandas as pd
+import pytest
+from model_pipeline.data_collector import TRIP_COLUMNS
+from model_pipeline.partition_cache import PartitionCache
+from model_pipeline.storage import RAW_TRIPS_SCHEMA, read_table
+from tests.conftest import TRIPS_DB_DAYS
+from tests.trips_db import get_data_serial
+
+
+@pytest.fixture
+def table_reads(collector, monkeypatch):
+    # (table name, after_trip_id) of each day table read
+    reads = []
+    read_table = collector._read_table
+
+    def recording_read_table(table_name, after_trip_id=None):
+        reads.append((table_name, after_trip_id))
+        return read_table(table_name, after_trip_id)
+
+    monkeypatch.setattr(collector, "_read_table", recording_read_table)
+    return reads
+
+
+def day_tables(trips_db: str) -> list:
+    connection = sqlite3.connect(trips_db)
+    names = connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+    ).fetchall()
+    connection.close()
+    return [name for (name,) in names]
+
+
+def execute(trips_db: str, sql: str, *params) -> None:
+    connection = sqlite3.connect(trips_db)
+    connection.execute(sql, params)
+    connection.commit()
+    connection.close()
+
+
+def by_trip_id(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values("trip_id", kind="stable").reset_index(drop=True)
+
+
+def test_get_data_matches_select_all(collector, tmp_path):
+    data = collector.get_data(days=TRIPS_DB_DAYS)
+
+    assert data.columns.tolist() == list(TRIP_COLUMNS)
+    assert data.dtypes.astype(str).to_dict() == TRIP_COLUMNS
+    assert len(data) == (TRIPS_DB_DAYS + 1) * 300
+
+    expected = get_data_serial(collector, TRIPS_DB_DAYS)
+    for name in ("tpep_pickup_datetime", "tpep_dropoff_datetime"):
+        expected[name] = pd.to_datetime(expected[name])
+    pd.testing.assert_frame_equal(data, expected[data.columns], check_dtype=False)
+
+    # Stored with the raw trips schema
+    collector.store_data(data, folder=str(tmp_path))
+    stored = read_table(str(tmp_path / "data"), schema=RAW_TRIPS_SCHEMA)
+    assert stored.dtypes.astype(str).to_dict() == RAW_TRIPS_SCHEMA
+    pd.testing.assert_frame_equal(stored, data, check_dtype=False, atol=1e-2)
+
+
+def test_unchanged_tables_come_from_the_cache(collector, table_reads, tmp_path):
+    cache = PartitionCache(str(tmp_path / "cache"))
+    first = collector.get_data(days=TRIPS_DB_DAYS, cache=cache)
+    assert len(table_reads) == TRIPS_DB_DAYS + 1
+
+    table_reads.clear()
+    second = collector.get_data(days=TRIPS_DB_DAYS, cache=cache)
+    assert table_reads == []
+    pd.testing.assert_frame_equal(second, first)
+
+
+def test_appended_rows_are_fetched_alone(collector, table_reads, trips_db, tmp_path):
+    cache = PartitionCache(str(tmp_path / "cache"))
+    collector.get_data(days=TRIPS_DB_DAYS, cache=cache)
+    table_name = day_tables(trips_db)[-1]
+    max_trip_id = cache.get(table_name)["max_trip_id"]
+
+    execute(
+        trips_db,
+        f"INSERT INTO {table_name} SELECT * FROM {table_name} WHERE trip_id = ?",
+        max_trip_id,
+    )
+    execute(
+        trips_db,
+        f"UPDATE {table_name} SET trip_id = ?, total_amount = 99.5 "
+        f"WHERE rowid = (SELECT max(rowid) FROM {table_name})",
+        max_trip_id + 1000,
+    )
+
+    table_reads.clear()
+    data = collector.get_data(days=TRIPS_DB_DAYS, cache=cache)
+    assert table_reads == [(table_name, max_trip_id)]
+    assert data.loc[data["trip_id"] == max_trip_id + 1000, "total_amount"].tolist() == [
+        99.5
+    ]
+    pd.testing.assert_frame_equal(
+        by_trip_id(data), by_trip_id(collector.get_data(days=TRIPS_DB_DAYS))
+    )
+
+
+def test_rows_updated_in_place_refetch_the_table(
+    collector, table_reads, trips_db, tmp_path
+):
+    cache = PartitionCache(str(tmp_path / "cache"))
+    collector.get_data(days=TRIPS_DB_DAYS, cache=cache)
+    table_name = day_tables(trips_db)[0]
+    trip_id = cache.get(table_name)["max_trip_id"] - 10
+
+    execute(
+        trips_db,
+        f"UPDATE {table_name} SET total_amount = total_amount + 5 WHERE trip_id = ?",
+        trip_id,
+    )
+
+    table_reads.clear()
+    data = collector.get_data(days=TRIPS_DB_DAYS, cache=cache)
+    assert table_reads == [(table_name, None)]
+    pd.testing.assert_frame_equal(data, collector.get_data(days=TRIPS_DB_DAYS))
+
+
+def test_expired_tables_are_evicted(collector, tmp_path):
+    cache = PartitionCache(str(tmp_path / "cache"))
+    collector.get_data(days=TRIPS_DB_DAYS, cache=cache)
+    expired = sorted(cache.manifest["tables"])[0]
+    expired_path = os.path.join(cache.folder, cache.get(expired)["file"])
+
+    collector.get_data(days=TRIPS_DB_DAYS - 1, cache=cache)
+    assert expired not in cache.manifest["tables"]
+    assert not os.path.exists(expired_path)
+    assert len(cache.manifest["tables"]) == TRIPS_DB_DAYS
+
+
+def test_corrupted_cache_falls_back_to_fetching(collector, table_reads, tmp_path):
+    folder = str(tmp_path / "cache")
+    cache = PartitionCache(folder)
+    expected = collector.get_data(days=TRIPS_DB_DAYS, cache=cache)
+
+    table_name = sorted(cache.manifest["tables"])[1]
+    with open(os.path.join(folder, cache.get(table_name)["file"]), "r+b") as f:
+        f.seek(100)
+        f.write(b"corrupted")
+    table_reads.clear()
+    data = collector.get_data(days=TRIPS_DB_DAYS, cache=cache)
+    assert table_reads == [(table_name, None)]
+    pd.testing.assert_frame_equal(data, expected)
+
+    with open(cache.manifest_path, "w") as f:
+        f.write("{not json")
+    table_reads.clear()
+    data = collector.get_data(days=TRIPS_DB_DAYS, cache=PartitionCache(folder))
+    assert len(table_reads) == TRIPS_DB_DAYS + 1
+    assert all(after_trip_id is None for _, after_trip_id in table_reads)
+    pd.testing.assert_frame_equal(data, expected)
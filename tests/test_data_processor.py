@@ -0,0 +1,183 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from model_pipeline.data_processor import DataProcessor
+from model_pipeline.storage import read_table
+
+DATA_FILEPATH = "data/data"
+ZONES_FILEPATH = "data/zones.csv"
+SPLITS = ["train", "val", "test"]
+
+
+def run_processor(output_folder: str, **options) -> dict:
+    processor = DataProcessor(DATA_FILEPATH, ZONES_FILEPATH, output_folder, **options)
+    processor.run()
+    with open(f"{output_folder}/feature_schema.json") as f:
+        feature_schema = json.load(f)
+    tables = {split: read_table(f"{output_folder}/{split}") for split in SPLITS}
+    return feature_schema, tables
+
+
+def sorted_rows(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(df.columns.tolist(), ignore_index=True)
+
+
+@pytest.fixture(scope="module")
+def in_memory_output(tmp_path_factory):
+    return run_processor(str(tmp_path_factory.mktemp("in-memory")))
+
+
+def test_parallel_run_matches_run(in_memory_output, tmp_path):
+    feature_schema, tables = in_memory_output
+    parallel_schema, parallel_tables = run_processor(str(tmp_path), workers=2)
+
+    assert parallel_schema == feature_schema
+    for split in SPLITS:
+        pd.testing.assert_frame_equal(parallel_tables[split], tables[split])
+
+
+def test_chunked_run_matches_run(in_memory_output, tmp_path):
+    feature_schema, tables = in_memory_output
+    processor = DataProcessor(
+        DATA_FILEPATH, ZONES_FILEPATH, str(tmp_path), chunk_rows=3000
+    )
+    boundaries = processor.split_boundaries()
+    chunked_schema, chunked_tables = run_processor(str(tmp_path), chunk_rows=3000)
+
+    assert chunked_schema == feature_schema
+    for split in SPLITS:
+        assert chunked_tables[split].dtypes.equals(tables[split].dtypes)
+
+    # The same rows overall
+    pd.testing.assert_frame_equal(
+        sorted_rows(pd.concat(chunked_tables.values(), ignore_index=True)),
+        sorted_rows(pd.concat(tables.values(), ignore_index=True)),
+    )
+
+    # And in each split, but for the rows picked up in a boundary minute,
+    # which can land in a neighbouring split
+    minute = ["pickup_dayofmonth", "pickup_hour", "pickup_minute"]
+    boundary_minutes = pd.MultiIndex.from_tuples(
+        [(b.day, b.hour, b.minute) for b in boundaries], names=minute
+    )
+    for split in SPLITS:
+        expected, actual = tables[split], chunked_tables[split]
+        in_boundary = pd.MultiIndex.from_frame(expected[minute].astype(int)).isin(
+            boundary_minutes
+        )
+        chunked_in_boundary = pd.MultiIndex.from_frame(actual[minute].astype(int)).isin(
+            boundary_minutes
+        )
+        pd.testing.assert_frame_equal(
+            sorted_rows(actual[~chunked_in_boundary]),
+            sorted_rows(expected[~in_boundary]),
+        )
+
+
+def extract_features_before(df: pd.DataFrame) -> pd.DataFrame:
+    # DataProcessor.extract_features before it was vectorized
+    df["tpep_pickup_datetime"] = pd.to_datetime(df["tpep_pickup_datetime"])
+    df["tpep_dropoff_datetime"] = pd.to_datetime(df["tpep_dropoff_datetime"])
+
+    df = df.sort_values("tpep_pickup_datetime").reset_index(drop=True)
+
+    df["pickup_hour"] = df["tpep_pickup_datetime"].dt.hour
+    df["pickup_minute"] = df["tpep_pickup_datetime"].dt.minute
+    df["pickup_dayofweek"] = df["tpep_pickup_datetime"].dt.dayofweek
+    df["pickup_dayofmonth"] = df["tpep_pickup_datetime"].dt.day
+
+    df["trip_time"] = (df["tpep_dropoff_datetime"] - df["tpep_pickup_datetime"]).apply(
+        lambda x: x.total_seconds() / 60
+    )
+
+    df = df[
+        (df["trip_distance"] > 0)
+        & (df["passenger_count"] > 0)
+        & (df["fare_amount"] > 0)
+        & (df["total_amount"] > 0)
+        & (df["trip_time"] > 0)
+        & (df["trip_time"] < 300)
+    ]
+
+    df["is_from_airport"] = df["Airport_fee"].apply(lambda x: 1 if x > 0 else 0)
+
+    df = df.drop(
+        columns=[
+            "tpep_pickup_datetime",
+            "tpep_dropoff_datetime",
+            "passenger_count",
+            "fare_amount",
+            "total_amount",
+            "Airport_fee",
+        ]
+    )
+    return df.drop(columns=["trip_id"])
+
+
+def trips_with_ties(n_rows: int = 400) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    # 12 distinct pickup times, so most trips share theirs with others
+    pickup = pd.Timestamp("2024-08-05 08:00") + pd.to_timedelta(
+        rng.integers(0, 12, n_rows) * 600, unit="s"
+    )
+    df = pd.DataFrame(
+        {
+            "tpep_pickup_datetime": pickup,
+            "tpep_dropoff_datetime": pickup
+            + pd.to_timedelta(rng.integers(1, 90, n_rows), unit="min"),
+            "passenger_count": rng.integers(1, 4, n_rows).astype(float),
+            "trip_distance": rng.integers(1, 3000, n_rows) / 100,
+            "PULocationID": rng.integers(1, 266, n_rows),
+            "DOLocationID": rng.integers(1, 266, n_rows),
+            "fare_amount": rng.integers(300, 9000, n_rows) / 100,
+            "total_amount": rng.integers(300, 12000, n_rows) / 100,
+            "Airport_fee": rng.choice([0.0, 1.75, np.nan], n_rows, p=[0.6, 0.3, 0.1]),
+            "trip_id": np.arange(n_rows),
+        }
+    )
+
+    # Invalid trips, each failing one check
+    invalid = rng.choice(n_rows, 60, replace=False).reshape(6, 10)
+    df.loc[invalid[0], "trip_distance"] = 0
+    df.loc[invalid[1], "passenger_count"] = np.nan
+    df.loc[invalid[2], "fare_amount"] = -5
+    df.loc[invalid[3], "total_amount"] = 0
+    df.loc[invalid[4], "tpep_dropoff_datetime"] = df.loc[
+        invalid[4], "tpep_pickup_datetime"
+    ] - pd.Timedelta(minutes=3)
+    df.loc[invalid[5], "tpep_dropoff_datetime"] = df.loc[
+        invalid[5], "tpep_pickup_datetime"
+    ] + pd.Timedelta(hours=6)
+    return df
+
+
+def test_extract_features_matches_apply_implementation():
+    df = trips_with_ties()
+    expected = extract_features_before(df.copy())
+    processor = DataProcessor("", "", "")
+    features = processor.extract_features(df, keep_trip_id=True)
+
+    assert len(features) == len(df) - 60
+    assert features["is_from_airport"].sum() > 0
+    assert features.columns.drop("trip_id").tolist() == expected.columns.tolist()
+    # In pickup order, the index their position after the sort
+    assert features.index.is_monotonic_increasing
+    assert features.index.is_unique
+    pickup_columns = ["pickup_dayofmonth", "pickup_hour", "pickup_minute"]
+    pd.testing.assert_frame_equal(
+        features[pickup_columns].reset_index(drop=True),
+        expected[pickup_columns].reset_index(drop=True),
+        check_dtype=False,
+    )
+
+    # The old sort left ties in any order, the same rows come out
+    pd.testing.assert_frame_equal(
+        sorted_rows(features.drop(columns="trip_id")),
+        sorted_rows(expected),
+        check_dtype=False,
+    )
+    # The stable sort keeps them in input order
+    ties = features.groupby(pickup_columns, sort=False)["trip_id"]
+    assert ties.apply(lambda trip_ids: trip_ids.is_monotonic_increasing).all()
+    assert (ties.size() > 1).all()
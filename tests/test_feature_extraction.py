@@ -1,13 +1,22 @@
 import os
+import numpy as np
 import pandas as pd
 import pytest
 from backend.api_models import PredictionRequest
+from backend.datetime_parser import (
+    REQUEST_DATETIME_FORMAT,
+    parse_request_datetime,
+    parse_request_datetimes,
+)
 from backend.feature_extractor import FeatureExtractor
+from backend.feature_schema import FeatureSchema
+from model_pipeline.categorical_encoder import CategoricalEncoder
 from model_pipeline.data_processor import DataProcessor
+from model_pipeline.storage import read_table, read_table_columns
 
-DATA_FILENAME = "data.csv"
+DATA_FILENAME = "data"
 ZONES_FILENAME = "zones.csv"
-TEST_FILENAME = "test.csv"
+TEST_FILENAME = "test"
 OUTPUT_FOLDER = "data"
 DATA_FILEPATH = os.path.join(OUTPUT_FOLDER, DATA_FILENAME)
 ZONES_FILEPATH = os.path.join(OUTPUT_FOLDER, ZONES_FILENAME)
@@ -17,7 +26,10 @@ processor = DataProcessor(DATA_FILENAME, ZONES_FILENAME, OUTPUT_FOLDER)
 
 
 def load_first_200_lines(data_filename: str) -> pd.DataFrame:
-    return pd.read_csv(data_filename, nrows=200)
+    df = read_table(data_filename).head(200)
+    # Requests carry the pickup time as a string, whatever the storage format
+    df["tpep_pickup_datetime"] = df["tpep_pickup_datetime"].astype(str)
+    return df
 
 
 def create_prediction_requests(df: pd.DataFrame) -> list:
@@ -37,11 +49,26 @@ def create_prediction_requests(df: pd.DataFrame) -> list:
     return requests
 
 
+def create_expected_features(df_raw: pd.DataFrame) -> pd.DataFrame:
+    # Load the expected test dataframe created by DataProcessor
+    df_zone = pd.read_csv(ZONES_FILEPATH)
+    df_expected = processor.extract_features(df_raw.copy(), remove_invalid=False)
+    df_expected = processor.merge_location_data(df_expected, df_zone)
+    df_expected = processor.encode_categorical(
+        df_expected, CategoricalEncoder.from_zones(df_zone)
+    )
+    df_expected = df_expected.astype(float)
+
+    # Remove target trip_time
+    return df_expected.drop(columns=["trip_time"])
+
+
 @pytest.fixture(scope="module")
 def setup_data():
     df_raw = load_first_200_lines(DATA_FILEPATH)
 
-    feature_extractor = FeatureExtractor(ZONES_FILENAME, OUTPUT_FOLDER, TEST_FILENAME)
+    feature_schema = FeatureSchema(read_table_columns(TEST_FILEPATH))
+    feature_extractor = FeatureExtractor(ZONES_FILENAME, OUTPUT_FOLDER, feature_schema)
 
     return df_raw, feature_extractor
 
@@ -70,15 +97,7 @@ def test_feature_extraction(setup_data):
     # Combine all feature dataframes into one
     df_features = pd.concat(feature_dfs, ignore_index=True)
 
-    # Load the expected test dataframe created by DataProcessor
-    df_zone = pd.read_csv(ZONES_FILEPATH)
-    df_expected = processor.extract_features(df_raw, remove_invalid=False)
-    df_expected = processor.merge_location_data(df_expected, df_zone)
-    df_expected = processor.encode_categorical(df_expected)
-    df_expected = df_expected.astype(float)
-
-    # Remove target trip_time
-    df_expected = df_expected.drop(columns=["trip_time"])
+    df_expected = create_expected_features(df_raw)
 
     # Ensure the column orders are the same
     df_features = df_features[df_expected.columns]
@@ -94,5 +113,154 @@ def test_feature_extraction(setup_data):
     )
 
 
+def test_feature_vector_matches_dataframe_path(setup_data):
+    df_raw, feature_extractor = setup_data
+
+    prediction_requests = create_prediction_requests(df_raw)
+    vectors = np.stack(
+        [feature_extractor.extract_feature_vector(r) for r in prediction_requests]
+    )
+    assert vectors.dtype == np.float32
+
+    df_features = pd.concat(
+        [feature_extractor.extract_features(r) for r in prediction_requests],
+        ignore_index=True,
+    )
+    np.testing.assert_array_equal(
+        vectors.view(np.uint32),
+        df_features.to_numpy(dtype=np.float32).view(np.uint32),
+    )
+
+    # DataProcessor sorts by pickup time, so compare both in a canonical order
+    df_expected = create_expected_features(df_raw).astype(np.float32)
+    df_vectors = pd.DataFrame(vectors, columns=feature_extractor.feature_columns)
+    df_vectors = df_vectors[df_expected.columns]
+
+    columns = df_expected.columns.tolist()
+    df_vectors = df_vectors.sort_values(by=columns, ignore_index=True)
+    df_expected = df_expected.sort_values(by=columns, ignore_index=True)
+
+    np.testing.assert_array_equal(
+        df_vectors.to_numpy().view(np.uint32),
+        df_expected.to_numpy().view(np.uint32),
+    )
+
+    # Preallocated buffers are reset between requests
+    buffer = np.empty(len(feature_extractor.feature_columns), dtype=np.float32)
+    for request, expected in zip(prediction_requests, vectors):
+        out = feature_extractor.extract_feature_vector(request, out=buffer)
+        assert out is buffer
+        np.testing.assert_array_equal(out, expected)
+
+
+def test_feature_matrix_matches_feature_vectors(setup_data):
+    df_raw, feature_extractor = setup_data
+
+    prediction_requests = create_prediction_requests(df_raw)
+    prediction_requests[3] = prediction_requests[3].model_copy(
+        update={"request_datetime": "not a datetime"}
+    )
+    prediction_requests[5] = prediction_requests[5].model_copy(
+        update={"PULocationID": 9999, "trip_distance": -1.5}
+    )
+
+    features, errors = feature_extractor.extract_feature_matrix(prediction_requests)
+    assert features.dtype == np.float32
+    assert features.shape == (
+        len(prediction_requests),
+        len(feature_extractor.feature_columns),
+    )
+    assert [i for i, error in enumerate(errors) if error is not None] == [3]
+    assert not features[3].any()
+
+    for i, request in enumerate(prediction_requests):
+        if errors[i] is None:
+            np.testing.assert_array_equal(
+                features[i], feature_extractor.extract_feature_vector(request)
+            )
+
+
+def test_categorical_encoder_columns_do_not_depend_on_rows(setup_data):
+    df_raw, _ = setup_data
+    df_zone = pd.read_csv(ZONES_FILEPATH)
+    encoder = CategoricalEncoder.from_zones(df_zone)
+
+    df = processor.extract_features(df_raw.copy(), remove_invalid=False)
+    df = processor.merge_location_data(df, df_zone)
+    for rows in (df, df.head(3), df.head(0)):
+        encoded = encoder.transform(rows)
+        assert encoded.columns[-len(encoder) :].tolist() == encoder.columns
+
+        dense = encoder.transform_dense(rows)
+        assert dense.dtype == np.uint8
+        np.testing.assert_array_equal(encoder.transform_sparse(rows).toarray(), dense)
+
+    expected = pd.get_dummies(
+        df.astype(
+            {
+                column: pd.CategoricalDtype(encoder.categories[column])
+                for column in encoder.categories
+            }
+        ),
+        columns=list(encoder.categories),
+        drop_first=True,
+    )
+    np.testing.assert_array_equal(
+        encoder.transform(df).to_numpy(float), expected.to_numpy(float)
+    )
+
+
+def test_merge_location_data_reports_unknown_ids(setup_data, caplog):
+    df_raw, _ = setup_data
+    df_zone = pd.read_csv(ZONES_FILEPATH)
+
+    df = processor.extract_features(df_raw.copy(), remove_invalid=False)
+    df.loc[df.index[:3], "PULocationID"] = 9999
+    merged = processor.merge_location_data(df, df_zone)
+
+    assert len(merged) == len(df)
+    assert merged["pickup_borough"].isna().sum() == 3
+    assert merged["pickup_service_zone"][:3].isna().all()
+    assert "3 pickup location ID not found" in caplog.text
+
+    zones = df_zone.set_index("LocationID")
+    expected = zones["Borough"].reindex(df["DOLocationID"]).to_numpy()
+    assert (
+        merged["dropoff_borough"]
+        .astype(object)
+        .equals(pd.Series(expected, dtype=object))
+    )
+
+
+def test_request_datetime_parser_matches_pandas():
+    values = [
+        "2024-08-03T10/11/12+0000",
+        "2024-02-29T23/59/59-0530",
+        "2024-08-03 10:11:12",
+        "2024-08-03T10:11:12+02:00",
+        "2023-12-31 00:00:00Z",
+        "2024-08-03 10:11:12.500",
+    ]
+    for value in values:
+        try:
+            expected = pd.to_datetime(value, format=REQUEST_DATETIME_FORMAT)
+        except ValueError:
+            expected = pd.to_datetime(value)
+        expected_fields = (
+            expected.hour,
+            expected.minute,
+            expected.dayofweek,
+            expected.day,
+        )
+        assert parse_request_datetime(value) == expected_fields
+
+    fields, errors = parse_request_datetimes(values + ["2023-02-29T10/11/12+0000"])
+    assert errors[:-1] == [None] * len(values)
+    assert errors[-1] is not None
+    np.testing.assert_array_equal(
+        fields[:-1], [parse_request_datetime(value) for value in values]
+    )
+
+
 if __name__ == "__main__":
     pytest.main(["-s"])
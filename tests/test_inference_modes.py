@@ -0,0 +1,42 @@
+import os
+import pytest
+import backend.api
+from tests.conftest import prediction_request
+
+REQUESTS = [
+    prediction_request(str(i), trip_distance=1.5 * i, PULocationID=30 + 11 * i)
+    for i in range(6)
+] + [prediction_request("bad date", request_datetime="yesterday")]
+
+
+def worker_state() -> tuple:
+    return os.getpid(), list(backend.api._serving_models)
+
+
+def predict_all(client) -> tuple:
+    single = [client.post("/predict", json=request).json() for request in REQUESTS[:-1]]
+    batch = client.post("/predict_batch", json={"data": REQUESTS}).json()
+    return single, batch
+
+
+@pytest.fixture
+def inline_results(api_client):
+    return predict_all(api_client(INFERENCE_MODE="inline"))
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_inference_modes_match_inline(api_client, inline_results, mode):
+    client = api_client(INFERENCE_MODE=mode, INFERENCE_WORKERS=1)
+    single, batch = predict_all(client)
+
+    assert single == inline_results[0]
+    assert batch == inline_results[1]
+    assert batch["predictions"][-1]["error"] is not None
+
+    executor = backend.api.get_inference_executor()
+    assert executor.mode == mode
+    if mode == "process":
+        # The worker loaded its own copy of the version it was asked for
+        pid, versions = executor._executor.submit(worker_state).result()
+        assert pid != os.getpid()
+        assert versions == [single[0]["model_version"]]
@@ -0,0 +1,39 @@
+import asyncio
+import backend.metrics
+from backend.inference import InferenceExecutor
+from backend.metrics import ServingMetrics, stage_timer
+
+
+def test_serving_metrics_renders_gauges():
+    metrics = ServingMetrics()
+    metrics.set_gauge("nytaxi_time_to_first_prediction_seconds", 1.5)
+    metrics.set_gauge("nytaxi_startup_seconds", 0.25, 'phase="load"')
+    metrics.set_gauge("nytaxi_startup_seconds", 0.5, 'phase="import"')
+
+    lines = metrics.render("v1").splitlines()
+    start = lines.index("# TYPE nytaxi_startup_seconds gauge")
+    assert lines[start + 1 : start + 3] == [
+        'nytaxi_startup_seconds{phase="import"} 0.5',
+        'nytaxi_startup_seconds{phase="load"} 0.25',
+    ]
+    assert "nytaxi_time_to_first_prediction_seconds 1.5" in lines
+
+
+def timed_sum(values):
+    timer = stage_timer()
+    total = sum(values)
+    timer.lap("sum")
+    return total
+
+
+def test_process_inference_records_worker_stages(monkeypatch):
+    metrics = ServingMetrics()
+    monkeypatch.setattr(backend.metrics, "_serving_metrics", metrics)
+    executor = InferenceExecutor(mode="process", max_workers=1)
+    try:
+        results = [asyncio.run(executor.run(timed_sum, [1, 2, i])) for i in range(2)]
+    finally:
+        executor.shutdown()
+
+    assert results == [3, 4]
+    assert metrics.stages["sum"].count == 2
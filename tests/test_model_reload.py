@@ -0,0 +1,87 @@
+import time
+import pytest
+import backend.api
+from backend.serving_model import ModelVersionUnavailable, model_file_version
+from tests.conftest import prediction_request, write_model
+
+ADMIN_TOKEN = "secret"
+
+
+def reload(client, token=ADMIN_TOKEN, force=False):
+    return client.post(
+        "/admin/reload_model",
+        params={"force": force},
+        headers={"x-admin-token": token} if token else {},
+    )
+
+
+def test_reload_swaps_model_and_tags_versions(api_client, model_path, prediction_log):
+    client = api_client(ADMIN_TOKEN=ADMIN_TOKEN, MODEL_RELOAD_GRACE_SECONDS=0.2)
+    old_version = model_file_version(model_path)
+
+    before = client.post("/predict", json=prediction_request("before")).json()
+    assert before["model_version"] == old_version
+
+    assert reload(client, token=None).status_code == 403
+    assert reload(client, token="wrong").status_code == 403
+    unchanged = reload(client)
+    assert unchanged.status_code == 200
+    assert unchanged.json()["reloaded"] is False
+
+    write_model(model_path, base_score_shift=10.0)
+    new_version = model_file_version(model_path)
+    response = reload(client)
+    assert response.status_code == 200
+    assert response.json() == {
+        "previous_version": old_version,
+        "model_version": new_version,
+        "reloaded": True,
+    }
+
+    after = client.post("/predict", json=prediction_request("after")).json()
+    assert after["model_version"] == new_version
+    assert after["prediction"] == pytest.approx(before["prediction"] + 10, abs=1e-3)
+    batch = client.post(
+        "/predict_batch", json={"data": [prediction_request("batch")]}
+    ).json()
+    assert batch["model_version"] == new_version
+    assert batch["predictions"][0]["prediction"] == pytest.approx(after["prediction"])
+
+    # Requests that picked the old model before the swap finish on it
+    assert set(backend.api._serving_models) == {old_version, new_version}
+    deadline = time.monotonic() + 10
+    while old_version in backend.api._serving_models and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert set(backend.api._serving_models) == {new_version}
+
+    rows = prediction_log()
+    assert [(row["trip_id"], row["model_version"]) for row in rows] == [
+        ("before", old_version),
+        ("after", new_version),
+        ("batch", new_version),
+    ]
+
+
+def test_missing_version_is_never_served_by_another(
+    api_client, model_path, monkeypatch
+):
+    api_client()
+    loads = []
+    load_serving_model = backend.api.load_serving_model
+
+    def counting_load():
+        loads.append(1)
+        return load_serving_model()
+
+    monkeypatch.setattr(backend.api, "load_serving_model", counting_load)
+
+    # As in a pool worker: the version on disk is loaded once and kept
+    version = model_file_version(model_path)
+    for _ in range(3):
+        assert backend.api.get_serving_model_version(version).version == version
+    assert len(loads) == 1
+
+    for _ in range(2):
+        with pytest.raises(ModelVersionUnavailable):
+            backend.api.get_serving_model_version("oldversion")
+    assert "oldversion" not in backend.api._serving_models
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from types import SimpleNamespace
+import backend.api
+import backend.prediction_cache
+from backend.feature_schema import FeatureSchema
+from backend.prediction_cache import PredictionCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(
+        backend.prediction_cache, "time", SimpleNamespace(monotonic=lambda: now[0])
+    )
+    return now
+
+
+def features(*values) -> np.ndarray:
+    return np.array(values, dtype=np.float32)
+
+
+def test_prediction_cache_evicts_least_recently_used(clock):
+    cache = PredictionCache(max_size=2)
+    cache.put(features(1, 0), 1.0)
+    cache.put(features(2, 0), 2.0)
+    assert cache.get(features(1, 0)) == 1.0
+
+    cache.put(features(3, 0), 3.0)
+    assert cache.get(features(2, 0)) is None
+    assert cache.get(features(1, 0)) == 1.0
+    assert cache.get(features(3, 0)) == 3.0
+    assert cache.stats()["evictions"] == 1
+
+
+def test_prediction_cache_expires_entries(clock):
+    cache = PredictionCache(ttl_seconds=10)
+    cache.put(features(1, 0), 1.0)
+
+    clock[0] += 9.9
+    assert cache.get(features(1, 0)) == 1.0
+    clock[0] += 0.1
+    assert cache.get(features(1, 0)) is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_prediction_cache_rounds_distance_in_key(clock):
+    cache = PredictionCache(distance_index=1, distance_decimals=1)
+    cache.put(features(5, 2.04), 1.0)
+
+    assert cache.get(features(5, 2.01)) == 1.0
+    assert cache.get(features(5, 2.06)) is None
+    # Only the distance is rounded
+    assert cache.get(features(5.01, 2.04)) is None
+
+    exact = PredictionCache(distance_index=1)
+    exact.put(features(5, 2.04), 1.0)
+    assert exact.get(features(5, 2.01)) is None
+
+
+def test_prediction_cache_misses_after_model_swap(monkeypatch):
+    monkeypatch.setattr(backend.api, "PREDICTION_CACHE", True)
+    monkeypatch.setattr(backend.api, "MICRO_BATCHING", False)
+    feature_schema = FeatureSchema(["pickup_hour", "trip_distance"])
+
+    models = []
+    for version in ("v1", "v2"):
+        serving_model = SimpleNamespace(
+            version=version,
+            feature_schema=feature_schema,
+            micro_batcher=None,
+            prediction_cache=None,
+        )
+        backend.api._attach_serving_components(serving_model)
+        models.append(serving_model)
+
+    old, new = models
+    old.prediction_cache.put(features(12, 3.5), 10.0)
+    assert old.prediction_cache.get(features(12, 3.5)) == 10.0
+    assert new.prediction_cache.get(features(12, 3.5)) is None
@@ -0,0 +1,125 @@
+import io
+import time
+import logging
+import threading
+import numpy as np
+import pytest
+from backend.utils import PredictionLogWriter
+from monitoring.log_reader import LogReader
+
+FEATURE_NAMES = ["trip_distance", "pickup_hour", "pickup_borough_Manhattan"]
+
+
+class GatedStream(io.StringIO):
+    # Holds the writer thread in its first write until the gate opens
+    def __init__(self) -> None:
+        super().__init__()
+        self.writing = threading.Event()
+        self.gate = threading.Event()
+
+    def write(self, text: str) -> int:
+        self.writing.set()
+        self.gate.wait(timeout=10)
+        return super().write(text)
+
+
+@pytest.fixture
+def log_stream():
+    # The logger and format the API logs predictions with
+    logger = logging.getLogger("backend.utils")
+    level, propagate = logger.level, logger.propagate
+    stream = GatedStream()
+    stream.gate.set()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    yield stream
+    logger.removeHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = propagate
+
+
+def test_prediction_log_lines_parse_with_log_reader(log_stream):
+    writer = PredictionLogWriter(logger_name="backend.utils")
+    single = np.array([2.51, 14, 1], dtype=np.float32)
+    batch = np.array([[0.7, 3, 0], [12.25, 23, 1]], dtype=np.float32)
+
+    writer.submit("prediction_result", single, FEATURE_NAMES, 11.5, "a", "v1")
+    writer.submit(
+        "prediction_results",
+        batch,
+        FEATURE_NAMES,
+        np.array([4.0, 30.5]),
+        ["b", "c"],
+        None,
+    )
+    writer.close()
+
+    lines = log_stream.getvalue().splitlines()
+    assert len(lines) == 2
+    rows = [row for line in lines for row in LogReader.parse_message(line)]
+
+    assert [row["trip_id"] for row in rows] == ["a", "b", "c"]
+    assert [row["prediction"] for row in rows] == [11.5, 4.0, 30.5]
+    assert rows[0]["model_version"] == "v1"
+    assert "model_version" not in rows[1]
+    for row, expected in zip(rows, [single, *batch]):
+        values = np.array([row[name] for name in FEATURE_NAMES], dtype=np.float32)
+        np.testing.assert_array_equal(values, expected)
+
+
+def fill_queue(writer: PredictionLogWriter, stream: GatedStream) -> None:
+    # One record held by the writer thread, then the queue filled
+    stream.gate.clear()
+    writer.submit("prediction_result", np.zeros(3), FEATURE_NAMES, 1.0, "held")
+    assert stream.writing.wait(timeout=10)
+    for i in range(writer._queue.maxsize):
+        assert writer.submit("prediction_result", np.zeros(3), FEATURE_NAMES, 1.0, i)
+
+
+def test_prediction_log_writer_drops_when_full(log_stream):
+    writer = PredictionLogWriter(
+        max_queue_size=2, overflow="drop", logger_name="backend.utils"
+    )
+    fill_queue(writer, log_stream)
+
+    for i in range(3):
+        assert not writer.submit("prediction_result", np.zeros(3), FEATURE_NAMES, 1, i)
+    log_stream.gate.set()
+    writer.close()
+
+    assert writer.stats()["submitted"] == 3
+    assert writer.stats()["dropped"] == 3
+    assert writer.stats()["blocked"] == 0
+    assert writer.stats()["written"] == 3
+    assert len(log_stream.getvalue().splitlines()) == 3
+
+
+def test_prediction_log_writer_blocks_when_full(log_stream):
+    writer = PredictionLogWriter(
+        max_queue_size=2, overflow="block", logger_name="backend.utils"
+    )
+    fill_queue(writer, log_stream)
+
+    submitter = threading.Thread(
+        target=writer.submit,
+        args=("prediction_result", np.zeros(3), FEATURE_NAMES, 1.0, "late"),
+    )
+    submitter.start()
+    deadline = time.monotonic() + 10
+    while writer.blocked == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.blocked == 1
+    assert submitter.is_alive()
+
+    log_stream.gate.set()
+    submitter.join(timeout=10)
+    writer.close()
+
+    assert writer.stats()["submitted"] == 4
+    assert writer.stats()["dropped"] == 0
+    assert writer.stats()["written"] == 4
+    assert len(log_stream.getvalue().splitlines()) == 4
@@ -0,0 +1,87 @@
+import argparse
+import numpy as np
+import pandas as pd
+from backend.api_models import PredictionRequest
+from backend.serving_model import ServingModel
+from scripts import score
+
+N_ROWS = 600
+
+
+def score_args(input_path: str, output_path: str, **options) -> argparse.Namespace:
+    args = {
+        "input": input_path,
+        "output": output_path,
+        "model": "models/xgb.json",
+        "schema": "data/feature_schema.json",
+        "data_folder": "data",
+        "zones_filename": "zones.csv",
+        "engine": "xgboost",
+        "chunk_rows": 128,
+        "workers": 2,
+        "progress_seconds": 60,
+        "check_rows": 0,
+        **options,
+    }
+    return argparse.Namespace(**args)
+
+
+def test_score_matches_per_row_api(tmp_path):
+    df = pd.read_csv("data/data.csv", nrows=N_ROWS)
+    df.loc[5, "PULocationID"] = np.nan
+    df.loc[130, ["DOLocationID", "trip_distance"]] = np.nan
+    # A whole chunk without a scorable row
+    df.loc[256:383, "trip_distance"] = np.nan
+    df.loc[7, "PULocationID"] = 999
+    df.loc[9, "tpep_pickup_datetime"] = "not a date"
+    input_path = str(tmp_path / "trips.csv")
+    df.to_csv(input_path, index=False)
+
+    output_path = str(tmp_path / "predictions.csv")
+    score.run(score_args(input_path, output_path))
+    output = pd.read_csv(output_path, keep_default_na=False)
+
+    assert output["trip_id"].tolist() == df["trip_id"].tolist()
+    assert output.loc[5, "error"] == "Missing PULocationID"
+    assert output.loc[130, "error"] == "Missing trip_distance, DOLocationID"
+    assert (output.loc[256:383, "error"] == "Missing trip_distance").all()
+
+    serving_model = ServingModel(model_path="models/xgb.json")
+    n_scored = 0
+    for i, row in enumerate(df.itertuples()):
+        if i in (5, 130) or 256 <= i <= 383:
+            assert output.loc[i, "prediction"] == ""
+            continue
+
+        request = PredictionRequest(
+            trip_id=str(row.trip_id),
+            request_datetime=str(row.tpep_pickup_datetime),
+            trip_distance=row.trip_distance,
+            PULocationID=row.PULocationID,
+            DOLocationID=row.DOLocationID,
+            Airport=int(row.Airport_fee > 0),
+        )
+        try:
+            features = serving_model.feature_extractor.extract_feature_vector(request)
+        except ValueError:
+            assert output.loc[i, "error"] != ""
+            continue
+
+        expected = serving_model.model_executor.predict(features)
+        assert output.loc[i, "error"] == ""
+        assert float(output.loc[i, "prediction"]) == expected
+        n_scored += 1
+    assert n_scored > N_ROWS - 140
+
+
+def test_score_check_rows_skips_missing_values(tmp_path):
+    df = pd.read_csv("data/data.csv", nrows=20)
+    df.loc[5, "PULocationID"] = np.nan
+    input_path = str(tmp_path / "trips.csv")
+    df.to_csv(input_path, index=False)
+
+    output_path = str(tmp_path / "predictions.csv")
+    score.run(score_args(input_path, output_path, workers=1, check_rows=20))
+    output = pd.read_csv(output_path, keep_default_na=False)
+    assert output.loc[5, "error"] == "Missing PULocationID"
+    assert (output.drop(index=5)["error"] == "").all()
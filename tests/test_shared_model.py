@@ -0,0 +1,37 @@
+import shutil
+import numpy as np
+from backend.serving_model import model_file_version
+from backend.shared_model import ensure_shared_model, load_shared_model
+
+
+def test_shared_model_rebuilt_when_zones_change(tmp_path):
+    model_path = "models/xgb.json"
+    zones_filepath = str(tmp_path / "zones.csv")
+    shutil.copy("data/zones.csv", zones_filepath)
+    version = model_file_version(model_path)
+
+    def ensure() -> str:
+        return ensure_shared_model(
+            str(tmp_path / "shared"),
+            version,
+            model_path,
+            zones_filepath=zones_filepath,
+            check_parity=False,
+        )
+
+    path = ensure()
+    assert ensure() == path
+    _, zone_tables = load_shared_model(path)
+    assert zone_tables["location_valid"][1]
+
+    # Location 1 dropped from the zones table
+    with open(zones_filepath) as f:
+        lines = f.readlines()
+    with open(zones_filepath, "w") as f:
+        f.writelines(line for line in lines if not line.startswith("1,"))
+
+    changed_path = ensure()
+    assert changed_path != path
+    _, zone_tables = load_shared_model(changed_path)
+    assert not zone_tables["location_valid"][1]
+    assert np.count_nonzero(zone_tables["location_valid"]) == len(lines) - 2
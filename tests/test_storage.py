@@ -0,0 +1,131 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import model_pipeline.storage
+from model_pipeline.storage import (
+    RAW_TRIPS_SCHEMA,
+    find_table,
+    iter_table,
+    processed_schema,
+    read_table,
+    read_table_columns,
+    resolve_format,
+    table_path,
+    write_table,
+)
+
+FORMATS = ["parquet", "csv"]
+
+
+def raw_trips(n_rows: int = 50) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    pickup = pd.Timestamp("2024-08-01") + pd.to_timedelta(
+        rng.integers(0, 86400, n_rows), unit="s"
+    )
+    return pd.DataFrame(
+        {
+            "tpep_pickup_datetime": pickup,
+            "tpep_dropoff_datetime": pickup + pd.Timedelta(minutes=12),
+            "passenger_count": rng.integers(0, 5, n_rows).astype(float),
+            "trip_distance": rng.integers(0, 3000, n_rows) / 100,
+            "PULocationID": rng.integers(1, 266, n_rows),
+            "DOLocationID": rng.integers(1, 266, n_rows),
+            "fare_amount": rng.integers(300, 9000, n_rows) / 100,
+            "total_amount": rng.integers(300, 12000, n_rows) / 100,
+            "Airport_fee": rng.choice([0.0, 1.75], n_rows),
+            "trip_id": np.arange(n_rows) + 10**12,
+        }
+    )
+
+
+def processed_features(n_rows: int = 50) -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    return pd.DataFrame(
+        {
+            "trip_distance": rng.uniform(0, 30, n_rows),
+            "pickup_hour": rng.integers(0, 24, n_rows),
+            "pickup_borough_Manhattan": rng.integers(0, 2, n_rows),
+            "trip_time": rng.uniform(1, 90, n_rows),
+        }
+    )
+
+
+@pytest.mark.parametrize("storage_format", FORMATS)
+def test_raw_trips_round_trip(tmp_path, storage_format):
+    df = raw_trips()
+    path = table_path(str(tmp_path), "data", storage_format)
+    write_table(df, path, RAW_TRIPS_SCHEMA)
+
+    result = read_table(path, schema=RAW_TRIPS_SCHEMA)
+    assert result.dtypes.astype(str).to_dict() == RAW_TRIPS_SCHEMA
+    pd.testing.assert_frame_equal(result, df.astype(RAW_TRIPS_SCHEMA))
+    # Cents and miles survive float32
+    np.testing.assert_allclose(result["total_amount"], df["total_amount"], atol=1e-4)
+
+
+@pytest.mark.parametrize("storage_format", FORMATS)
+def test_processed_round_trip(tmp_path, storage_format):
+    df = processed_features()
+    schema = processed_schema(df.columns.tolist())
+    assert schema["trip_time"] == "float64"
+    assert schema["pickup_hour"] == "float32"
+
+    path = table_path(str(tmp_path), "train", storage_format)
+    write_table(df, path, schema)
+    result = read_table(path, schema=schema)
+    assert result.dtypes.astype(str).to_dict() == schema
+    pd.testing.assert_frame_equal(result, df.astype(schema))
+
+
+@pytest.mark.parametrize("storage_format", FORMATS)
+def test_find_table_and_stale_copies(tmp_path, storage_format):
+    other_format = FORMATS[1 - FORMATS.index(storage_format)]
+    root = str(tmp_path / "data")
+    write_table(raw_trips(), table_path(str(tmp_path), "data", other_format))
+    write_table(raw_trips(), table_path(str(tmp_path), "data", storage_format))
+
+    # The copy in the other format was removed
+    path = root + (".parquet" if storage_format == "parquet" else ".csv")
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    assert find_table(root) == path
+    assert find_table(path) == path
+    assert (
+        find_table(root + (".csv" if storage_format == "parquet" else ".parquet"))
+        == path
+    )
+    with pytest.raises(FileNotFoundError):
+        find_table(str(tmp_path / "missing"))
+
+
+@pytest.mark.parametrize("storage_format", FORMATS)
+def test_iter_table_and_columns(tmp_path, storage_format):
+    df = raw_trips(n_rows=25)
+    path = table_path(str(tmp_path), "data", storage_format)
+    write_table(df, path, RAW_TRIPS_SCHEMA)
+
+    assert read_table_columns(str(tmp_path / "data")) == df.columns.tolist()
+
+    columns = ["trip_id", "tpep_pickup_datetime", "PULocationID"]
+    chunks = list(iter_table(path, 10, columns=columns, schema=RAW_TRIPS_SCHEMA))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    result = pd.concat(chunks, ignore_index=True)
+    assert sorted(result.columns) == sorted(columns)
+    pd.testing.assert_frame_equal(result[columns], df.astype(RAW_TRIPS_SCHEMA)[columns])
+
+    selected = read_table(path, columns=columns, schema=RAW_TRIPS_SCHEMA)
+    assert sorted(selected.columns) == sorted(columns)
+
+
+def test_csv_fallback_without_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_pipeline.storage, "_has_pyarrow", lambda: False)
+    assert resolve_format("parquet") == "csv"
+
+    path = table_path(str(tmp_path), "data", "parquet")
+    assert path.endswith(".csv")
+    write_table(raw_trips(), path, RAW_TRIPS_SCHEMA)
+    result = read_table(str(tmp_path / "data"), schema=RAW_TRIPS_SCHEMA)
+    assert result.dtypes.astype(str).to_dict() == RAW_TRIPS_SCHEMA
+
+    with pytest.raises(ValueError):
+        resolve_format("feather")
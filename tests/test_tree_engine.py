@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+from backend.tree_engine import TreeEnsemble
+
+
+@pytest.fixture(scope="module")
+def booster():
+    rng = np.random.default_rng(1)
+    X = pd.DataFrame(
+        rng.uniform(0, 60, size=(2000, 8)), columns=[f"f{i}" for i in range(8)]
+    )
+    X[X < 3] = np.nan
+    y = X["f0"].fillna(10) * 0.5 + X["f3"].fillna(-5) ** 2 / 60 + rng.normal(size=2000)
+
+    params = {"max_depth": 6, "learning_rate": 0.3, "objective": "reg:squarederror"}
+    return xgb.train(params, xgb.DMatrix(X, label=y), num_boost_round=30)
+
+
+def test_tree_engine_matches_booster(booster):
+    tree_ensemble = TreeEnsemble.from_booster(booster)
+    assert tree_ensemble.feature_names == booster.feature_names
+
+    rng = np.random.default_rng(2)
+    for n_rows in (0, 1, 32, 1024):
+        features = rng.uniform(0, 60, size=(n_rows, 8)).astype(np.float32)
+        features[features < 5] = np.nan
+
+        expected = booster.inplace_predict(features)
+        actual = tree_ensemble.predict(features)
+
+        assert actual.dtype == np.float32
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_tree_engine_loads_saved_model(booster, tmp_path):
+    model_path = str(tmp_path / "xgb.json")
+    booster.save_model(model_path)
+
+    tree_ensemble = TreeEnsemble.from_json_file(model_path)
+    features = np.random.default_rng(3).uniform(0, 60, size=(64, 8))
+
+    assert tree_ensemble.check_parity(booster, features) == 0.0
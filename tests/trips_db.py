@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from sqlalchemy import inspect
+from sqlalchemy.sql import text
+from model_pipeline.data_collector import TRIP_COLUMNS, DataCollector
+from model_pipeline.storage import RAW_TRIPS_SCHEMA, find_table, read_table
+
+# The day table columns get_data does not fetch
+OTHER_COLUMNS = [
+    "VendorID",
+    "RatecodeID",
+    "store_and_fwd_flag",
+    "payment_type",
+    "extra",
+    "mta_tax",
+    "tip_amount",
+    "tolls_amount",
+    "improvement_surcharge",
+    "congestion_surcharge",
+]
+
+
+def build_trips_db(
+    path: str, days: int, rows_per_day: int, trips_file: str, seed: int = 0
+) -> None:
+    """
+    SQLite stand-in for the trips database: one trips_YYYY_MM_DD table per
+    day up to today with all the columns of the real ones, sampled from a
+    raw trips file, or generated when it does not exist.
+    """
+    rng = np.random.default_rng(seed)
+    try:
+        trips_file = find_table(trips_file)
+    except FileNotFoundError:
+        trips_file = None
+    if trips_file is not None:
+        base = read_table(trips_file, schema=RAW_TRIPS_SCHEMA)
+        base = base.sample(n=rows_per_day, replace=True, random_state=seed)
+        seconds = pd.to_datetime(base["tpep_pickup_datetime"])
+        seconds = (seconds - seconds.dt.normalize()).dt.total_seconds().to_numpy()
+        duration = (
+            (
+                pd.to_datetime(base["tpep_dropoff_datetime"])
+                - pd.to_datetime(base["tpep_pickup_datetime"])
+            )
+            .dt.total_seconds()
+            .to_numpy()
+        )
+    else:
+        base = pd.DataFrame(
+            {
+                name: rng.integers(1, 265, rows_per_day)
+                for name, dtype in TRIP_COLUMNS.items()
+                if dtype in ("int64", "float64")
+            }
+        )
+        for name in OTHER_COLUMNS:
+            base[name] = rng.integers(1, 5, rows_per_day)
+        base["store_and_fwd_flag"] = "N"
+        seconds = rng.uniform(0, 86400, rows_per_day)
+        duration = rng.uniform(60, 3600, rows_per_day)
+
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    today = datetime.now()
+    for i in range(days + 1):
+        day = pd.Timestamp((today - timedelta(days=days - i)).date())
+        df = base.copy()
+        pickup = day + pd.to_timedelta(seconds, unit="s")
+        df["tpep_pickup_datetime"] = pickup.strftime("%Y-%m-%d %H:%M:%S")
+        df["tpep_dropoff_datetime"] = (
+            pickup + pd.to_timedelta(duration, unit="s")
+        ).strftime("%Y-%m-%d %H:%M:%S")
+        df["trip_id"] = np.arange(rows_per_day) + i * rows_per_day
+        df.to_sql(f"trips_{day.strftime('%Y_%m_%d')}", connection, index=False)
+    connection.close()
+
+
+def get_data_serial(collector: DataCollector, days: int) -> pd.DataFrame:
+    # The previous get_data: SELECT * and fetchall per day, one connection
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+    with collector.engine.connect() as connection:
+        tables = inspect(connection).get_table_names()
+        all_data = []
+        for i in range(days + 1):
+            date = start_date + timedelta(days=i)
+            table_name = f"trips_{date.strftime('%Y_%m_%d')}"
+            if table_name in tables:
+                result = connection.execute(
+                    text(f"SELECT * FROM {table_name} ORDER BY tpep_pickup_datetime")
+                )
+                all_data.append(pd.DataFrame(result.fetchall(), columns=result.keys()))
+        return pd.concat(all_data, ignore_index=True)